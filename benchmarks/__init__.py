@@ -0,0 +1 @@
+"""Benchmarks do Jogo da Velha (rodar a partir da raiz do repositório com python -m)"""
@@ -0,0 +1,66 @@
+"""
+Compara o custo de serializar uma sala em cada formato
+
+    json (blob)      formato original: a sala inteira em um único JSON
+    hash + json      campos do hash com o tabuleiro em JSON
+    hash + compacto  campos do hash com o tabuleiro no codec compacto
+
+Mostra o tempo médio de codificação e decodificação e o tamanho em bytes
+(soma de nomes e valores dos campos, no caso do hash).
+
+Uso:
+    python -m benchmarks.bench_codec [--repeticoes N]
+"""
+import argparse
+import json
+import timeit
+
+from comum import codec, salas
+
+
+def sala_exemplo(tamanho, sequencia, jogadas, espectadores):
+    sala = salas.nova_sala("sala42", "127.0.0.1", "8080", tamanho, sequencia)
+    sala["jogadores"] = ["X", "O"]
+    sala["nomes"] = {"X": "Jogador Um", "O": "Jogador Dois"}
+    for pos in range(jogadas):
+        sala["tabuleiro"][pos * 7 % len(sala["tabuleiro"])] = "X" if pos % 2 == 0 else "O"
+    sala["espectadores"] = [f"espectador{i}" for i in range(espectadores)]
+    return sala
+
+
+def tamanho_hash(campos):
+    return sum(len(k.encode()) + len(v.encode()) for k, v in campos.items())
+
+
+def medir(funcao, repeticoes):
+    return min(timeit.repeat(funcao, number=repeticoes, repeat=5)) / repeticoes * 1e6
+
+
+def comparar(nome, sala, repeticoes):
+    print(f"\n{nome}")
+    print(f"{'formato':<18}{'codificar (us)':>16}{'decodificar (us)':>18}{'bytes':>8}")
+
+    blob = json.dumps(sala)
+    print(f"{'json (blob)':<18}"
+          f"{medir(lambda: json.dumps(sala), repeticoes):>16.2f}"
+          f"{medir(lambda: json.loads(blob), repeticoes):>18.2f}"
+          f"{len(blob.encode()):>8}")
+
+    # No layout em hash os espectadores ficam em uma lista separada e não são
+    # relidos nem regravados a cada operação
+    for nome_codec in ("json", "compacto"):
+        tabuleiro_codec = codec.obter_codec(nome_codec)
+        campos, _ = salas.codificar_campos(sala, codec_tabuleiro=tabuleiro_codec)
+        print(f"{'hash + ' + nome_codec:<18}"
+              f"{medir(lambda: salas.codificar_campos(sala, codec_tabuleiro=tabuleiro_codec), repeticoes):>16.2f}"
+              f"{medir(lambda: salas.decodificar_campos(campos), repeticoes):>18.2f}"
+              f"{tamanho_hash(campos):>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticoes", type=int, default=20000)
+    args = parser.parse_args()
+
+    comparar("Sala 3x3 no meio do jogo, 20 espectadores", sala_exemplo(3, 3, 5, 20), args.repeticoes)
+    comparar("Sala 15x15 (k=5) com 60 jogadas, 200 espectadores", sala_exemplo(15, 5, 60, 200), args.repeticoes // 10)
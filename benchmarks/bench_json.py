@@ -0,0 +1,115 @@
+"""
+Compara o custo de serialização JSON por requisição com cada backend
+
+    json    json da biblioteca padrão
+    orjson  (se estiver instalado)
+
+Para cada backend mede o tempo médio de cada etapa em que os serviços
+serializam os mesmos dados:
+
+    rest        corpo de GET /salas/<id> (dicionário da sala -> bytes)
+    flask       o mesmo corpo via jsonify, com o provedor padrão do Flask
+                (backend json) ou com comum/json_flask.py (orjson)
+    gateway     decodificar a resposta da REST API, acrescentar _links e
+                serializar de novo
+    evento      gravar o evento no stream (REST), decodificá-lo e montar a
+                mensagem enviada aos clientes (WebSocket)
+
+Uso:
+    python -m benchmarks.bench_json [--repeticoes N]
+"""
+import argparse
+import importlib
+import os
+import timeit
+
+from flask import Flask, jsonify
+
+from benchmarks.bench_codec import sala_exemplo
+from comum import eventos, salas
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def carregar_json_rapido(backend):
+    """Recarrega comum/json_rapido.py (e o provedor do Flask) com o backend pedido"""
+    os.environ["JSON_BACKEND"] = backend
+    from comum import json_flask, json_rapido
+    importlib.reload(json_rapido)
+    importlib.reload(json_flask)
+    return json_rapido, json_flask
+
+
+def resposta_sala(sala):
+    """Aproximação do dicionário devolvido por GET /salas/<id>"""
+    sala_info = dict(sala)
+    sala_info["status"] = salas.status_sala(sala)
+    sala_info["vez_nome"] = sala["nomes"].get(sala["vez"])
+    sala_info["versao"] = 42
+    sala_info["total_espectadores"] = len(sala["espectadores"])
+    return sala_info
+
+
+def medir(funcao, repeticoes):
+    return min(timeit.repeat(funcao, number=repeticoes, repeat=5)) / repeticoes * 1e6
+
+
+def etapas(backend, sala):
+    json_rapido, json_flask = carregar_json_rapido(backend)
+
+    app = Flask(__name__)
+    if backend != "json":
+        json_flask.configurar(app)
+
+    sala_info = resposta_sala(sala)
+    corpo = json_rapido.dumps_bytes(sala_info)
+    mensagem = eventos.montar("jogada_realizada", sala["id"], {
+        "jogador": "Jogador Um", "simbolo": "X", "posicao": 4, "tabuleiro": sala["tabuleiro"]
+    })
+    campos = {"sala_id": sala["id"], "mensagem": json_rapido.dumps(mensagem)}
+
+    def flask():
+        with app.app_context():
+            jsonify(sala_info).get_data()
+
+    def gateway():
+        data = json_rapido.loads(corpo)
+        data["_links"] = {"entrar_sala": "/salas/x/entrar", "jogar": "/salas/x/jogar"}
+        json_rapido.dumps_bytes(data)
+
+    def evento():
+        json_rapido.dumps(mensagem)
+        recebido = json_rapido.loads(campos["mensagem"])
+        json_rapido.dumps({"type": "game_event", "id": "1-0", "evento": recebido["evento"],
+                           "dados": recebido["dados"]})
+
+    return {
+        "rest": lambda: json_rapido.dumps_bytes(sala_info),
+        "flask": flask,
+        "gateway": gateway,
+        "evento": evento
+    }, len(corpo)
+
+
+def comparar(nome, sala, repeticoes):
+    backends = ["json"] + (["orjson"] if orjson else [])
+    print(f"\n{nome}")
+    print(f"{'backend':<10}{'rest (us)':>12}{'flask (us)':>12}{'gateway (us)':>14}{'evento (us)':>13}{'bytes':>8}")
+    for backend in backends:
+        funcoes, tamanho = etapas(backend, sala)
+        tempos = [medir(funcoes[etapa], repeticoes) for etapa in ("rest", "flask", "gateway", "evento")]
+        print(f"{backend:<10}{tempos[0]:>12.2f}{tempos[1]:>12.2f}{tempos[2]:>14.2f}{tempos[3]:>13.2f}{tamanho:>8}")
+    if not orjson:
+        print("(orjson não instalado)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticoes", type=int, default=20000)
+    args = parser.parse_args()
+
+    comparar("Sala 3x3 no meio do jogo, 20 espectadores", sala_exemplo(3, 3, 5, 20), args.repeticoes)
+    comparar("Sala 15x15 (k=5) com 60 jogadas, 200 espectadores", sala_exemplo(15, 5, 60, 200), args.repeticoes // 10)
@@ -0,0 +1,221 @@
+"""
+Teste de carga da pilha completa (gateway, SOAP, REST, Redis e WebSocket)
+
+Simula ``--salas`` partidas completas, com até ``--concorrencia`` ao mesmo
+tempo. Em cada sala:
+
+    1. cria a sala pelo gateway (POST /criar-sala -> SOAP)
+    2. abre uma conexão WebSocket para cada jogador e espectador, mantidas
+       até o fim da partida
+    3. dois jogadores e ``--espectadores`` espectadores entram na sala
+    4. os jogadores alternam jogadas em casas livres aleatórias até vitória ou
+       empate; cada jogada é cronometrada até chegar em cada conexão
+       WebSocket da sala
+    5. consulta o estado final (GET /salas/<id>)
+
+No fim mostra, para cada endpoint e para a entrega das jogadas no WebSocket
+(``jogada -> ws``), a quantidade de amostras, erros, vazão e os percentis
+p50/p95/p99 em milissegundos.
+
+Uso (com o docker-compose no ar):
+    pip install -r requirements.txt
+    python -m benchmarks.carga --salas 1000 --concorrencia 200 --espectadores 2
+
+Para milhares de conexões simultâneas na mesma máquina, aumente o limite de
+arquivos abertos antes (``ulimit -n 65535``) e, se faltarem portas locais,
+``sysctl net.ipv4.ip_local_port_range="10240 65535"``. O gerador de carga
+disputa CPU com os serviços; compare execuções feitas nas mesmas condições.
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import aiohttp
+
+# Eventos que encerram uma jogada no WebSocket
+EVENTOS_JOGADA = ("jogada_realizada", "jogo_vitoria", "jogo_empate")
+
+
+class Coletor:
+    """Latências (segundos) e erros por operação"""
+
+    def __init__(self):
+        self.latencias = {}
+        self.erros = {}
+
+    def registrar(self, operacao, segundos):
+        self.latencias.setdefault(operacao, []).append(segundos)
+
+    def erro(self, operacao):
+        self.erros[operacao] = self.erros.get(operacao, 0) + 1
+
+    def relatorio(self, duracao):
+        print(f"\n{'operação':<22}{'amostras':>10}{'erros':>8}{'por s':>10}"
+              f"{'p50 (ms)':>11}{'p95 (ms)':>11}{'p99 (ms)':>11}{'máx (ms)':>11}")
+        for operacao in sorted(set(self.latencias) | set(self.erros)):
+            valores = sorted(self.latencias.get(operacao, []))
+            linha = f"{operacao:<22}{len(valores):>10}{self.erros.get(operacao, 0):>8}{len(valores) / duracao:>10.1f}"
+            if valores:
+                linha += "".join(f"{percentil(valores, p) * 1000:>11.1f}" for p in (50, 95, 99))
+                linha += f"{valores[-1] * 1000:>11.1f}"
+            print(linha)
+
+
+def percentil(ordenados, p):
+    """Percentil pelo método do posto mais próximo"""
+    indice = max(0, min(len(ordenados) - 1, round(p / 100 * len(ordenados) + 0.5) - 1))
+    return ordenados[indice]
+
+
+async def requisitar(sessao, coletor, operacao, metodo, url, **kwargs):
+    """Faz a requisição cronometrada; retorna (status, corpo JSON) ou (None, None) em erro de rede"""
+    inicio = time.perf_counter()
+    try:
+        async with sessao.request(metodo, url, **kwargs) as resposta:
+            corpo = await resposta.json(content_type=None)
+            status = resposta.status
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+        coletor.erro(operacao)
+        return None, None
+    coletor.registrar(operacao, time.perf_counter() - inicio)
+    if status >= 400:
+        coletor.erro(operacao)
+    return status, corpo
+
+
+class Partida:
+    """Uma sala simulada do início ao fim"""
+
+    def __init__(self, args, sessao, sessao_ws, coletor, numero):
+        self.args = args
+        self.sessao = sessao
+        self.sessao_ws = sessao_ws
+        self.coletor = coletor
+        self.numero = numero
+        self.sala_id = None
+        self.conexoes = []
+        # Posição -> (instante do envio, conexões que ainda não receberam)
+        self.pendentes = {}
+
+    async def executar(self):
+        args = self.args
+        status, corpo = await requisitar(
+            self.sessao, self.coletor, "POST /criar-sala", "POST", f"{args.gateway}/criar-sala",
+            json={"porta": "8080", "tamanho": args.tamanho, "sequencia": args.sequencia}
+        )
+        if status != 200:
+            return
+        self.sala_id = corpo["room_id"]
+
+        jogadores = [f"j{self.numero}x", f"j{self.numero}o"]
+        participantes = jogadores + [f"e{self.numero}-{i}" for i in range(args.espectadores)]
+        try:
+            await asyncio.gather(*(self.conectar() for _ in participantes))
+            leitores = [asyncio.create_task(self.ler(ws)) for ws in self.conexoes]
+
+            for nome in participantes:
+                await requisitar(self.sessao, self.coletor, "POST /entrar", "POST",
+                                 f"{args.gateway}/salas/{self.sala_id}/entrar", json={"jogador": nome})
+
+            await self.jogar(jogadores)
+            await requisitar(self.sessao, self.coletor, "GET /salas/<id>", "GET",
+                             f"{args.gateway}/salas/{self.sala_id}")
+
+            # Espera as últimas entregas antes de fechar as conexões
+            limite = time.perf_counter() + args.timeout
+            while self.pendentes and time.perf_counter() < limite:
+                await asyncio.sleep(0.01)
+            for _, faltando in self.pendentes.values():
+                for _ in faltando:
+                    self.coletor.erro("jogada -> ws")
+            for leitor in leitores:
+                leitor.cancel()
+        finally:
+            await asyncio.gather(*(ws.close() for ws in self.conexoes), return_exceptions=True)
+
+    async def conectar(self):
+        inicio = time.perf_counter()
+        try:
+            ws = await self.sessao_ws.ws_connect(f"{self.args.ws}/ws/{self.sala_id}", heartbeat=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self.coletor.erro("WS conectar")
+            return
+        self.coletor.registrar("WS conectar", time.perf_counter() - inicio)
+        self.conexoes.append(ws)
+
+    async def ler(self, ws):
+        async for mensagem in ws:
+            if mensagem.type != aiohttp.WSMsgType.TEXT:
+                continue
+            dados = mensagem.json()
+            if dados.get("type") != "game_event" or dados.get("evento") not in EVENTOS_JOGADA:
+                continue
+            pendente = self.pendentes.get(dados["dados"].get("posicao"))
+            if pendente and ws in pendente[1]:
+                self.coletor.registrar("jogada -> ws", time.perf_counter() - pendente[0])
+                pendente[1].discard(ws)
+                if not pendente[1]:
+                    self.pendentes.pop(dados["dados"]["posicao"], None)
+
+    async def jogar(self, jogadores):
+        livres = list(range(self.args.tamanho ** 2))
+        random.shuffle(livres)
+        vez = 0
+        while livres:
+            posicao = livres.pop()
+            self.pendentes[posicao] = (time.perf_counter(), set(self.conexoes))
+            status, corpo = await requisitar(
+                self.sessao, self.coletor, "POST /jogar", "POST",
+                f"{self.args.gateway}/salas/{self.sala_id}/jogar",
+                json={"jogador": jogadores[vez], "pos": posicao}
+            )
+            if status != 200:
+                self.pendentes.pop(posicao, None)
+                return
+            if corpo.get("resultado") in ("vitoria", "empate"):
+                return
+            vez = 1 - vez
+            if self.args.pausa:
+                await asyncio.sleep(self.args.pausa)
+
+
+async def executar(args):
+    coletor = Coletor()
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    semaforo = asyncio.Semaphore(args.concorrencia)
+
+    # As conexões WebSocket ficam abertas a partida inteira, então não entram no
+    # limite de conexões das requisições HTTP
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=args.conexoes), timeout=timeout) as sessao, \
+            aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0), timeout=timeout) as sessao_ws:
+        async def limitada(numero):
+            async with semaforo:
+                try:
+                    await Partida(args, sessao, sessao_ws, coletor, numero).executar()
+                except Exception as e:
+                    coletor.erro("partida")
+                    print(f"Partida {numero} interrompida: {e!r}")
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(limitada(numero) for numero in range(args.salas)))
+        duracao = time.perf_counter() - inicio
+
+    print(f"\n{args.salas} partida(s) em {duracao:.1f} s "
+          f"(concorrência {args.concorrencia}, {args.espectadores} espectador(es) por sala)")
+    coletor.relatorio(duracao)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--gateway", default="http://localhost:8000")
+    parser.add_argument("--ws", default="ws://localhost:8002")
+    parser.add_argument("--salas", type=int, default=100, help="partidas simuladas")
+    parser.add_argument("--concorrencia", type=int, default=50, help="partidas ao mesmo tempo")
+    parser.add_argument("--espectadores", type=int, default=2, help="espectadores por sala")
+    parser.add_argument("--tamanho", type=int, default=3, help="lado do tabuleiro")
+    parser.add_argument("--sequencia", type=int, default=3, help="peças alinhadas para vencer")
+    parser.add_argument("--pausa", type=float, default=0, help="segundos entre jogadas")
+    parser.add_argument("--conexoes", type=int, default=500, help="conexões HTTP simultâneas")
+    parser.add_argument("--timeout", type=float, default=30, help="segundos por requisição")
+    asyncio.run(executar(parser.parse_args()))
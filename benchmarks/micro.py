@@ -0,0 +1,280 @@
+"""
+Micro-benchmarks dos caminhos executados a cada requisição, com linha de base
+
+Casos:
+
+    vitoria_*, empate_*     verificar_vitoria / verificar_empate da REST API
+                            (3x3 pela tabela de estados, 15x15 pelo motor)
+    salvar_sala_*           comandos do MULTI de salvar_sala (campos do hash,
+                            histórico, eventos, índices, expiração e versão)
+                            montados em um pipeline e codificados no protocolo
+                            do Redis, sem rede
+    carregar_sala_*         conversão do hash lido do Redis para o dicionário
+                            da sala
+    consultar_sala_*        resposta de GET /salas/<id>: informacoes_sala e
+                            serialização do corpo
+    broadcast_*             broadcast_to_room do WebSocket para N clientes
+                            falsos (só o custo do servidor)
+
+Todos os casos são medidos em ``--rodadas`` passadas, uma depois da outra, para
+que uma fase em que a máquina está mais lenta não atinja um caso só. Em cada
+passada o caso roda ``--repeticoes`` vezes com ``timeit`` e vale a mediana; o
+resultado do caso é a mediana das passadas e a dispersão é a diferença entre a
+passada mais lenta e a mais rápida, em relação a esse resultado.
+
+A linha de base guarda o resultado e a dispersão de cada caso. Na comparação o
+limite de um caso é o maior entre ``--limite`` (padrão 25%) e a dispersão
+gravada vezes ``FATOR_DISPERSAO``, a não ser que o caso tenha um ``limite``
+escrito à mão no arquivo (mantido ao gravar de novo). Casos mais lentos que a
+linha de base além do limite são marcados como regressão e o comando termina
+com código 1. Gravar com mais passadas (``--gravar --rodadas 7``) mede melhor a
+dispersão.
+
+A linha de base vale para a máquina em que foi gravada (processador, CPUs e
+versão do Python ficam no arquivo): em outra máquina, grave uma nova antes de
+comparar.
+
+Uso:
+    python -m benchmarks.micro                   compara com a linha de base
+    python -m benchmarks.micro --gravar --rodadas 7   grava a linha de base
+    python -m benchmarks.micro --filtro vitoria  só os casos com "vitoria" no nome
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import platform
+import statistics
+import sys
+import timeit
+
+import redis
+
+# Lido pelo comum.redis_cliente na importação: os serviços carregados pelos casos
+# usam o armazenamento em memória e não tentam conectar a um Redis de verdade
+os.environ["ARMAZENAMENTO"] = "memoria"
+
+from benchmarks.bench_codec import sala_exemplo  # noqa: E402
+from comum import eventos, historico, json_rapido, salas  # noqa: E402
+from embutido import carregar_servico  # noqa: E402
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ARQUIVO_LINHA_BASE = os.path.join(RAIZ, "benchmarks", "linha_base.json")
+LIMITE_PADRAO = 0.25
+# Múltiplo da dispersão gravada tolerado na comparação
+FATOR_DISPERSAO = 1.5
+
+CASOS = {}
+
+
+def caso(nome):
+    """Registra uma função que prepara o caso e retorna o que deve ser medido"""
+    def registrar(preparar):
+        CASOS[nome] = preparar
+        return preparar
+    return registrar
+
+
+def sala_em_andamento(tamanho, sequencia, jogadas, espectadores):
+    sala = sala_exemplo(tamanho, sequencia, jogadas, espectadores)
+    # Os espectadores ficam em um set à parte; a sala carregada só traz o total
+    del sala["espectadores"]
+    sala["versao"] = 42
+    sala["total_espectadores"] = espectadores
+    return sala
+
+
+for tamanho, sequencia, jogadas in ((3, 3, 5), (15, 5, 60)):
+    rotulo = f"{tamanho}x{tamanho}"
+
+    @caso(f"vitoria_{rotulo}")
+    def _vitoria(tamanho=tamanho, sequencia=sequencia, jogadas=jogadas):
+        rest = carregar_servico("rest")
+        tabuleiro = sala_exemplo(tamanho, sequencia, jogadas, 0)["tabuleiro"]
+        return lambda: rest.verificar_vitoria(tabuleiro, tamanho, sequencia)
+
+    @caso(f"empate_{rotulo}")
+    def _empate(tamanho=tamanho, sequencia=sequencia, jogadas=jogadas):
+        rest = carregar_servico("rest")
+        tabuleiro = sala_exemplo(tamanho, sequencia, jogadas, 0)["tabuleiro"]
+        return lambda: rest.verificar_empate(tabuleiro, tamanho, sequencia)
+
+    @caso(f"salvar_sala_{rotulo}")
+    def _salvar(tamanho=tamanho, sequencia=sequencia, jogadas=jogadas):
+        rest = carregar_servico("rest")
+        sala = sala_em_andamento(tamanho, sequencia, jogadas, 20)
+        dados = {"jogador": "Jogador Um", "simbolo": "X", "posicao": 0,
+                 "tabuleiro": sala["tabuleiro"], "proximo": "O"}
+        eventos_jogada = [("jogada_realizada", dados)]
+        # O pipeline só acumula os comandos; nada é enviado
+        pipe = redis.Redis(host="nao-usado").pipeline()
+        conexao = redis.Connection()
+
+        def salvar():
+            salas.gravar_campos(pipe, sala, ("tabuleiro", "vez", "vencedor", "empate"))
+            historico.registrar(pipe, sala, eventos_jogada)
+            for evento, dados_evento in eventos_jogada:
+                eventos.publicar(pipe, rest.montar_evento(evento, sala["id"], dados_evento))
+            salas.indexar_status(pipe, sala)
+            salas.renovar_expiracao(pipe, sala)
+            salas.incrementar_versao(pipe, sala["id"])
+            pipe.scard(salas.chave_espectadores(sala["id"]))
+            conexao.pack_commands([args for args, _ in pipe.command_stack])
+            pipe.reset()
+        return salvar
+
+    @caso(f"carregar_sala_{rotulo}")
+    def _carregar(tamanho=tamanho, sequencia=sequencia, jogadas=jogadas):
+        campos, _ = salas.codificar_campos(sala_em_andamento(tamanho, sequencia, jogadas, 0))
+        return lambda: salas.decodificar_campos(campos)
+
+    @caso(f"consultar_sala_{rotulo}")
+    def _consultar(tamanho=tamanho, sequencia=sequencia, jogadas=jogadas):
+        rest = carregar_servico("rest")
+        sala = sala_em_andamento(tamanho, sequencia, jogadas, 20)
+        return lambda: json_rapido.dumps_bytes(rest.informacoes_sala(sala))
+
+
+class ClienteFalso:
+    async def send(self, mensagem):
+        pass
+
+
+for clientes in (10, 100, 1000):
+    @caso(f"broadcast_{clientes}_clientes")
+    def _broadcast(clientes=clientes):
+        ws = carregar_servico("websocket")
+        sala_id = f"bench-{clientes}"
+        ws.rooms[sala_id] = {ClienteFalso() for _ in range(clientes)}
+        mensagem = ws.mensagem_evento("1-0", eventos.montar("jogada_realizada", sala_id, {
+            "jogador": "Jogador Um", "simbolo": "X", "posicao": 4, "tabuleiro": ["X", "", "O"] * 3
+        }))
+
+        async def broadcast():
+            await ws.broadcast_to_room(sala_id, mensagem)
+        return broadcast
+
+
+def medir(funcao, repeticoes):
+    """Tempo por chamada em cada rodada, em microssegundos"""
+    if inspect.iscoroutinefunction(funcao):
+        # As chamadas rodam em sequência dentro de um único run_until_complete
+        loop = asyncio.new_event_loop()
+
+        async def repetir(vezes):
+            for _ in range(vezes):
+                await funcao()
+
+        try:
+            numero, _ = timeit.Timer(lambda: loop.run_until_complete(repetir(1))).autorange()
+            temporizador = timeit.Timer(lambda: loop.run_until_complete(repetir(numero)))
+            return [tempo / numero * 1e6 for tempo in temporizador.repeat(repeticoes, 1)]
+        finally:
+            loop.close()
+
+    temporizador = timeit.Timer(funcao)
+    numero, _ = temporizador.autorange()
+    return [tempo / numero * 1e6 for tempo in temporizador.repeat(repeticoes, numero)]
+
+
+def resumir(medianas):
+    """(mediana, dispersão relativa) das passadas de um caso"""
+    mediana = statistics.median(medianas)
+    return mediana, (max(medianas) - min(medianas)) / mediana
+
+
+def processador():
+    try:
+        with open("/proc/cpuinfo") as arquivo:
+            for linha in arquivo:
+                if linha.startswith("model name"):
+                    return linha.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def maquina():
+    """Descrição da máquina gravada junto com a linha de base"""
+    return {
+        "sistema": f"{platform.system()} {platform.machine()}",
+        "processador": processador(),
+        "cpus": os.cpu_count(),
+        "python": f"{platform.python_implementation()} {platform.python_version()}",
+        "json": json_rapido.BACKEND
+    }
+
+
+def ler_linha_base():
+    if not os.path.exists(ARQUIVO_LINHA_BASE):
+        return {"casos": {}}
+    with open(ARQUIVO_LINHA_BASE) as arquivo:
+        return json.load(arquivo)
+
+
+def gravar_linha_base(resultados, anterior):
+    casos = anterior.get("casos", {})
+    for nome, (mediana, dispersao) in resultados.items():
+        # Um limite escrito à mão no caso é mantido
+        casos[nome] = {**casos.get(nome, {}), "us": round(mediana, 3), "dispersao": round(dispersao, 3)}
+    dados = {
+        "maquina": maquina(),
+        "casos": dict(sorted(casos.items()))
+    }
+    with open(ARQUIVO_LINHA_BASE, "w") as arquivo:
+        json.dump(dados, arquivo, indent=2, ensure_ascii=False)
+        arquivo.write("\n")
+
+
+def executar(args):
+    linha_base = ler_linha_base()
+    gravada = linha_base.get("maquina")
+    if isinstance(gravada, dict):
+        for chave, valor in maquina().items():
+            if gravada.get(chave) != valor:
+                print(f"Aviso: linha de base gravada com {chave} {gravada.get(chave)!r} (agora {valor!r})")
+
+    funcoes = {nome: preparar() for nome, preparar in CASOS.items() if args.filtro in nome}
+    medianas = {nome: [] for nome in funcoes}
+    for _ in range(args.rodadas):
+        for nome, funcao in funcoes.items():
+            medianas[nome].append(statistics.median(medir(funcao, args.repeticoes)))
+
+    resultados = {}
+    regressoes = []
+    print(f"{'caso':<28}{'us':>12}{'dispersão':>11}{'base (us)':>12}{'variação':>11}")
+    for nome in funcoes:
+        microssegundos, dispersao = resumir(medianas[nome])
+        resultados[nome] = microssegundos, dispersao
+
+        base = linha_base["casos"].get(nome)
+        linha = f"{nome:<28}{microssegundos:>12.2f}{dispersao:>10.1%}"
+        if base:
+            variacao = microssegundos / base["us"] - 1
+            limite = base.get("limite", max(args.limite, FATOR_DISPERSAO * base.get("dispersao", 0)))
+            linha += f"{base['us']:>12.2f}{variacao:>+10.1%}"
+            if variacao > limite:
+                linha += f"  REGRESSÃO (limite {limite:.0%})"
+                regressoes.append(nome)
+        print(linha)
+
+    if args.gravar:
+        gravar_linha_base(resultados, linha_base)
+        print(f"\nLinha de base gravada em {os.path.relpath(ARQUIVO_LINHA_BASE, RAIZ)}")
+        return 0
+    if regressoes:
+        print(f"\n{len(regressoes)} regressão(ões): {', '.join(regressoes)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--gravar", action="store_true", help="grava os resultados como linha de base")
+    parser.add_argument("--filtro", default="", help="só os casos que contêm este texto")
+    parser.add_argument("--rodadas", type=int, default=3, help="passadas por todos os casos")
+    parser.add_argument("--repeticoes", type=int, default=5, help="medições de cada caso por passada")
+    parser.add_argument("--limite", type=float, default=LIMITE_PADRAO,
+                        help="piora tolerada em relação à linha de base (0.25 = 25%%)")
+    sys.exit(executar(parser.parse_args()))
@@ -0,0 +1,102 @@
+"""
+Vazão da REST API sozinha (sem gateway, SOAP e WebSocket)
+
+Usado para comparar o servidor de desenvolvimento do Flask com o gunicorn e
+escolher ``GUNICORN_WORKERS``/``GUNICORN_THREADS``. Cria ``--salas`` salas
+direto no Redis (como o SOAP faz), coloca dois jogadores em cada uma pela API e
+roda duas fases de ``--duracao`` segundos com ``--concorrencia`` clientes:
+
+    leitura     GET /salas/<id> em salas aleatórias
+    jogadas     cada cliente joga partidas em uma sala (POST /jogar, e
+                POST /reiniciar ao fim de cada partida)
+
+No fim mostra, por operação, vazão e percentis p50/p95/p99 em milissegundos.
+
+Uso (REST API e Redis no ar; o Redis é o mesmo usado pela API):
+    REDIS_HOST=localhost python -m benchmarks.vazao_rest --rest http://localhost:5000
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import aiohttp
+
+from benchmarks.carga import Coletor, requisitar
+from comum import redis_cliente, salas
+
+
+def criar_salas(quantidade):
+    """Grava as salas no Redis com salas.criar_sala, como o criarSala do SOAP"""
+    r = redis_cliente.criar_cliente()
+    ids = []
+    for _ in range(quantidade):
+        sala = salas.nova_sala(salas.gerar_id(r), "127.0.0.1", "8080")
+        with r.pipeline() as pipe:
+            salas.criar_sala(pipe, sala)
+            pipe.execute()
+        ids.append(sala["id"])
+    return ids
+
+
+async def fase(args, concorrencia, cliente):
+    """Roda ``cliente(numero, limite)`` em paralelo e retorna a duração"""
+    inicio = time.perf_counter()
+    limite = inicio + args.duracao
+    await asyncio.gather(*(cliente(numero, limite) for numero in range(concorrencia)))
+    return time.perf_counter() - inicio
+
+
+async def executar(args):
+    ids = criar_salas(max(args.salas, args.concorrencia))
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0), timeout=timeout) as sessao:
+        preparacao = Coletor()
+        for sala_id in ids:
+            for jogador in ("A", "B"):
+                await requisitar(sessao, preparacao, "POST /entrar", "POST",
+                                 f"{args.rest}/salas/{sala_id}/entrar", json={"jogador": jogador})
+
+        leitura = Coletor()
+
+        async def ler(numero, limite):
+            while time.perf_counter() < limite:
+                await requisitar(sessao, leitura, "GET /salas/<id>", "GET",
+                                 f"{args.rest}/salas/{random.choice(ids)}")
+
+        duracao = await fase(args, args.concorrencia, ler)
+        print(f"\nLeitura: {args.concorrencia} cliente(s) por {duracao:.1f} s")
+        leitura.relatorio(duracao)
+
+        jogadas = Coletor()
+
+        async def jogar(numero, limite):
+            sala_id = ids[numero]
+            livres, vez = list(range(9)), 0
+            random.shuffle(livres)
+            while time.perf_counter() < limite:
+                status, corpo = await requisitar(
+                    sessao, jogadas, "POST /jogar", "POST", f"{args.rest}/salas/{sala_id}/jogar",
+                    json={"jogador": "AB"[vez], "pos": livres.pop()}
+                )
+                if status != 200 or corpo.get("resultado") in ("vitoria", "empate") or not livres:
+                    await requisitar(sessao, jogadas, "POST /reiniciar", "POST",
+                                     f"{args.rest}/salas/{sala_id}/reiniciar", json={})
+                    livres, vez = list(range(9)), 0
+                    random.shuffle(livres)
+                else:
+                    vez = 1 - vez
+
+        duracao = await fase(args, args.concorrencia, jogar)
+        print(f"\nJogadas: {args.concorrencia} partida(s) simultâneas por {duracao:.1f} s")
+        jogadas.relatorio(duracao)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rest", default="http://localhost:5000")
+    parser.add_argument("--salas", type=int, default=100, help="salas criadas para a leitura")
+    parser.add_argument("--concorrencia", type=int, default=50, help="clientes simultâneos")
+    parser.add_argument("--duracao", type=float, default=20, help="segundos por fase")
+    parser.add_argument("--timeout", type=float, default=30, help="segundos por requisição")
+    asyncio.run(executar(parser.parse_args()))
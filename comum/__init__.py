@@ -0,0 +1 @@
+"""Código compartilhado entre os serviços do Jogo da Velha"""
@@ -0,0 +1,62 @@
+"""
+Codecs do tabuleiro gravado no campo ``tabuleiro`` do hash da sala
+
+    json      lista JSON, formato original: ["X", "", "O", ...]
+    compacto  prefixo de versão seguido de um caractere por casa, com "." para
+              casa vazia: "~1X.O......"
+
+O codec usado na gravação vem da variável de ambiente ``CODEC_SALA`` (padrão
+``compacto``). A leitura reconhece qualquer um dos formatos pelo primeiro
+caractere, então salas gravadas com codecs diferentes convivem no mesmo Redis.
+"""
+import json
+import os
+
+
+class CodecJSON:
+    nome = "json"
+
+    def codificar(self, tabuleiro):
+        return json.dumps(tabuleiro)
+
+    def decodificar(self, texto):
+        return json.loads(texto)
+
+
+class CodecCompacto:
+    nome = "compacto"
+    prefixo = "~1"
+    vazio = "."
+
+    def codificar(self, tabuleiro):
+        return self.prefixo + "".join(casa or self.vazio for casa in tabuleiro)
+
+    def decodificar(self, texto):
+        if not texto.startswith(self.prefixo):
+            raise ValueError(f"Versão de tabuleiro compacto desconhecida: {texto[:2]!r}")
+        return ["" if casa == self.vazio else casa for casa in texto[len(self.prefixo):]]
+
+
+CODECS = {codec.nome: codec for codec in (CodecJSON(), CodecCompacto())}
+
+
+def obter_codec(nome=None):
+    """Retorna o codec pelo nome (ou o configurado em CODEC_SALA)"""
+    nome = nome or os.getenv("CODEC_SALA", "compacto")
+    if nome not in CODECS:
+        raise ValueError(f"Codec de sala desconhecido: {nome} (use {', '.join(CODECS)})")
+    return CODECS[nome]
+
+
+codec_padrao = obter_codec()
+
+
+def codificar_tabuleiro(tabuleiro, codec=None):
+    return (codec or codec_padrao).codificar(tabuleiro)
+
+
+def decodificar_tabuleiro(texto):
+    """Decodifica o tabuleiro em qualquer um dos formatos conhecidos"""
+    if texto.startswith("["):
+        return CODECS["json"].decodificar(texto)
+    return CODECS["compacto"].decodificar(texto)
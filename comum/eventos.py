@@ -0,0 +1,190 @@
+"""
+Log de eventos das salas em Redis Streams
+
+Os eventos são gravados em ``EVENTOS_SHARDS`` streams ``eventos:<n>``; o shard de
+cada sala é fixo (CRC32 do ID), então os eventos de uma sala ficam em ordem em
+um único stream e o ID da entrada (``<ms>-<seq>``) identifica o evento.
+
+Cada servidor WebSocket lê todos os shards com o seu próprio consumer group
+(todos os nós recebem todos os eventos) e só confirma (XACK) depois de repassar
+o evento aos clientes. Um nó que reinicia continua de onde parou em vez de
+perder as jogadas publicadas enquanto estava fora.
+
+Os streams são limitados a aproximadamente ``EVENTOS_MAXLEN`` entradas cada.
+Clientes que reconectam informam o último ID recebido e recebem o que perderam
+(``eventos_desde``); se esse ID já saiu do stream, precisam recarregar o estado
+completo.
+"""
+import os
+import time
+import zlib
+
+import redis
+
+from comum import json_rapido, metricas, rastreio
+
+SHARDS = int(os.getenv("EVENTOS_SHARDS", "8"))
+MAXLEN = int(os.getenv("EVENTOS_MAXLEN", "10000"))
+
+
+def chave_stream(shard):
+    return f"eventos:{shard}"
+
+
+def shard_da_sala(sala_id):
+    return zlib.crc32(sala_id.encode()) % SHARDS
+
+
+def stream_da_sala(sala_id):
+    return chave_stream(shard_da_sala(sala_id))
+
+
+def todos_streams():
+    return [chave_stream(shard) for shard in range(SHARDS)]
+
+
+def montar(evento, sala_id, dados=None):
+    """Monta a mensagem de um evento, com o rastreio da requisição atual se houver"""
+    mensagem = {
+        "evento": evento,
+        "sala_id": sala_id,
+        "dados": dados or {},
+        "timestamp": time.time()
+    }
+    rastreio_evento = rastreio.para_evento()
+    if rastreio_evento:
+        mensagem["rastreio"] = rastreio_evento
+    return mensagem
+
+
+def publicar(cliente, mensagem):
+    """
+    Enfileira (ou executa) o XADD de um evento já montado (dicionário com
+    ``sala_id``) no stream da sala
+
+    Returns:
+        O tipo do evento, para ``contar_publicados`` depois que a gravação for
+        confirmada (em um MULTI o XADD só acontece no EXEC, que pode falhar)
+    """
+    cliente.xadd(
+        stream_da_sala(mensagem["sala_id"]),
+        {"sala_id": mensagem["sala_id"], "mensagem": json_rapido.dumps(mensagem)},
+        maxlen=MAXLEN,
+        approximate=True
+    )
+    return mensagem["evento"]
+
+
+def contar_publicados(tipos):
+    """Soma na métrica ``eventos_publicados_total`` os eventos já gravados"""
+    for tipo in tipos:
+        metricas.EVENTOS_PUBLICADOS.inc(evento=tipo)
+
+
+def decodificar(campos):
+    """Converte os campos de uma entrada do stream de volta no evento"""
+    return json_rapido.loads(campos["mensagem"])
+
+
+def criar_grupos(r, grupo):
+    """Cria o consumer group em todos os shards, começando pelos eventos novos"""
+    for stream in todos_streams():
+        try:
+            r.xgroup_create(stream, grupo, id="$", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+
+def ler_grupo(r, grupo, consumidor, pendentes=False, quantidade=100, bloquear_ms=1000):
+    """
+    Lê eventos de todos os shards pelo consumer group
+
+    Args:
+        pendentes: Reler os eventos entregues a este consumidor e ainda não
+            confirmados (usado ao reiniciar) em vez de buscar eventos novos
+
+    Returns:
+        Lista de (stream, id, evento); o evento é None quando a entrada pendente
+        já foi removida do stream (ela ainda precisa ser confirmada)
+    """
+    posicao = "0" if pendentes else ">"
+    resposta = r.xreadgroup(
+        grupo, consumidor, {stream: posicao for stream in todos_streams()},
+        count=quantidade, block=None if pendentes else bloquear_ms
+    )
+    return [
+        (stream, id_evento, decodificar(campos) if campos else None)
+        for stream, entradas in resposta or []
+        for id_evento, campos in entradas
+    ]
+
+
+def confirmar(r, grupo, lidos):
+    """XACK dos eventos lidos, agrupados por stream"""
+    por_stream = {}
+    for stream, id_evento, _ in lidos:
+        por_stream.setdefault(stream, []).append(id_evento)
+    with r.pipeline(transaction=False) as pipe:
+        for stream, ids in por_stream.items():
+            pipe.xack(stream, grupo, *ids)
+        pipe.execute()
+
+
+def id_menor(a, b):
+    """Compara dois IDs de stream ("<ms>-<seq>")"""
+    return tuple(map(int, a.split("-"))) < tuple(map(int, b.split("-")))
+
+
+def ultimo_id(r, sala_id):
+    """ID da entrada mais recente do stream da sala ("0-0" se estiver vazio)"""
+    entradas = r.xrevrange(stream_da_sala(sala_id), count=1)
+    return entradas[0][0] if entradas else "0-0"
+
+
+def eventos_desde(r, sala_id, desde, limite=500):
+    """
+    Eventos da sala posteriores ao ID ``desde``
+
+    O stream do shard é percorrido em blocos a partir de ``desde``, filtrando
+    pela sala, então o custo depende da quantidade de eventos do shard desde
+    aquele ponto.
+
+    Returns:
+        Lista de (id, evento), ou None quando o cliente precisa recarregar o
+        estado completo: ``desde`` inválido, mais antigo que o início do stream
+        (eventos já descartados) ou mais de ``limite`` eventos perdidos
+    """
+    try:
+        tuple(map(int, desde.split("-")))
+    except ValueError:
+        return None
+
+    stream = stream_da_sala(sala_id)
+    try:
+        info = r.xinfo_stream(stream)
+    except redis.ResponseError:
+        return []
+
+    # Houve perda se alguma entrada posterior a ``desde`` já foi removida. O
+    # Redis 7 informa quantas entradas o stream já recebeu; sem essa informação,
+    # qualquer ID anterior à primeira entrada é tratado como perda
+    removidas = info["entries-added"] - info["length"] if "entries-added" in info else 1
+    primeira = info.get("first-entry")
+    if removidas and primeira and id_menor(desde, primeira[0]):
+        return None
+    if id_menor(desde, info.get("max-deleted-entry-id") or "0-0"):
+        return None
+
+    eventos = []
+    inicio = f"({desde}"
+    while True:
+        entradas = r.xrange(stream, min=inicio, count=limite)
+        if not entradas:
+            return eventos
+        for id_evento, campos in entradas:
+            if campos.get("sala_id") == sala_id:
+                eventos.append((id_evento, decodificar(campos)))
+        if len(eventos) > limite:
+            return None
+        inicio = f"({entradas[-1][0]}"
@@ -0,0 +1,178 @@
+"""
+Histórico das salas (event sourcing)
+
+Cada sala tem o stream ``sala:<id>:historico`` com um registro por jogada e por
+evento do ciclo de vida da sala (criação, entrada e saída de jogadores, fim de
+jogo, reinício), gravado na mesma transação da alteração do estado.
+
+Os registros de entrada e saída de jogadores, fim de jogo e reinício, e uma a
+cada ``HISTORICO_SNAPSHOT`` jogadas, levam no campo ``campos`` o snapshot do
+estado logo depois deles (os campos do hash da sala); a criação grava um
+registro ``snapshot``. Para reconstruir o estado em qualquer ponto basta partir
+do snapshot mais recente até ele e reaplicar no máximo esse número de jogadas
+(``reconstruir``).
+
+O stream é limitado a ``HISTORICO_MAXLEN`` entradas (aproximado): entradas
+antigas cujo snapshot já foi removido não podem mais ser reconstruídas.
+"""
+import copy
+import os
+import time
+
+from comum import eventos, json_rapido, salas
+
+SNAPSHOT_A_CADA = int(os.getenv("HISTORICO_SNAPSHOT", "16"))
+MAXLEN = int(os.getenv("HISTORICO_MAXLEN", "5000"))
+
+# Eventos cujo registro sempre leva o snapshot: só as jogadas comuns são
+# reaplicadas na reconstrução
+_COM_SNAPSHOT = ("jogador_entrou", "jogador_saiu", "jogo_vitoria", "jogo_empate", "jogo_reiniciado")
+
+
+class HistoricoIncompleto(Exception):
+    """A entrada pedida (ou o snapshot necessário) já foi removida do stream"""
+
+
+chave_historico = salas.chave_historico
+
+
+def _registro(evento, dados):
+    """Converte um evento do WebSocket no registro guardado no histórico (ou None)"""
+    if evento == "jogada_realizada":
+        return {"tipo": "jogada", "jogador": dados["jogador"], "simbolo": dados["simbolo"],
+                "posicao": dados["posicao"]}
+    if evento == "jogo_vitoria":
+        return {"tipo": "jogada", "jogador": dados["vencedor_nome"], "simbolo": dados["vencedor"],
+                "posicao": dados["posicao"], "resultado": "vitoria"}
+    if evento == "jogo_empate":
+        return {"tipo": "jogada", "simbolo": dados["tabuleiro"][dados["posicao"]],
+                "posicao": dados["posicao"], "resultado": "empate"}
+    if evento in ("jogador_entrou", "jogador_saiu"):
+        return {"tipo": evento, "jogador": dados["jogador_nome"], "simbolo": dados["simbolo"]}
+    if evento == "jogo_reiniciado":
+        return {"tipo": evento}
+    return None
+
+
+def _adicionar(cliente, sala_id, registro):
+    registro["timestamp"] = time.time()
+    cliente.xadd(
+        chave_historico(sala_id),
+        {"tipo": registro["tipo"], "registro": json_rapido.dumps(registro)},
+        maxlen=MAXLEN,
+        approximate=True
+    )
+
+
+def _campos(sala):
+    campos, _ = salas.codificar_campos(sala, salas.CHAVES_HASH)
+    return campos
+
+
+def registrar_criacao(cliente, sala):
+    """Enfileira (ou executa) o snapshot inicial de uma sala recém-criada"""
+    _adicionar(cliente, sala["id"], {"tipo": "snapshot", "campos": _campos(sala)})
+
+
+def registrar(cliente, sala, eventos):
+    """
+    Enfileira (ou executa) os registros dos eventos (lista de (evento, dados))
+    já aplicados à sala
+
+    Os registros que levam snapshot recebem o estado logo depois deles: a sala
+    final com as jogadas seguintes do mesmo lote desfeitas (ex.: a entrada de
+    um jogador seguida da jogada do computador).
+    """
+    registros = []
+    for evento, dados in eventos:
+        registro = _registro(evento, dados)
+        if registro:
+            registros.append((evento, registro))
+
+    estado = copy.deepcopy(sala)
+    for evento, registro in reversed(registros):
+        jogadas = sum(1 for casa in estado["tabuleiro"] if casa)
+        # Snapshot também sempre que o total de jogadas chega a um múltiplo do intervalo
+        if evento in _COM_SNAPSHOT or (registro["tipo"] == "jogada" and jogadas % SNAPSHOT_A_CADA == 0):
+            registro["campos"] = _campos(estado)
+        if registro["tipo"] == "jogada":
+            _desfazer(estado, registro)
+
+    for _, registro in registros:
+        _adicionar(cliente, sala["id"], registro)
+
+
+def ler(r, sala_id, bloco=200):
+    """Percorre o histórico em ordem, lendo ``bloco`` entradas por vez: gera (id, registro)"""
+    chave = chave_historico(sala_id)
+    inicio = "-"
+    while True:
+        entradas = r.xrange(chave, min=inicio, count=bloco)
+        for id_entrada, campos in entradas:
+            yield id_entrada, json_rapido.loads(campos["registro"])
+        if len(entradas) < bloco:
+            return
+        inicio = f"({entradas[-1][0]}"
+
+
+def _desfazer(sala, registro):
+    """Volta o dicionário da sala para antes de uma jogada"""
+    sala["tabuleiro"][registro["posicao"]] = ""
+    sala["vez"] = registro["simbolo"]
+    sala.pop("vencedor", None)
+    sala.pop("empate", None)
+
+
+def _aplicar(sala, registro):
+    """Reaplica uma jogada do histórico sobre o dicionário da sala"""
+    sala["tabuleiro"][registro["posicao"]] = registro["simbolo"]
+    if registro.get("resultado") == "vitoria":
+        sala["vencedor"] = registro["simbolo"]
+    elif registro.get("resultado") == "empate":
+        sala["empate"] = True
+    else:
+        sala["vez"] = "O" if registro["simbolo"] == "X" else "X"
+
+
+def reconstruir(r, sala_id, ate="+", bloco=None):
+    """
+    Reconstrói o estado da sala logo depois da entrada ``ate`` do histórico
+
+    Lê o histórico de trás para frente só até o snapshot mais recente (um
+    registro com ``campos``, inclusive a própria entrada ``ate``) e reaplica
+    as jogadas seguintes.
+
+    Returns:
+        Dicionário da sala (sem espectadores), ou None se a entrada não existir
+        no histórico
+
+    Raises:
+        HistoricoIncompleto: A entrada ou o snapshot anterior a ela já foi
+            removido pelo limite de tamanho do stream
+    """
+    chave = chave_historico(sala_id)
+    bloco = bloco or SNAPSHOT_A_CADA + 8
+    posteriores = []
+    fim = ate
+    while True:
+        entradas = r.xrevrange(chave, max=fim, count=bloco)
+        if fim == ate and ate not in ("+", entradas[0][0] if entradas else None):
+            # A entrada não está no stream: removida pelo limite ou inexistente
+            primeira = r.xrange(chave, count=1)
+            if primeira and eventos.id_menor(ate, primeira[0][0]):
+                raise HistoricoIncompleto(ate)
+            return None
+        for id_entrada, campos in entradas:
+            registro = json_rapido.loads(campos["registro"])
+            if "campos" in registro:
+                sala = salas.decodificar_campos(registro["campos"])
+                for posterior in reversed(posteriores):
+                    _aplicar(sala, posterior)
+                return sala
+            if registro["tipo"] == "jogada":
+                posteriores.append(registro)
+        if len(entradas) < bloco:
+            if entradas or posteriores:
+                raise HistoricoIncompleto(ate)
+            return None
+        fim = f"({entradas[-1][0]}"
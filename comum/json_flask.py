@@ -0,0 +1,39 @@
+"""
+Provedor JSON do Flask com a serialização de comum/json_rapido.py
+
+Substitui o provedor padrão em ``jsonify``, ``request.json`` e nas respostas
+que retornam dicionários. Tipos que o orjson não conhece (Decimal, objetos com
+``__html__``) passam pelo conversor do provedor padrão do Flask.
+
+Uso:
+    configurar(app)
+"""
+from flask.json.provider import DefaultJSONProvider
+
+from comum import json_rapido
+
+
+class ProvedorJSON(DefaultJSONProvider):
+    # Mantém a ordem de inserção das chaves (o provedor padrão ordena)
+    sort_keys = False
+
+    def _indentar(self):
+        return self.compact is False or (self.compact is None and self._app.debug)
+
+    def dumps(self, obj, **kwargs):
+        return json_rapido.dumps(obj, default=self.default, ordenar=self.sort_keys)
+
+    def loads(self, s, **kwargs):
+        return json_rapido.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        corpo = json_rapido.dumps_bytes(
+            obj, default=self.default, indentar=self._indentar(), ordenar=self.sort_keys
+        )
+        return self._app.response_class(corpo, mimetype=self.mimetype)
+
+
+def configurar(app):
+    """Instala o provedor no app"""
+    app.json = ProvedorJSON(app)
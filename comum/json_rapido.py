@@ -0,0 +1,54 @@
+"""
+Serialização JSON usada por todos os serviços
+
+Usa o orjson quando ele está instalado e o ``json`` da biblioteca padrão caso
+contrário; ``JSON_BACKEND=json`` força a biblioteca padrão (por exemplo para
+comparar os dois). As duas implementações produzem JSON equivalente, mas não
+byte a byte: o orjson não escapa caracteres não ASCII e não põe espaços depois
+de ``,`` e ``:``.
+
+    dumps(obj)        str
+    dumps_bytes(obj)  bytes em UTF-8, sem a cópia para str (corpo de respostas)
+    loads(texto)      aceita str ou bytes
+
+Erros de decodificação são ``json.JSONDecodeError`` com os dois backends (o
+erro do orjson é uma subclasse dele).
+"""
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if os.getenv("JSON_BACKEND", "orjson") == "json":
+    orjson = None
+
+BACKEND = "orjson" if orjson else "json"
+
+# Chaves não str (ex.: int) são convertidas como no json da biblioteca padrão
+_OPCOES_ORJSON = orjson.OPT_NON_STR_KEYS if orjson else 0
+
+
+if orjson:
+    def dumps_bytes(obj, default=None, indentar=False, ordenar=False):
+        opcoes = _OPCOES_ORJSON
+        if indentar:
+            opcoes |= orjson.OPT_INDENT_2
+        if ordenar:
+            opcoes |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=default, option=opcoes)
+
+    def dumps(obj, default=None, indentar=False, ordenar=False):
+        return dumps_bytes(obj, default, indentar, ordenar).decode()
+
+    loads = orjson.loads
+else:
+    def dumps(obj, default=None, indentar=False, ordenar=False):
+        return json.dumps(obj, default=default, indent=2 if indentar else None, sort_keys=ordenar)
+
+    def dumps_bytes(obj, default=None, indentar=False, ordenar=False):
+        return dumps(obj, default, indentar, ordenar).encode()
+
+    loads = json.loads
@@ -0,0 +1,174 @@
+"""
+Logs estruturados e assíncronos dos serviços
+
+``configurar`` troca os handlers do logger raiz por um ``QueueHandler``: a
+thread que loga só coloca o registro em uma fila, e uma thread própria
+(``QueueListener``) formata e escreve na saída. Se a fila encher
+(``LOG_FILA``), o registro é descartado em vez de bloquear a requisição; os
+descartes são contados em ``estatisticas()``.
+
+Eventos frequentes usam ``evento(logger, nome, **campos)``, que gera um
+registro chave/valor formatado só na thread de escrita:
+
+    2026-01-01 12:00:00,000 INFO rest jogada sala_id=sala1 jogador=Ana posicao=4
+
+Cada nome de evento pode ter uma taxa de amostragem; a decisão é tomada antes
+de montar o registro, então eventos descartados custam só um sorteio. Os
+registros amostrados trazem ``amostragem=<taxa>`` para os totais poderem ser
+estimados.
+
+Variáveis de ambiente:
+    LOG_NIVEL        nível mínimo (padrão INFO)
+    LOG_FORMATO      texto (padrão) ou json, um objeto por linha
+    LOG_AMOSTRAGEM   taxas por evento, ex.: "jogada=0.1,chat=0.05" (padrão: todos)
+    LOG_FILA         capacidade da fila (padrão 10000)
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+
+from comum import json_rapido
+
+NIVEL = os.getenv("LOG_NIVEL", "INFO").upper()
+FORMATO = os.getenv("LOG_FORMATO", "texto")
+CAPACIDADE_FILA = int(os.getenv("LOG_FILA", "10000"))
+
+
+def _ler_taxas(texto):
+    taxas = {}
+    for item in filter(None, (parte.strip() for parte in texto.split(","))):
+        nome, _, taxa = item.partition("=")
+        taxas[nome.strip()] = float(taxa)
+    return taxas
+
+
+TAXAS = _ler_taxas(os.getenv("LOG_AMOSTRAGEM", ""))
+
+_descartados = 0
+_lock_descartados = threading.Lock()
+_listener = None
+
+
+class HandlerFila(logging.handlers.QueueHandler):
+    """QueueHandler que não formata na thread de origem e descarta com a fila cheia"""
+
+    def prepare(self, record):
+        # A formatação fica para a thread de escrita; a fila é do mesmo
+        # processo, então o registro não precisa ser serializável
+        return record
+
+    def enqueue(self, record):
+        global _descartados
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with _lock_descartados:
+                _descartados += 1
+
+
+class FormatadorTexto(logging.Formatter):
+    """Mensagem seguida dos campos estruturados como chave=valor"""
+
+    def __init__(self, servico):
+        super().__init__(f"%(asctime)s %(levelname)s {servico} %(message)s")
+
+    def formatMessage(self, record):
+        texto = super().formatMessage(record)
+        campos = getattr(record, "campos", None)
+        if campos:
+            texto += " " + " ".join(f"{chave}={valor}" for chave, valor in campos.items())
+        return texto
+
+
+class FormatadorJSON(logging.Formatter):
+    """Um objeto JSON por linha com os campos estruturados no primeiro nível"""
+
+    def __init__(self, servico):
+        super().__init__()
+        self.servico = servico
+
+    def format(self, record):
+        dados = {
+            "timestamp": record.created,
+            "nivel": record.levelname,
+            "servico": self.servico,
+            "logger": record.name,
+            "mensagem": record.getMessage()
+        }
+        dados.update(getattr(record, "campos", None) or {})
+        if record.exc_info:
+            dados["excecao"] = self.formatException(record.exc_info)
+        return json_rapido.dumps(dados, default=str)
+
+
+def _iniciar(handler_saida):
+    global _listener
+    fila = queue.Queue(CAPACIDADE_FILA)
+    _listener = logging.handlers.QueueListener(fila, handler_saida, respect_handler_level=True)
+    _listener.start()
+    return fila
+
+
+def configurar(servico, nivel=None):
+    """
+    Direciona os logs do processo para a fila assíncrona
+
+    Args:
+        servico: Nome do serviço incluído em cada registro
+        nivel: Nível mínimo (padrão ``LOG_NIVEL``)
+    """
+    parar()
+    saida = logging.StreamHandler()
+    saida.setFormatter(FormatadorJSON(servico) if FORMATO == "json" else FormatadorTexto(servico))
+
+    handler = HandlerFila(_iniciar(saida))
+    raiz = logging.getLogger()
+    for antigo in raiz.handlers[:]:
+        raiz.removeHandler(antigo)
+    raiz.addHandler(handler)
+    raiz.setLevel(nivel or NIVEL)
+
+    # A thread de escrita não sobrevive ao fork (workers do gunicorn com
+    # preload_app): cada processo filho cria fila e thread próprias
+    def reiniciar_no_filho():
+        handler.queue = _iniciar(saida)
+
+    os.register_at_fork(after_in_child=reiniciar_no_filho)
+    atexit.register(parar)
+
+
+def parar():
+    """Escreve os registros pendentes e encerra a thread de escrita"""
+    global _listener
+    if _listener:
+        _listener.stop()
+        _listener = None
+
+
+def evento(logger, nome, nivel=logging.INFO, **campos):
+    """
+    Registra um evento estruturado, respeitando o nível e a amostragem do nome
+
+    Os valores dos campos só são convertidos em texto na thread de escrita, então
+    devem ser valores simples que não mudam depois da chamada.
+    """
+    if not logger.isEnabledFor(nivel):
+        return
+    taxa = TAXAS.get(nome, 1.0)
+    if taxa < 1.0:
+        if random.random() >= taxa:
+            return
+        campos["amostragem"] = taxa
+    logger.log(nivel, nome, extra={"campos": campos})
+
+
+def estatisticas():
+    return {
+        "fila": _listener.queue.qsize() if _listener else 0,
+        "descartados": _descartados,
+        "amostragem": TAXAS
+    }
@@ -0,0 +1,357 @@
+"""
+Métricas no formato de texto do Prometheus
+
+Cada serviço expõe ``GET /metrics`` com as métricas do processo, mantidas em
+memória por contadores, medidores e histogramas deste módulo (sem dependências
+externas). Atualizar uma métrica custa um lock e uma soma; o texto só é montado
+quando o endpoint é consultado.
+
+    http_requisicoes_segundos      histograma por serviço, método, rota e status
+    redis_comandos_segundos        histograma por comando (pipelines como
+                                   PIPELINE ou MULTI)
+    eventos_publicados_total       eventos gravados nos streams, por tipo
+    websocket_*                    conexões por sala, eventos repassados e
+                                   duração dos broadcasts (websocket/main.py)
+
+Com vários processos (workers do gunicorn) cada um mantém as suas métricas em
+memória e, com ``METRICAS_DIR`` definido, grava uma cópia dos contadores e
+histogramas em ``<METRICAS_DIR>/<pid>.json`` a cada ``METRICAS_INTERVALO``
+segundos (padrão 5). O processo que recebe o scrape grava a sua cópia e soma os
+arquivos de todos, então ``/metrics`` mostra o serviço inteiro, com os valores
+dos outros workers atrasados no máximo esse intervalo. Os arquivos de workers
+encerrados continuam somando, para os contadores nunca diminuírem; o diretório
+é limpo quando o serviço sobe (ver rest/gunicorn.conf.py). Medidores não são
+somados: cada processo exporta só os seus.
+"""
+import atexit
+import bisect
+import glob
+import os
+import threading
+import time
+
+from comum import json_rapido
+
+# Limites padrão dos histogramas de latência (segundos)
+LIMITES_PADRAO = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+TIPO_CONTEUDO = "text/plain; version=0.0.4; charset=utf-8"
+
+DIRETORIO = os.getenv("METRICAS_DIR")
+INTERVALO_GRAVACAO = float(os.getenv("METRICAS_INTERVALO", "5"))
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formatar_rotulos(nomes, valores, extra=""):
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _numero(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Registro:
+    """Conjunto de métricas exportadas por um processo"""
+
+    def __init__(self, diretorio=DIRETORIO):
+        self.metricas = []
+        self.diretorio = diretorio
+        self._lock = threading.Lock()
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+            self._iniciar_gravacao()
+            # A thread de gravação não sobrevive ao fork: cada worker cria a sua
+            # e começa do zero (o que o processo pai contou fica no arquivo dele)
+            os.register_at_fork(after_in_child=self._reiniciar_no_filho)
+            atexit.register(self.gravar_estado)
+
+    def registrar(self, metrica):
+        with self._lock:
+            self.metricas.append(metrica)
+        return metrica
+
+    def exportar(self):
+        """Texto no formato de exposição do Prometheus (somando os processos com ``diretorio``)"""
+        somados = self._somar_processos() if self.diretorio else {}
+        linhas = []
+        for metrica in list(self.metricas):
+            linhas.append(f"# HELP {metrica.nome} {metrica.ajuda}")
+            linhas.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+            if metrica.nome in somados:
+                linhas.extend(metrica.linhas(somados[metrica.nome]))
+            else:
+                linhas.extend(metrica.linhas())
+        return "\n".join(linhas) + "\n"
+
+    def estado(self):
+        """Valores dos contadores e histogramas, no formato gravado em arquivo"""
+        return {
+            metrica.nome: [[list(chave), valor] for chave, valor in metrica.valores()]
+            for metrica in list(self.metricas) if metrica.somavel
+        }
+
+    def gravar_estado(self):
+        arquivo = os.path.join(self.diretorio, f"{os.getpid()}.json")
+        temporario = f"{arquivo}.tmp"
+        with open(temporario, "wb") as saida:
+            saida.write(json_rapido.dumps_bytes(self.estado()))
+        os.replace(temporario, arquivo)
+
+    def _reiniciar_no_filho(self):
+        for metrica in self.metricas:
+            if metrica.somavel:
+                metrica.zerar()
+        self._iniciar_gravacao()
+
+    def _iniciar_gravacao(self):
+        def gravar_periodicamente():
+            while True:
+                time.sleep(INTERVALO_GRAVACAO)
+                try:
+                    self.gravar_estado()
+                except OSError:
+                    pass
+
+        threading.Thread(target=gravar_periodicamente, name="metricas", daemon=True).start()
+
+    def _somar_processos(self):
+        """Valores de todos os processos somados: {nome: {chave: valor}}"""
+        self.gravar_estado()
+        metricas = {metrica.nome: metrica for metrica in self.metricas if metrica.somavel}
+        somados = {}
+        for arquivo in glob.glob(os.path.join(self.diretorio, "*.json")):
+            try:
+                with open(arquivo, "rb") as entrada:
+                    estado = json_rapido.loads(entrada.read())
+            except (OSError, ValueError):
+                continue
+            for nome, valores in estado.items():
+                if nome not in metricas:
+                    continue
+                destino = somados.setdefault(nome, {})
+                for chave, valor in valores:
+                    chave = tuple(chave)
+                    destino[chave] = metricas[nome].somar(destino.get(chave), valor)
+        return {nome: list(valores.items()) for nome, valores in somados.items()}
+
+
+REGISTRO = Registro()
+
+
+class _Metrica:
+    tipo = ""
+    # Somada entre processos (contadores e histogramas)
+    somavel = True
+
+    def __init__(self, nome, ajuda, rotulos=(), registro=REGISTRO):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._valores = {}
+        self._lock = threading.Lock()
+        registro.registrar(self)
+
+    def _chave(self, rotulos):
+        return tuple(str(rotulos[nome]) for nome in self.rotulos)
+
+    def valores(self):
+        with self._lock:
+            return list(self._valores.items())
+
+    def zerar(self):
+        with self._lock:
+            self._valores.clear()
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def inc(self, valor=1, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def valor(self, **rotulos):
+        """Valor atual neste processo"""
+        with self._lock:
+            return self._valores.get(self._chave(rotulos), 0)
+
+    @staticmethod
+    def somar(atual, valor):
+        return (atual or 0) + valor
+
+    def linhas(self, valores=None):
+        if valores is None:
+            valores = self.valores()
+        return [f"{self.nome}{_formatar_rotulos(self.rotulos, chave)} {_numero(v)}" for chave, v in valores]
+
+
+class Medidor(_Metrica):
+    """
+    Valor que sobe e desce; com ``coletar`` (função que retorna pares
+    (valores dos rótulos, valor)) o valor é calculado só na exportação
+    """
+    tipo = "gauge"
+    somavel = False
+
+    def __init__(self, nome, ajuda, rotulos=(), registro=REGISTRO, coletar=None):
+        super().__init__(nome, ajuda, rotulos, registro)
+        self.coletar = coletar
+
+    def definir(self, valor, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = valor
+
+    def linhas(self, valores=None):
+        if self.coletar:
+            valores = [(tuple(chave), v) for chave, v in self.coletar()]
+        else:
+            valores = self.valores()
+        return [f"{self.nome}{_formatar_rotulos(self.rotulos, chave)} {_numero(v)}" for chave, v in valores]
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nome, ajuda, rotulos=(), registro=REGISTRO, limites=LIMITES_PADRAO):
+        super().__init__(nome, ajuda, rotulos, registro)
+        self.limites = tuple(sorted(limites))
+
+    def observar(self, valor, **rotulos):
+        chave = self._chave(rotulos)
+        indice = bisect.bisect_left(self.limites, valor)
+        with self._lock:
+            serie = self._valores.get(chave)
+            if serie is None:
+                # Contagem por faixa (a última é +Inf) e soma
+                serie = self._valores[chave] = [[0] * (len(self.limites) + 1), 0.0]
+            serie[0][indice] += 1
+            serie[1] += valor
+
+    def medir(self, **rotulos):
+        """Context manager que observa a duração do bloco"""
+        return _Cronometro(self, rotulos)
+
+    def valores(self):
+        with self._lock:
+            return [(chave, [list(faixas), soma]) for chave, (faixas, soma) in self._valores.items()]
+
+    @staticmethod
+    def somar(atual, valor):
+        if atual is None:
+            return [list(valor[0]), valor[1]]
+        return [[a + b for a, b in zip(atual[0], valor[0])], atual[1] + valor[1]]
+
+    def linhas(self, valores=None):
+        if valores is None:
+            valores = self.valores()
+        linhas = []
+        for chave, (faixas, soma) in valores:
+            acumulado = 0
+            for limite, quantidade in zip(self.limites + (float("inf"),), faixas):
+                acumulado += quantidade
+                rotulos = _formatar_rotulos(self.rotulos, chave, f'le="{_numero(limite)}"')
+                linhas.append(f"{self.nome}_bucket{rotulos} {acumulado}")
+            rotulos = _formatar_rotulos(self.rotulos, chave)
+            linhas.append(f"{self.nome}_sum{rotulos} {_numero(soma)}")
+            linhas.append(f"{self.nome}_count{rotulos} {acumulado}")
+        return linhas
+
+
+class _Cronometro:
+    def __init__(self, histograma, rotulos):
+        self.histograma = histograma
+        self.rotulos = rotulos
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *erro):
+        self.histograma.observar(time.perf_counter() - self.inicio, **self.rotulos)
+
+
+REQUISICOES = Histograma(
+    "http_requisicoes_segundos", "Duração das requisições HTTP",
+    ("servico", "metodo", "rota", "status")
+)
+COMANDOS_REDIS = Histograma(
+    "redis_comandos_segundos", "Duração dos comandos Redis (pipelines contam como um)",
+    ("comando",)
+)
+EVENTOS_PUBLICADOS = Contador(
+    "eventos_publicados_total", "Eventos gravados nos streams, por tipo", ("evento",)
+)
+
+
+def instrumentar_flask(app, servico):
+    """Mede as requisições do app Flask e adiciona a rota ``GET /metrics``"""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _iniciar_medicao():
+        g.inicio_requisicao = time.perf_counter()
+
+    @app.after_request
+    def _registrar_medicao(resposta):
+        inicio = g.pop("inicio_requisicao", None)
+        if inicio is not None:
+            # A rota (ex.: /salas/<sala_id>) em vez do caminho mantém poucas séries
+            rota = request.url_rule.rule if request.url_rule else "desconhecida"
+            REQUISICOES.observar(
+                time.perf_counter() - inicio,
+                servico=servico, metodo=request.method, rota=rota, status=resposta.status_code
+            )
+        return resposta
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        """
+        Métricas no formato do Prometheus
+        ---
+        tags:
+          - Sistema
+        responses:
+          200:
+            description: Latência por rota, comandos Redis e eventos publicados
+        """
+        return Response(REGISTRO.exportar(), mimetype=TIPO_CONTEUDO)
+
+
+def instrumentar_wsgi(app_wsgi, servico, rota="/"):
+    """
+    Envolve uma aplicação WSGI: mede as requisições (todas com a mesma ``rota``)
+    e responde ``GET /metrics``
+    """
+    def aplicacao(environ, start_response):
+        if environ.get("PATH_INFO") == "/metrics" and environ.get("REQUEST_METHOD") == "GET":
+            corpo = REGISTRO.exportar().encode()
+            start_response("200 OK", [("Content-Type", TIPO_CONTEUDO), ("Content-Length", str(len(corpo)))])
+            return [corpo]
+
+        inicio = time.perf_counter()
+        status = []
+
+        def registrar_status(linha_status, cabecalhos, exc_info=None):
+            status.append(linha_status.split(" ", 1)[0])
+            return start_response(linha_status, cabecalhos, exc_info)
+
+        try:
+            return app_wsgi(environ, registrar_status)
+        finally:
+            REQUISICOES.observar(
+                time.perf_counter() - inicio,
+                servico=servico, metodo=environ.get("REQUEST_METHOD", ""), rota=rota,
+                status=status[0] if status else "500"
+            )
+
+    return aplicacao
@@ -0,0 +1,132 @@
+"""
+Rastreio de ponta a ponta das requisições (gateway -> REST -> Redis -> WebSocket)
+
+O gateway cria um ID para cada requisição (ou aceita o ``X-Trace-Id`` enviado
+pelo cliente) e o repassa à REST API junto com o horário em que recebeu a
+requisição. Cada serviço acrescenta a sua etapa, e os eventos publicados
+durante a requisição levam o rastreio no campo ``rastreio`` da mensagem:
+
+    {"id": "6f1c...", "etapas": [["gateway", 1700000000.101],
+                                 ["rest", 1700000000.103],
+                                 ["evento", 1700000000.104]]}
+
+O servidor WebSocket completa com ``lido`` (evento lido do stream) e
+``enviado`` (broadcast concluído) e registra a duração de cada trecho nas
+métricas ``rastreio_trecho_segundos`` e ``rastreio_total_segundos``.
+
+As etapas usam o relógio de cada container; entre máquinas diferentes os
+trechos incluem a diferença entre os relógios.
+
+O gateway, que recebe as requisições dos clientes, aceita só o ``X-Trace-Id`` e
+começa as etapas do zero (``aceitar_etapas=False``). Os outros serviços aceitam
+as etapas recebidas, mas só com os nomes de ``ETAPAS``: os trechos viram
+rótulos de métricas, e nomes livres criariam séries sem limite.
+"""
+import contextvars
+import time
+import uuid
+
+CABECALHO_ID = "X-Trace-Id"
+CABECALHO_ETAPAS = "X-Trace-Etapas"
+
+# Nomes das etapas, na ordem em que acontecem
+ETAPAS = ("gateway", "rest", "evento", "lido", "enviado")
+
+_atual = contextvars.ContextVar("rastreio", default=None)
+
+
+def novo_id():
+    return uuid.uuid4().hex
+
+
+def _ler_etapas(texto):
+    etapas = []
+    for item in filter(None, (texto or "").split(";")):
+        nome, _, instante = item.partition("=")
+        if nome not in ETAPAS:
+            continue
+        try:
+            etapas.append([nome, float(instante)])
+        except ValueError:
+            continue
+    return etapas[:len(ETAPAS)]
+
+
+def iniciar(servico, cabecalhos, gerar=True, aceitar_etapas=True):
+    """
+    Começa o rastreio da requisição atual a partir dos cabeçalhos recebidos,
+    acrescentando a etapa ``servico``
+
+    Args:
+        aceitar_etapas: Continuar as etapas do ``X-Trace-Etapas`` recebido
+            (False na borda, onde o cabeçalho vem do cliente)
+
+    Returns:
+        Token para ``encerrar``
+    """
+    id_rastreio = cabecalhos.get(CABECALHO_ID)
+    if not id_rastreio:
+        if not gerar:
+            return _atual.set(None)
+        id_rastreio = novo_id()
+    etapas = _ler_etapas(cabecalhos.get(CABECALHO_ETAPAS)) if aceitar_etapas else []
+    etapas.append([servico, time.time()])
+    return _atual.set({"id": id_rastreio[:64], "etapas": etapas})
+
+
+def encerrar(token):
+    _atual.reset(token)
+
+
+def atual():
+    """Rastreio da requisição atual (ou None)"""
+    return _atual.get()
+
+
+def cabecalhos(extras=None):
+    """Cabeçalhos para repassar o rastreio atual a outro serviço (somados a ``extras``)"""
+    extras = dict(extras or {})
+    rastreio = _atual.get()
+    if rastreio:
+        extras[CABECALHO_ID] = rastreio["id"]
+        extras[CABECALHO_ETAPAS] = ";".join(f"{nome}={instante:.6f}" for nome, instante in rastreio["etapas"])
+    return extras
+
+
+def para_evento():
+    """Cópia do rastreio atual com a etapa ``evento``, para incluir em uma mensagem publicada"""
+    rastreio = _atual.get()
+    if not rastreio:
+        return None
+    return {"id": rastreio["id"], "etapas": rastreio["etapas"] + [["evento", time.time()]]}
+
+
+def trechos(etapas):
+    """Pares (``origem->destino``, segundos) entre etapas consecutivas de nomes conhecidos"""
+    etapas = [etapa for etapa in etapas if etapa[0] in ETAPAS]
+    return [
+        (f"{anterior[0]}->{seguinte[0]}", seguinte[1] - anterior[1])
+        for anterior, seguinte in zip(etapas, etapas[1:])
+    ]
+
+
+def instrumentar_flask(app, servico, gerar=True, aceitar_etapas=True):
+    """Inicia o rastreio em cada requisição e devolve o ID no cabeçalho da resposta"""
+    from flask import g, request
+
+    @app.before_request
+    def _iniciar_rastreio():
+        g.token_rastreio = iniciar(servico, request.headers, gerar, aceitar_etapas)
+
+    @app.after_request
+    def _responder_id(resposta):
+        rastreio = _atual.get()
+        if rastreio:
+            resposta.headers[CABECALHO_ID] = rastreio["id"]
+        return resposta
+
+    @app.teardown_request
+    def _encerrar_rastreio(erro=None):
+        token = g.pop("token_rastreio", None)
+        if token is not None:
+            encerrar(token)
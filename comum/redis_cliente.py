@@ -0,0 +1,207 @@
+"""
+Fábrica do cliente Redis usada por todos os serviços
+
+A configuração vem do ambiente (o docker-compose.yml já define REDIS_HOST e
+REDIS_PORT):
+
+    REDIS_HOST                host do Redis (padrão "redis")
+    REDIS_PORT                porta (padrão 6379)
+    REDIS_DB                  banco (padrão 0)
+    REDIS_MAX_CONEXOES        tamanho do pool por processo (padrão 50); quando
+                              todas estão em uso a requisição espera uma conexão
+                              livre em vez de abrir outra
+    REDIS_ESPERA_POOL         segundos esperando uma conexão livre (padrão 5)
+    REDIS_TIMEOUT             timeout de leitura/escrita em segundos (padrão 5)
+    REDIS_TIMEOUT_CONEXAO     timeout para abrir a conexão (padrão 2)
+    REDIS_HEALTH_CHECK        segundos sem uso antes de a conexão ser testada
+                              com PING ao sair do pool (padrão 30)
+    REDIS_TENTATIVAS          novas tentativas após erro de conexão, com espera
+                              exponencial (padrão 3); timeouts não são repetidos
+    ARMAZENAMENTO             redis (padrão) ou memoria
+
+Os serviços só falam com o armazenamento pelo cliente criado aqui (direto ou
+pelos módulos salas, eventos e historico). Com ``ARMAZENAMENTO=memoria`` o
+cliente guarda tudo na memória do próprio processo, sem rede: todos os
+clientes do processo compartilham os mesmos dados, então os serviços precisam
+rodar juntos (ver ``embutido.py``). Serve para rodar o jogo sem Docker, em
+testes e em benchmarks; os dados somem quando o processo termina. Requer o
+pacote ``fakeredis[lua]`` (os scripts Lua também são executados).
+
+As conexões usam keep-alive de TCP, então conexões mortas (por exemplo depois
+de uma falha de rede) são detectadas pelo sistema operacional em vez de
+travarem a próxima requisição.
+
+A duração de cada comando (e de cada pipeline, como um só) vai para a métrica
+``redis_comandos_segundos`` (ver comum/metricas.py).
+"""
+import os
+import socket
+import threading
+import time
+
+import redis
+from redis.backoff import ExponentialBackoff
+from redis.client import Pipeline
+from redis.retry import Retry
+
+from comum import metricas
+
+try:
+    import fakeredis
+except ImportError:  # só é necessário com ARMAZENAMENTO=memoria
+    fakeredis = None
+
+ARMAZENAMENTO = os.getenv("ARMAZENAMENTO", "redis")
+
+# Opções de keep-alive: primeira sonda após 60 s ociosos, depois a cada 10 s,
+# desistindo após 3 sem resposta (só onde o sistema expõe as opções)
+_KEEPALIVE = {
+    getattr(socket, nome): valor
+    for nome, valor in (("TCP_KEEPIDLE", 60), ("TCP_KEEPINTVL", 10), ("TCP_KEEPCNT", 3))
+    if hasattr(socket, nome)
+}
+
+
+def _inteiro(nome, padrao):
+    return int(os.getenv(nome, padrao))
+
+
+def _decimal(nome, padrao):
+    return float(os.getenv(nome, padrao))
+
+
+def configuracao():
+    """Parâmetros de conexão lidos do ambiente"""
+    return {
+        "host": os.getenv("REDIS_HOST", "redis"),
+        "port": _inteiro("REDIS_PORT", 6379),
+        "db": _inteiro("REDIS_DB", 0),
+        "max_conexoes": _inteiro("REDIS_MAX_CONEXOES", 50),
+        "espera_pool": _decimal("REDIS_ESPERA_POOL", 5),
+        "timeout": _decimal("REDIS_TIMEOUT", 5),
+        "timeout_conexao": _decimal("REDIS_TIMEOUT_CONEXAO", 2),
+        "health_check": _inteiro("REDIS_HEALTH_CHECK", 30),
+        "tentativas": _inteiro("REDIS_TENTATIVAS", 3)
+    }
+
+
+class PipelineMedido(Pipeline):
+    def execute(self, raise_on_error=True):
+        comando = "MULTI" if self.transaction else "PIPELINE"
+        with metricas.COMANDOS_REDIS.medir(comando=comando):
+            return super().execute(raise_on_error)
+
+
+class RedisMedido(redis.Redis):
+    """Cliente que registra a duração dos comandos"""
+
+    def execute_command(self, *args, **options):
+        with metricas.COMANDOS_REDIS.medir(comando=str(args[0]).upper()):
+            return super().execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return PipelineMedido(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+# Armazenamento em memória: um servidor por processo e uma condição avisada a
+# cada escrita em stream, usada pelas leituras bloqueantes de streams. Os
+# scripts Lua também contam, porque podem publicar eventos (ver salas.py)
+_servidor_memoria = None
+_lock_memoria = threading.Lock()
+_mudanca = threading.Condition()
+_ESCRITAS_STREAM = {"XADD", "EVAL", "EVALSHA"}
+
+
+def _escreve_stream(args):
+    return str(args[0]).upper() in _ESCRITAS_STREAM
+
+
+def _avisar_mudanca():
+    with _mudanca:
+        _mudanca.notify_all()
+
+
+class PipelineMemoria(PipelineMedido):
+    def execute(self, raise_on_error=True):
+        # A pilha de comandos é limpa pelo execute, então é consultada antes
+        avisar = any(_escreve_stream(args) for args, _ in self.command_stack)
+        try:
+            return super().execute(raise_on_error)
+        finally:
+            if avisar:
+                _avisar_mudanca()
+
+
+class RedisMemoria(RedisMedido):
+    """Cliente do armazenamento em memória (mesma interface do cliente Redis)"""
+
+    def execute_command(self, *args, **options):
+        try:
+            return super().execute_command(*args, **options)
+        finally:
+            if _escreve_stream(args):
+                _avisar_mudanca()
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return PipelineMemoria(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+    def xreadgroup(self, groupname, consumername, streams, count=None, block=None, noack=False):
+        # O XREADGROUP bloqueante do fakeredis descarta as entradas que já
+        # estavam no stream; aqui a espera é feita com leituras sem bloqueio
+        if not block:
+            return super().xreadgroup(groupname, consumername, streams, count, None, noack)
+        limite = time.monotonic() + block / 1000
+        with _mudanca:
+            while True:
+                resposta = super().xreadgroup(groupname, consumername, streams, count, None, noack)
+                restante = limite - time.monotonic()
+                if resposta or restante <= 0:
+                    return resposta
+                _mudanca.wait(restante)
+
+
+def _criar_cliente_memoria(decode_responses):
+    global _servidor_memoria
+    if fakeredis is None:
+        raise RuntimeError("ARMAZENAMENTO=memoria requer o pacote fakeredis[lua]")
+    with _lock_memoria:
+        if _servidor_memoria is None:
+            _servidor_memoria = fakeredis.FakeServer()
+    cliente = fakeredis.FakeRedis(server=_servidor_memoria, decode_responses=decode_responses)
+    return RedisMemoria(connection_pool=cliente.connection_pool)
+
+
+def criar_cliente(decode_responses=True, **ajustes):
+    """
+    Cria um cliente Redis com pool próprio (ou do armazenamento em memória,
+    com ``ARMAZENAMENTO=memoria``)
+
+    Args:
+        decode_responses: Retornar ``str`` em vez de ``bytes``
+        **ajustes: Substituem valores de ``configuracao()`` (mesmos nomes)
+    """
+    if ARMAZENAMENTO == "memoria":
+        return _criar_cliente_memoria(decode_responses)
+    if ARMAZENAMENTO != "redis":
+        raise ValueError(f"ARMAZENAMENTO inválido: {ARMAZENAMENTO!r} (use redis ou memoria)")
+    config = {**configuracao(), **ajustes}
+    pool = redis.BlockingConnectionPool(
+        host=config["host"],
+        port=config["port"],
+        db=config["db"],
+        max_connections=config["max_conexoes"],
+        timeout=config["espera_pool"],
+        decode_responses=decode_responses,
+        socket_timeout=config["timeout"],
+        socket_connect_timeout=config["timeout_conexao"],
+        socket_keepalive=True,
+        socket_keepalive_options=_KEEPALIVE,
+        health_check_interval=config["health_check"],
+        # Só erros de conexão são repetidos: depois de um timeout o servidor pode
+        # já ter executado o comando (INCR da versão, XADD, EXEC, scripts), e
+        # repetir duplicaria eventos e versões
+        retry=Retry(ExponentialBackoff(cap=1, base=0.05), config["tentativas"],
+                    supported_errors=(redis.ConnectionError,)),
+        retry_on_error=[redis.ConnectionError]
+    )
+    return RedisMedido(connection_pool=pool)
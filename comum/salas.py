@@ -0,0 +1,642 @@
+"""
+Layout das salas no Redis
+
+Cada sala é um hash ``sala:<id>`` com um campo por informação, de modo que cada
+operação lê e grava só o que usa:
+
+    id, ip, porta, vez     texto
+    tamanho, sequencia     inteiros
+    tabuleiro              casas no formato do codec configurado (comum/codec.py)
+    jogadores              símbolos concatenados na ordem de entrada ("XO")
+    nome:X, nome:O         nome de cada jogador
+    vencedor               símbolo do vencedor (ausente se não houver)
+    empate                 "1" (ausente se não houver)
+    ia:simbolo,
+    ia:dificuldade         configuração do computador (ausentes sem computador)
+
+Os espectadores ficam fora do hash, no set ``sala:<id>:espectadores``: entrar,
+sair e conferir se alguém é espectador custam O(1) (SADD, SREM, SISMEMBER) e o
+total vem do SCARD. As respostas e eventos levam só o total; a lista é lida
+em páginas com ``listar_espectadores``.
+
+A versão da sala é o contador ``sala:<id>:versao``, incrementado na mesma
+transação de toda alteração do hash ou do set de espectadores. Ele fica fora
+do hash para que a entrada de espectadores não invalide o WATCH das jogadas.
+
+O histórico de cada sala fica no stream ``sala:<id>:historico`` (ver
+comum/historico.py).
+
+Todas as chaves da sala expiram por inatividade: cada alteração renova o prazo
+(``SALA_TTL``, ou ``SALA_TTL_FINALIZADA`` para jogos encerrados) no sorted set
+``salas:expiracao``. O varredor (``expirar_vencidas``, executado pelo servidor
+WebSocket) remove as salas vencidas e publica ``sala_expirada``; as chaves
+também recebem EXPIRE com uma folga, para sumirem mesmo sem varredor.
+
+Os índices por status são sorted sets ``salas:status:<status>`` com os IDs das
+salas e, como pontuação, o momento em que a sala entrou no status. Eles são
+atualizados (``indexar_status``) na mesma transação das alterações da sala.
+
+Salas antigas gravadas como um único JSON, e espectadores ainda gravados como
+lista, são convertidos na primeira vez em que são acessados (``com_migracao``)
+ou de uma vez com ``migrar_todas``.
+"""
+import json
+import os
+import time
+
+import redis
+
+from comum import codec, eventos, json_rapido
+
+SIMBOLOS = ("X", "O")
+
+CHAVE_CONTADOR = "contador_salas"
+
+STATUS = ("aguardando_jogadores", "em_andamento", "finalizado_vitoria", "finalizado_empate")
+
+CHAVE_EXPIRACAO = "salas:expiracao"
+
+# Segundos sem alterações até a sala expirar, em andamento e encerrada
+TTL_SALA = int(os.getenv("SALA_TTL", "86400"))
+TTL_SALA_FINALIZADA = int(os.getenv("SALA_TTL_FINALIZADA", "3600"))
+
+# Folga do EXPIRE das chaves em relação ao prazo do varredor
+FOLGA_EXPIRACAO = int(os.getenv("SALA_FOLGA_EXPIRACAO", "3600"))
+
+# Chaves lógicas do dicionário da sala que vivem no hash
+CHAVES_HASH = (
+    "id", "ip", "porta", "vez", "tamanho", "sequencia", "tabuleiro",
+    "jogadores", "nomes", "vencedor", "empate", "ia"
+)
+
+
+def gerar_id(r):
+    """Gera o ID da próxima sala ("sala1", "sala2", ...)"""
+    return f"sala{r.incr(CHAVE_CONTADOR)}"
+
+
+def chave_sala(sala_id):
+    return f"sala:{sala_id}"
+
+
+def chave_espectadores(sala_id):
+    return f"sala:{sala_id}:espectadores"
+
+
+def chave_versao(sala_id):
+    return f"sala:{sala_id}:versao"
+
+
+def chave_historico(sala_id):
+    return f"sala:{sala_id}:historico"
+
+
+def chaves_da_sala(sala_id):
+    """Todas as chaves próprias da sala"""
+    return [chave_sala(sala_id), chave_espectadores(sala_id), chave_versao(sala_id), chave_historico(sala_id)]
+
+
+def chave_status(status):
+    return f"salas:status:{status}"
+
+
+def id_da_chave(chave):
+    """ID da sala de uma chave ``sala:<id>``, ou None para as chaves auxiliares"""
+    sala_id = chave.split(":", 1)[1]
+    return None if ":" in sala_id else sala_id
+
+
+def incrementar_versao(cliente, sala_id):
+    """Enfileira (ou executa) o incremento da versão da sala"""
+    cliente.incr(chave_versao(sala_id))
+
+
+def nova_sala(sala_id, ip, porta, tamanho=3, sequencia=3):
+    """Dicionário de uma sala recém-criada"""
+    return {
+        "id": sala_id,
+        "ip": ip,
+        "porta": porta,
+        "jogadores": [],
+        "tabuleiro": [""] * (tamanho * tamanho),
+        "tamanho": tamanho,
+        "sequencia": sequencia,
+        "vez": "X"
+    }
+
+
+def criar_sala(cliente, sala):
+    """
+    Enfileira (ou executa) a gravação de uma sala nova (de ``nova_sala``):
+    campos, versão, índice de status, snapshot inicial do histórico e prazo de
+    expiração, nessa ordem
+    """
+    from comum import historico  # historico importa este módulo
+
+    gravar_campos(cliente, sala)
+    incrementar_versao(cliente, sala["id"])
+    indexar_status(cliente, sala)
+    historico.registrar_criacao(cliente, sala)
+    renovar_expiracao(cliente, sala)
+
+
+def codificar_campos(sala, chaves=CHAVES_HASH, codec_tabuleiro=None):
+    """
+    Converte as chaves indicadas do dicionário da sala em campos do hash
+
+    Returns:
+        Tupla (campos a gravar, campos a remover)
+    """
+    gravar = {}
+    remover = []
+
+    for chave in chaves:
+        if chave in ("id", "ip", "porta", "vez"):
+            if chave in sala:
+                gravar[chave] = str(sala[chave])
+        elif chave in ("tamanho", "sequencia"):
+            gravar[chave] = str(sala.get(chave, 3))
+        elif chave == "tabuleiro":
+            gravar["tabuleiro"] = codec.codificar_tabuleiro(sala["tabuleiro"], codec_tabuleiro)
+        elif chave == "jogadores":
+            gravar["jogadores"] = "".join(sala.get("jogadores", []))
+        elif chave == "nomes":
+            nomes = sala.get("nomes", {})
+            for simbolo in SIMBOLOS:
+                if simbolo in nomes:
+                    gravar[f"nome:{simbolo}"] = nomes[simbolo]
+                else:
+                    remover.append(f"nome:{simbolo}")
+        elif chave == "vencedor":
+            if sala.get("vencedor"):
+                gravar["vencedor"] = sala["vencedor"]
+            else:
+                remover.append("vencedor")
+        elif chave == "empate":
+            if sala.get("empate"):
+                gravar["empate"] = "1"
+            else:
+                remover.append("empate")
+        elif chave == "ia":
+            if sala.get("ia"):
+                gravar["ia:simbolo"] = sala["ia"]["simbolo"]
+                gravar["ia:dificuldade"] = sala["ia"]["dificuldade"]
+            else:
+                remover.extend(("ia:simbolo", "ia:dificuldade"))
+
+    return gravar, remover
+
+
+def decodificar_campos(campos):
+    """Converte os campos do hash no dicionário da sala (sem os espectadores)"""
+    sala = {
+        "id": campos.get("id"),
+        "ip": campos.get("ip"),
+        "porta": campos.get("porta"),
+        "jogadores": list(campos.get("jogadores", "")),
+        "tabuleiro": codec.decodificar_tabuleiro(campos["tabuleiro"]) if "tabuleiro" in campos else [""] * 9,
+        "tamanho": int(campos.get("tamanho", 3)),
+        "sequencia": int(campos.get("sequencia", 3)),
+        "vez": campos.get("vez", "X"),
+        "nomes": {
+            simbolo: campos[f"nome:{simbolo}"]
+            for simbolo in SIMBOLOS if f"nome:{simbolo}" in campos
+        }
+    }
+
+    if "vencedor" in campos:
+        sala["vencedor"] = campos["vencedor"]
+    if "empate" in campos:
+        sala["empate"] = True
+    if "ia:simbolo" in campos:
+        sala["ia"] = {
+            "simbolo": campos["ia:simbolo"],
+            "dificuldade": campos.get("ia:dificuldade", "dificil")
+        }
+
+    return sala
+
+
+def status_sala(sala):
+    """Status da sala calculado a partir do estado do jogo"""
+    if "vencedor" in sala:
+        return "finalizado_vitoria"
+    if sala.get("empate"):
+        return "finalizado_empate"
+    if len(sala.get("jogadores", [])) < 2:
+        return "aguardando_jogadores"
+    return "em_andamento"
+
+
+def indexar_status(cliente, sala):
+    """
+    Enfileira (ou executa) a atualização dos índices de status: a sala sai dos
+    outros índices e entra no do status atual, mantendo a pontuação se já
+    estava nele
+    """
+    atual = status_sala(sala)
+    for status in STATUS:
+        if status != atual:
+            cliente.zrem(chave_status(status), sala["id"])
+    cliente.zadd(chave_status(atual), {sala["id"]: time.time()}, nx=True)
+
+
+def _ttl(sala):
+    return TTL_SALA_FINALIZADA if status_sala(sala).startswith("finalizado") else TTL_SALA
+
+
+def renovar_expiracao(cliente, sala):
+    """
+    Enfileira (ou executa) a renovação do prazo de expiração da sala; deve vir
+    depois das gravações da transação, para o EXPIRE alcançar chaves recém-criadas
+    """
+    ttl = _ttl(sala)
+    cliente.zadd(CHAVE_EXPIRACAO, {sala["id"]: time.time() + ttl})
+    for chave in chaves_da_sala(sala["id"]):
+        cliente.expire(chave, ttl + FOLGA_EXPIRACAO)
+
+
+# Remove a sala se o prazo ainda estiver vencido (uma alteração pode tê-lo
+# renovado depois da consulta do varredor) e grava o evento sala_expirada.
+# KEYS: expiração, stream de eventos, chaves da sala..., índices de status...
+# ARGV: sala_id, agora, mensagem do evento, MAXLEN do stream, nº de chaves da sala
+_SCRIPT_EXPIRAR = """
+local prazo = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if not prazo or tonumber(prazo) > tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('ZREM', KEYS[1], ARGV[1])
+local total_chaves = tonumber(ARGV[5])
+for i = 3, #KEYS do
+    if i < 3 + total_chaves then
+        redis.call('DEL', KEYS[i])
+    else
+        redis.call('ZREM', KEYS[i], ARGV[1])
+    end
+end
+redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[4], '*', 'sala_id', ARGV[1], 'mensagem', ARGV[3])
+return 1
+"""
+
+
+def expirar_vencidas(r, limite=100):
+    """
+    Remove até ``limite`` salas com prazo vencido, publicando ``sala_expirada``
+    para cada uma
+
+    Returns:
+        IDs das salas removidas
+    """
+    agora = time.time()
+    script = r.register_script(_SCRIPT_EXPIRAR)
+    removidas = []
+    for sala_id in r.zrangebyscore(CHAVE_EXPIRACAO, "-inf", agora, start=0, num=limite):
+        chaves = chaves_da_sala(sala_id)
+        mensagem = eventos.montar("sala_expirada", sala_id, {"motivo": "inatividade"})
+        if script(
+            keys=[CHAVE_EXPIRACAO, eventos.stream_da_sala(sala_id)] + chaves + [chave_status(s) for s in STATUS],
+            args=[sala_id, agora, json_rapido.dumps(mensagem), eventos.MAXLEN, len(chaves)]
+        ):
+            removidas.append(sala_id)
+            eventos.contar_publicados(["sala_expirada"])
+    return removidas
+
+
+# Entrada (SADD) ou saída (SREM) de um espectador. Só se o set mudar: renova a
+# expiração da sala, incrementa a versão e grava o evento com o total atualizado
+# (a mensagem chega partida no lugar do total).
+# KEYS: espectadores, versão, stream de eventos, expiração, chaves da sala...
+# ARGV: SADD ou SREM, nome, sala_id, prazo, segundos do EXPIRE, MAXLEN do stream,
+#       mensagem antes do total, mensagem depois do total
+_SCRIPT_ESPECTADOR = """
+local mudou = redis.call(ARGV[1], KEYS[1], ARGV[2])
+local total = redis.call('SCARD', KEYS[1])
+if mudou == 0 then
+    return {0, total}
+end
+local versao = redis.call('INCR', KEYS[2])
+redis.call('ZADD', KEYS[4], ARGV[4], ARGV[3])
+for i = 5, #KEYS do
+    redis.call('EXPIRE', KEYS[i], ARGV[5])
+end
+redis.call('XADD', KEYS[3], 'MAXLEN', '~', ARGV[6], '*', 'sala_id', ARGV[3], 'mensagem', ARGV[7] .. total .. ARGV[8])
+return {1, total, versao}
+"""
+
+_MARCADOR_TOTAL = "__total_espectadores__"
+
+
+def alterar_espectador(r, sala, nome, entrar, mensagem, campo_total):
+    """
+    Adiciona (``entrar``) ou remove o espectador em um passo atômico; o evento
+    ``mensagem`` (de ``eventos.montar``) só é gravado se o set mudar, com o
+    total de espectadores depois da alteração em ``dados[campo_total]``
+
+    Returns:
+        Tupla (mudou, total de espectadores, versão nova ou None)
+    """
+    mensagem["dados"][campo_total] = _MARCADOR_TOTAL
+    antes, depois = json_rapido.dumps(mensagem).split(json_rapido.dumps(_MARCADOR_TOTAL))
+    ttl = _ttl(sala)
+    script = r.register_script(_SCRIPT_ESPECTADOR)
+    resposta = script(
+        keys=[chave_espectadores(sala["id"]), chave_versao(sala["id"]), eventos.stream_da_sala(sala["id"]),
+              CHAVE_EXPIRACAO] + chaves_da_sala(sala["id"]),
+        args=["SADD" if entrar else "SREM", nome, sala["id"], time.time() + ttl, ttl + FOLGA_EXPIRACAO,
+              eventos.MAXLEN, antes, depois]
+    )
+    if not resposta[0]:
+        return False, resposta[1], None
+    eventos.contar_publicados([mensagem["evento"]])
+    return True, resposta[1], resposta[2]
+
+
+# Classes de chaves do relatório de memória, na ordem em que são testadas
+_CLASSES_CHAVES = (
+    ("espectadores", lambda chave: chave.startswith("sala:") and chave.endswith(":espectadores")),
+    ("versoes", lambda chave: chave.startswith("sala:") and chave.endswith(":versao")),
+    ("historicos", lambda chave: chave.startswith("sala:") and chave.endswith(":historico")),
+    ("salas", lambda chave: chave.startswith("sala:")),
+    ("indices", lambda chave: chave.startswith("salas:")),
+    ("eventos", lambda chave: chave.startswith("eventos:")),
+    ("partidas", lambda chave: chave.startswith(("partida:", "fila:"))),
+)
+
+
+def classe_da_chave(chave):
+    for nome, pertence in _CLASSES_CHAVES:
+        if pertence(chave):
+            return nome
+    return "outras"
+
+
+def uso_memoria(r, amostra=1000, lote=200):
+    """
+    Memória usada por classe de chave (MEMORY USAGE), medida em até
+    ``amostra`` chaves percorridas com SCAN e extrapolada pelo DBSIZE
+
+    Returns:
+        Dicionário com o total de chaves, o tamanho da amostra e, por classe,
+        chaves e bytes medidos e estimados
+    """
+    chaves = []
+    for chave in r.scan_iter(count=lote):
+        chaves.append(chave)
+        if len(chaves) >= amostra:
+            break
+
+    bytes_por_chave = []
+    for inicio in range(0, len(chaves), lote):
+        with r.pipeline(transaction=False) as pipe:
+            for chave in chaves[inicio:inicio + lote]:
+                pipe.memory_usage(chave, samples=0)
+            bytes_por_chave.extend(pipe.execute())
+
+    total_chaves = r.dbsize()
+    fator = total_chaves / len(chaves) if chaves else 0
+    classes = {}
+    for chave, usados in zip(chaves, bytes_por_chave):
+        classe = classes.setdefault(classe_da_chave(chave), {"chaves": 0, "bytes": 0})
+        classe["chaves"] += 1
+        classe["bytes"] += usados or 0
+    for classe in classes.values():
+        classe["chaves_estimadas"] = round(classe["chaves"] * fator)
+        classe["bytes_estimados"] = round(classe["bytes"] * fator)
+
+    return {"total_chaves": total_chaves, "amostra": len(chaves), "classes": classes}
+
+
+def gravar_campos(cliente, sala, chaves=CHAVES_HASH):
+    """Enfileira (ou executa) o HSET/HDEL das chaves indicadas da sala"""
+    chave = chave_sala(sala["id"])
+    gravar, remover = codificar_campos(sala, chaves)
+    if gravar:
+        cliente.hset(chave, mapping=gravar)
+    if remover:
+        cliente.hdel(chave, *remover)
+
+
+def migrar_sala(r, sala_id):
+    """
+    Converte uma sala gravada como JSON (formato antigo) para hash + set
+
+    Returns:
+        True se a sala foi convertida, False se já estava no formato novo
+    """
+    chave = chave_sala(sala_id)
+    with r.pipeline() as pipe:
+        while True:
+            try:
+                pipe.watch(chave)
+                if pipe.type(chave) != "string":
+                    return False
+
+                sala = json.loads(pipe.get(chave))
+                sala["id"] = sala.get("id", sala_id)
+                espectadores = sala.get("espectadores", [])
+
+                pipe.multi()
+                pipe.delete(chave)
+                gravar_campos(pipe, sala)
+                pipe.delete(chave_espectadores(sala_id))
+                if espectadores:
+                    pipe.sadd(chave_espectadores(sala_id), *espectadores)
+                incrementar_versao(pipe, sala_id)
+                indexar_status(pipe, sala)
+                renovar_expiracao(pipe, sala)
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                continue
+
+
+def migrar_espectadores(r, sala_id):
+    """
+    Converte a lista de espectadores (formato anterior) em set, mantendo o prazo
+    de expiração da chave
+
+    Returns:
+        True se a lista foi convertida, False se já era um set (ou não existe)
+    """
+    chave = chave_espectadores(sala_id)
+    with r.pipeline() as pipe:
+        while True:
+            try:
+                pipe.watch(chave)
+                if pipe.type(chave) != "list":
+                    return False
+
+                nomes = pipe.lrange(chave, 0, -1)
+                prazo = pipe.pttl(chave)
+
+                pipe.multi()
+                pipe.delete(chave)
+                pipe.sadd(chave, *nomes)
+                if prazo > 0:
+                    pipe.pexpire(chave, prazo)
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                continue
+
+
+def migrar_todas(r):
+    """
+    Converte todas as salas e listas de espectadores ainda no formato antigo,
+    retornando quantas salas foram migradas
+    """
+    migradas = set()
+    for chave in r.scan_iter(match="sala:*", _type="string"):
+        sala_id = id_da_chave(chave)
+        if sala_id and migrar_sala(r, sala_id):
+            migradas.add(sala_id)
+    for chave in r.scan_iter(match="sala:*:espectadores", _type="list"):
+        sala_id = chave[len("sala:"):-len(":espectadores")]
+        if migrar_espectadores(r, sala_id):
+            migradas.add(sala_id)
+    return len(migradas)
+
+
+def reindexar_status(r, lote=500):
+    """
+    Recalcula os índices de status e os prazos de expiração de todas as salas,
+    retornando quantas foram indexadas
+    """
+    ids = [
+        sala_id for sala_id in map(id_da_chave, r.scan_iter(match="sala:*", _type="hash"))
+        if sala_id
+    ]
+    for inicio in range(0, len(ids), lote):
+        with r.pipeline(transaction=False) as pipe:
+            for sala_id in ids[inicio:inicio + lote]:
+                pipe.hgetall(chave_sala(sala_id))
+            todos_campos = pipe.execute()
+
+        with r.pipeline(transaction=False) as pipe:
+            for campos in todos_campos:
+                if campos:
+                    sala = decodificar_campos(campos)
+                    indexar_status(pipe, sala)
+                    renovar_expiracao(pipe, sala)
+            pipe.execute()
+    return len(ids)
+
+
+def listar_por_status(r, status, inicio, quantidade):
+    """
+    Página de IDs de um índice de status, do mais antigo para o mais recente
+
+    Returns:
+        Tupla (ids da página, total de salas no status)
+    """
+    with r.pipeline(transaction=False) as pipe:
+        pipe.zrange(chave_status(status), inicio, inicio + quantidade - 1)
+        pipe.zcard(chave_status(status))
+        return tuple(pipe.execute())
+
+
+def listar_espectadores(r, sala_id, cursor=0, quantidade=100):
+    """
+    Página de nomes do set de espectadores, percorrido com SSCAN
+
+    O set não tem ordem: as páginas seguem o cursor do Redis, que garante que
+    todo espectador presente do começo ao fim da varredura aparece (um nome
+    pode se repetir entre páginas, e ``quantidade`` é uma sugestão, não um
+    limite exato).
+
+    Returns:
+        Tupla (nomes da página, próximo cursor (0 no fim), total de espectadores)
+    """
+    chave = chave_espectadores(sala_id)
+
+    def ler():
+        with r.pipeline(transaction=False) as pipe:
+            pipe.sscan(chave, cursor, count=quantidade)
+            pipe.scard(chave)
+            return pipe.execute()
+
+    (proximo, nomes), total = com_migracao(r, sala_id, ler)
+    return nomes, int(proximo), total
+
+
+def com_migracao(r, sala_id, operacao):
+    """
+    Executa ``operacao()``; se a sala ou os espectadores ainda estiverem no
+    formato antigo (erro WRONGTYPE), converte e executa de novo
+    """
+    try:
+        return operacao()
+    except redis.ResponseError as e:
+        if "WRONGTYPE" not in str(e):
+            raise
+        migrar_sala(r, sala_id)
+        migrar_espectadores(r, sala_id)
+        return operacao()
+
+
+def carregar_sala(r, sala_id):
+    """
+    Carrega a sala em uma única ida ao Redis
+
+    A leitura é feita em um MULTI/EXEC, então a versão retornada corresponde
+    exatamente ao estado lido. Os espectadores vêm só como total (a lista é
+    lida com ``listar_espectadores``).
+
+    Returns:
+        Dicionário da sala com ``versao`` e ``total_espectadores``, ou None se
+        a sala não existir
+    """
+    chave = chave_sala(sala_id)
+
+    def ler():
+        with r.pipeline() as pipe:
+            pipe.hgetall(chave)
+            pipe.scard(chave_espectadores(sala_id))
+            pipe.get(chave_versao(sala_id))
+            return pipe.execute()
+
+    campos, total_espectadores, versao = com_migracao(r, sala_id, ler)
+    if not campos:
+        return None
+
+    sala = decodificar_campos(campos)
+    sala["versao"] = int(versao) if versao is not None else None
+    sala["total_espectadores"] = total_espectadores
+    return sala
+
+
+def carregar_salas(r, ids):
+    """
+    Carrega várias salas em uma única ida ao Redis
+
+    Salas ainda no formato antigo são convertidas e lidas individualmente.
+
+    Returns:
+        Lista na mesma ordem de ``ids`` com o dicionário de cada sala ou None
+        para as salas que não existem
+    """
+    with r.pipeline(transaction=False) as pipe:
+        for sala_id in ids:
+            pipe.hgetall(chave_sala(sala_id))
+            pipe.scard(chave_espectadores(sala_id))
+            pipe.get(chave_versao(sala_id))
+        resultados = pipe.execute(raise_on_error=False)
+
+    lidas = []
+    for posicao, sala_id in enumerate(ids):
+        campos, total_espectadores, versao = resultados[3 * posicao:3 * posicao + 3]
+        erro = next((valor for valor in (campos, total_espectadores) if isinstance(valor, redis.ResponseError)), None)
+        if erro:
+            if "WRONGTYPE" not in str(erro):
+                raise erro
+            lidas.append(carregar_sala(r, sala_id))
+            continue
+        if not campos:
+            lidas.append(None)
+            continue
+
+        sala = decodificar_campos(campos)
+        sala["versao"] = int(versao) if versao is not None else None
+        sala["total_espectadores"] = total_espectadores
+        lidas.append(sala)
+    return lidas
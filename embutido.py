@@ -0,0 +1,80 @@
+"""
+Jogo completo em um único processo, sem Docker e sem Redis
+
+Sobe a REST API (5000), o SOAP (8001), o gateway (8000) e o WebSocket (8002)
+nas mesmas portas do docker-compose, todos usando o armazenamento em memória
+(``ARMAZENAMENTO=memoria``, ver comum/redis_cliente.py). O frontend funciona
+sem mudanças. Os dados ficam só na memória do processo.
+
+Os serviços HTTP rodam em threads e o WebSocket no loop asyncio da thread
+principal; o gateway continua chamando a REST API e o SOAP por HTTP local.
+
+Uso:
+    pip install -r requirements-embutido.txt
+    python embutido.py
+"""
+import asyncio
+import importlib.util
+import logging
+import os
+import sys
+import threading
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+
+PORTAS = {"rest": 5000, "soap": 8001, "gateway": 8000}
+
+
+def carregar_servico(servico):
+    """Importa o main.py de um serviço com um nome próprio (todos se chamam main)"""
+    pasta = os.path.join(RAIZ, servico)
+    if pasta not in sys.path:
+        sys.path.insert(0, pasta)
+    nome = f"{servico}_main"
+    if nome not in sys.modules:
+        spec = importlib.util.spec_from_file_location(nome, os.path.join(pasta, "main.py"))
+        modulo = importlib.util.module_from_spec(spec)
+        sys.modules[nome] = modulo
+        spec.loader.exec_module(modulo)
+    return sys.modules[nome]
+
+
+def servir(app, porta):
+    from werkzeug.serving import make_server
+
+    servidor = make_server("0.0.0.0", porta, app, threaded=True)
+    threading.Thread(target=servidor.serve_forever, name=f"http-{porta}", daemon=True).start()
+
+
+def main():
+    os.environ.setdefault("ARMAZENAMENTO", "memoria")
+    os.environ.setdefault("REST_API_URL", f"http://127.0.0.1:{PORTAS['rest']}")
+    os.environ.setdefault("SOAP_API_URL", f"http://127.0.0.1:{PORTAS['soap']}")
+    if RAIZ not in sys.path:
+        sys.path.insert(0, RAIZ)
+
+    from comum import logs
+
+    rest = carregar_servico("rest")
+    soap = carregar_servico("soap")
+    gateway = carregar_servico("gateway")
+    websocket = carregar_servico("websocket")
+
+    # Cada serviço configura os logs ao ser importado; fica uma configuração só
+    logs.configurar("embutido")
+    logger = logging.getLogger(__name__)
+
+    servir(rest.app, PORTAS["rest"])
+    servir(soap.wsgi_app, PORTAS["soap"])
+    servir(gateway.app, PORTAS["gateway"])
+    logger.info("🚀 REST :%d, SOAP :%d e gateway :%d (armazenamento %s)",
+                PORTAS["rest"], PORTAS["soap"], PORTAS["gateway"], os.environ["ARMAZENAMENTO"])
+
+    try:
+        asyncio.run(websocket.main())
+    except KeyboardInterrupt:
+        logger.info("👋 Jogo encerrado")
+
+
+if __name__ == "__main__":
+    main()
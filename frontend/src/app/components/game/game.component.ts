@@ -127,10 +127,24 @@ import { interval, Subscription } from 'rxjs';
 
             <!-- Game Board -->
             <div class="bg-white rounded-lg shadow-lg p-8">
-              <div class="grid grid-cols-3 gap-4 max-w-md mx-auto">
+              <div
+                class="grid mx-auto"
+                [style.grid-template-columns]="'repeat(' + boardSize() + ', minmax(0, 1fr))'"
+                [class.gap-4]="boardSize() <= 3"
+                [class.max-w-md]="boardSize() <= 3"
+                [class.gap-1]="boardSize() > 3"
+                [class.max-w-2xl]="boardSize() > 3"
+              >
                 @for (cell of gameState()?.tabuleiro; track $index) {
                   <button
-                    class="aspect-square text-6xl font-bold rounded-lg transition-all duration-200 border-4"
+                    class="aspect-square font-bold transition-all duration-200"
+                    [class.text-6xl]="boardSize() <= 3"
+                    [class.border-4]="boardSize() <= 3"
+                    [class.rounded-lg]="boardSize() <= 3"
+                    [class.text-2xl]="boardSize() > 3 && boardSize() <= 9"
+                    [class.text-sm]="boardSize() > 9"
+                    [class.border-2]="boardSize() > 3"
+                    [class.rounded]="boardSize() > 3"
                     [class.bg-blue-50]="cell === 'X'"
                     [class.border-blue-500]="cell === 'X'"
                     [class.text-blue-600]="cell === 'X'"
@@ -329,6 +343,9 @@ export class GameComponent implements OnInit, OnDestroy, AfterViewChecked {
   chatMessage = '';
   private pollSubscription?: Subscription;
   private ws?: WebSocket;
+  private lastEventId?: string;
+  private reconnectTimer?: ReturnType<typeof setTimeout>;
+  private destroyed = false;
   private shouldScrollChat = false;
 
   constructor(
@@ -355,15 +372,26 @@ export class GameComponent implements OnInit, OnDestroy, AfterViewChecked {
   }
 
   ngOnDestroy() {
+    this.destroyed = true;
     this.stopPolling();
     this.disconnectWebSocket();
   }
 
+  // IDs dos streams do Redis: "<ms>-<seq>"
+  private isNewerEvent(id: string): boolean {
+    if (!this.lastEventId) return true;
+    const [ms, seq] = id.split('-').map(Number);
+    const [lastMs, lastSeq] = this.lastEventId.split('-').map(Number);
+    return ms > lastMs || (ms === lastMs && seq > lastSeq);
+  }
+
   connectWebSocket() {
     const roomId = this.gameService.currentRoom();
     if (!roomId) return;
 
-    const wsUrl = `ws://${window.location.hostname}:8002/ws/${roomId}`;
+    // Na reconexão o servidor reenvia só os eventos perdidos desde o último recebido
+    const since = this.lastEventId ? `?ultimo_evento=${encodeURIComponent(this.lastEventId)}` : '';
+    const wsUrl = `ws://${window.location.hostname}:8002/ws/${roomId}${since}`;
     this.ws = new WebSocket(wsUrl);
 
     this.ws.onopen = () => {
@@ -375,7 +403,13 @@ export class GameComponent implements OnInit, OnDestroy, AfterViewChecked {
         const data = JSON.parse(event.data);
         console.log('WebSocket recebeu:', data);
 
-        // Mensagem vinda do Redis pub/sub (game_event)
+        // Eventos repetidos (reconexão) são descartados pelo ID
+        if (data.type === 'game_event' && data.id) {
+          if (!this.isNewerEvent(data.id)) return;
+          this.lastEventId = data.id;
+        }
+
+        // Evento vindo dos streams do Redis (game_event)
         if (data.type === 'game_event' && data.evento === 'chat_mensagem' && data.dados) {
           const chatMsg: ChatMessage = {
             jogador_nome: data.dados.jogador_nome,
@@ -399,8 +433,13 @@ export class GameComponent implements OnInit, OnDestroy, AfterViewChecked {
         }
         // Atualizar estado do jogo
         else if (data.type === 'state_update' || data.type === 'initial_state') {
-          this.gameState.set(data.room);
-          this.gameService.updateGameState(data.room);
+          if (data.ultimo_evento) {
+            this.lastEventId = data.ultimo_evento;
+          }
+          if (data.room) {
+            this.gameState.set(data.room);
+            this.gameService.updateGameState(data.room);
+          }
         }
         // Outros eventos do jogo
         else if (data.type === 'game_event') {
@@ -409,6 +448,11 @@ export class GameComponent implements OnInit, OnDestroy, AfterViewChecked {
           if (['jogada_realizada', 'jogo_vitoria', 'jogo_empate', 'jogo_reiniciado'].includes(data.evento)) {
             this.loadGameState();
           }
+          // Sala removida por inatividade
+          else if (data.evento === 'sala_expirada') {
+            this.disconnectWebSocket();
+            this.showErrorDialog('A sala expirou por inatividade');
+          }
         }
       } catch (e) {
         console.error('Erro ao processar mensagem WebSocket:', e);
@@ -421,10 +465,15 @@ export class GameComponent implements OnInit, OnDestroy, AfterViewChecked {
 
     this.ws.onclose = () => {
       console.log('WebSocket desconectado');
+      // Sem reconexão depois de disconnectWebSocket (ws já removido)
+      if (!this.destroyed && this.ws) {
+        this.reconnectTimer = setTimeout(() => this.connectWebSocket(), 2000);
+      }
     };
   }
 
   disconnectWebSocket() {
+    clearTimeout(this.reconnectTimer);
     if (this.ws) {
       this.ws.close();
       this.ws = undefined;
@@ -495,12 +544,19 @@ export class GameComponent implements OnInit, OnDestroy, AfterViewChecked {
     return state?.vez === mySymbol;
   }
 
+  boardSize(): number {
+    const state = this.gameState();
+    if (!state) return 3;
+    return state.tamanho ?? Math.round(Math.sqrt(state.tabuleiro.length));
+  }
+
   playersCount(): number {
     return this.gameState()?.jogadores.length || 0;
   }
 
   spectatorsCount(): number {
-    return this.gameState()?.espectadores?.length || 0;
+    const state = this.gameState();
+    return state?.total_espectadores ?? state?.espectadores?.length ?? 0;
   }
 
   sendMessage() {
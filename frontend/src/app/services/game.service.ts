@@ -13,6 +13,9 @@ export interface Sala {
   vencedor?: string;
   empate?: boolean;
   espectadores?: string[];
+  total_espectadores?: number;
+  tamanho?: number;
+  sequencia?: number;
 }
 
 export interface ChatMessage {
@@ -1,10 +1,16 @@
 # gateway/main.py
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 from flasgger import Swagger
+import os
 import requests
 
+from comum import json_flask, json_rapido, metricas, rastreio
+
 app = Flask(__name__)
+json_flask.configurar(app)
+metricas.instrumentar_flask(app, "gateway")
+rastreio.instrumentar_flask(app, "gateway", aceitar_etapas=False)
 CORS(app)  # Habilita CORS para todas as rotas
 
 # Configuração do Swagger
@@ -41,8 +47,16 @@ swagger_template = {
 
 Swagger(app, config=swagger_config, template=swagger_template)
 
-REST_API_URL = "http://rest-api:5000"
-SOAP_API_URL = "http://soap-api:8001"
+REST_API_URL = os.getenv("REST_API_URL", "http://rest-api:5000")
+SOAP_API_URL = os.getenv("SOAP_API_URL", "http://soap-api:8001")
+
+
+def corpo_json(resp):
+    """JSON da resposta de um serviço interno; corpo inválido vira erro de requisição"""
+    try:
+        return json_rapido.loads(resp.content)
+    except ValueError as e:
+        raise requests.exceptions.InvalidJSONError(str(e), response=resp)
 
 
 
@@ -66,6 +80,14 @@ def criar_sala_gateway():
               type: string
               example: "8080"
               description: Porta da sala
+            tamanho:
+              type: integer
+              example: 3
+              description: Lado do tabuleiro (3 a 19, padrão 3)
+            sequencia:
+              type: integer
+              example: 3
+              description: Peças alinhadas para vencer (3 até o tamanho, padrão 3)
     responses:
       200:
         description: Sala criada com sucesso
@@ -100,19 +122,25 @@ def criar_sala_gateway():
     if not porta:
         return jsonify({"erro": "porta é obrigatória"}), 400
 
+    campos_tabuleiro = "".join(
+        f"\n         <ser:{campo}>{payload[campo]}</ser:{campo}>"
+        for campo in ("tamanho", "sequencia")
+        if payload.get(campo) is not None
+    )
+
     soap_request = f"""<?xml version="1.0"?>
 <soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/"
                   xmlns:ser="http://jogovelha.com/soap">
    <soapenv:Header/>
    <soapenv:Body>
       <ser:criarSala>
-         <ser:porta>{porta}</ser:porta>
+         <ser:porta>{porta}</ser:porta>{campos_tabuleiro}
       </ser:criarSala>
    </soapenv:Body>
 </soapenv:Envelope>"""
 
     try:
-        resp = requests.post(SOAP_API_URL, data=soap_request, headers={"Content-Type": "text/xml"})
+        resp = requests.post(SOAP_API_URL, data=soap_request, headers=rastreio.cabecalhos({"Content-Type": "text/xml"}))
 
 
         import re
@@ -179,8 +207,8 @@ def entrar_sala(sala_id):
     """
     payload = request.json
     try:
-        resp = requests.post(f"{REST_API_URL}/salas/{sala_id}/entrar", json=payload)
-        data = resp.json()
+        resp = requests.post(f"{REST_API_URL}/salas/{sala_id}/entrar", json=payload, headers=rastreio.cabecalhos())
+        data = corpo_json(resp)
 
         #  HATEOAS
         data["_links"] = {
@@ -242,16 +270,136 @@ def jogar(sala_id):
     """
     payload = request.json
     try:
-        resp = requests.post(f"{REST_API_URL}/salas/{sala_id}/jogar", json=payload)
-        data = resp.json()
+        resp = requests.post(f"{REST_API_URL}/salas/{sala_id}/jogar", json=payload, headers=rastreio.cabecalhos())
+        data = corpo_json(resp)
+
+        data["_links"] = {
+            "consultar_sala": f"/salas/{sala_id}"
+        }
+        return jsonify(data), resp.status_code
+    except requests.exceptions.RequestException as e:
+        return jsonify({"erro": str(e)}), 500
+
+@app.route("/salas/<sala_id>/ia", methods=["POST"])
+def adicionar_ia(sala_id):
+    """
+    Adicionar o computador como oponente na sala
+    ---
+    tags:
+      - Salas
+    parameters:
+      - name: sala_id
+        in: path
+        type: string
+        required: true
+        description: ID da sala
+      - name: body
+        in: body
+        required: false
+        schema:
+          type: object
+          properties:
+            dificuldade:
+              type: string
+              enum: ["facil", "medio", "dificil"]
+              example: "dificil"
+              description: Nível de dificuldade do computador
+    responses:
+      200:
+        description: Computador entrou na sala
+        schema:
+          type: object
+          properties:
+            msg:
+              type: string
+            sala:
+              type: object
+            jogada_ia:
+              type: integer
+            _links:
+              type: object
+      400:
+        description: Dificuldade inválida, sala cheia ou já com computador
+      404:
+        description: Sala não encontrada
+    """
+    payload = request.get_json(silent=True) or {}
+    try:
+        resp = requests.post(f"{REST_API_URL}/salas/{sala_id}/ia", json=payload, headers=rastreio.cabecalhos())
+        data = corpo_json(resp)
 
         data["_links"] = {
+            "entrar_sala": f"/salas/{sala_id}/entrar",
+            "jogar": f"/salas/{sala_id}/jogar",
             "consultar_sala": f"/salas/{sala_id}"
         }
         return jsonify(data), resp.status_code
     except requests.exceptions.RequestException as e:
         return jsonify({"erro": str(e)}), 500
 
+@app.route("/salas", methods=["GET"])
+def consultar_salas():
+    """
+    Consultar várias salas (por IDs ou por status) em uma única requisição
+    ---
+    tags:
+      - Salas
+    parameters:
+      - name: ids
+        in: query
+        type: string
+        required: false
+        description: IDs das salas separados por vírgula (ex. sala1,sala2)
+      - name: status
+        in: query
+        type: string
+        required: false
+        enum: [aguardando_jogadores, em_andamento, finalizado_vitoria, finalizado_empate]
+        description: Lista as salas do status, paginadas (usado quando ids não é informado)
+      - name: pagina
+        in: query
+        type: integer
+        required: false
+        description: Página da listagem por status, começando em 1
+      - name: por_pagina
+        in: query
+        type: integer
+        required: false
+        description: Salas por página na listagem por status (padrão 20)
+    responses:
+      200:
+        description: Salas encontradas, na ordem pedida, sem a lista de espectadores
+        schema:
+          type: object
+          properties:
+            salas:
+              type: array
+              items:
+                type: object
+            nao_encontradas:
+              type: array
+              items:
+                type: string
+            total:
+              type: integer
+            pagina:
+              type: integer
+      400:
+        description: Parâmetros inválidos ou lote maior que o permitido
+    """
+    try:
+        resp = requests.get(f"{REST_API_URL}/salas", params=request.args, headers=rastreio.cabecalhos())
+        data = corpo_json(resp)
+
+        for sala in data.get("salas", []):
+            sala["_links"] = {
+                "consultar_sala": f"/salas/{sala['id']}",
+                "entrar_sala": f"/salas/{sala['id']}/entrar"
+            }
+        return jsonify(data), resp.status_code
+    except requests.exceptions.RequestException as e:
+        return jsonify({"erro": str(e)}), 500
+
 @app.route("/salas/<sala_id>", methods=["GET"])
 def consultar_sala(sala_id):
     """
@@ -265,14 +413,21 @@ def consultar_sala(sala_id):
         type: string
         required: true
         description: ID da sala
+      - name: If-None-Match
+        in: header
+        type: string
+        required: false
+        description: ETag recebido em uma consulta anterior
     responses:
       200:
-        description: Estado da sala
+        description: Estado da sala (com o cabeçalho ETag da versão)
         schema:
           type: object
           properties:
             id:
               type: string
+            versao:
+              type: integer
             jogadores:
               type: array
               items:
@@ -287,17 +442,154 @@ def consultar_sala(sala_id):
               type: object
             _links:
               type: object
+      304:
+        description: A sala não mudou desde o ETag informado
       404:
         description: Sala não encontrada
     """
     try:
-        resp = requests.get(f"{REST_API_URL}/salas/{sala_id}")
-        data = resp.json()
+        # O If-None-Match é repassado para a REST API, que responde 304 sem
+        # montar a sala quando a versão não mudou
+        headers = rastreio.cabecalhos()
+        if "If-None-Match" in request.headers:
+            headers["If-None-Match"] = request.headers["If-None-Match"]
+        resp = requests.get(f"{REST_API_URL}/salas/{sala_id}", headers=headers)
+        if resp.status_code == 304:
+            return Response(status=304, headers={"ETag": resp.headers.get("ETag", "")})
+
+        data = corpo_json(resp)
 
         data["_links"] = {
             "entrar_sala": f"/salas/{sala_id}/entrar",
             "jogar": f"/salas/{sala_id}/jogar",
-            "reiniciar": f"/salas/{sala_id}/reiniciar"
+            "reiniciar": f"/salas/{sala_id}/reiniciar",
+            "espectadores": f"/salas/{sala_id}/espectadores"
+        }
+        resposta = jsonify(data)
+        if "ETag" in resp.headers:
+            resposta.headers["ETag"] = resp.headers["ETag"]
+        return resposta, resp.status_code
+    except requests.exceptions.RequestException as e:
+        return jsonify({"erro": str(e)}), 500
+
+@app.route("/salas/<sala_id>/espectadores", methods=["GET"])
+def listar_espectadores(sala_id):
+    """
+    Listar os espectadores da sala, em páginas
+    ---
+    tags:
+      - Salas
+    parameters:
+      - name: sala_id
+        in: path
+        type: string
+        required: true
+        description: ID da sala
+      - name: cursor
+        in: query
+        type: integer
+        required: false
+        description: Cursor retornado pela página anterior (0 ou ausente para começar)
+      - name: quantidade
+        in: query
+        type: integer
+        required: false
+        description: Espectadores por página, aproximado (padrão 100)
+    responses:
+      200:
+        description: Página de espectadores (sem ordem definida); cursor 0 indica a última página
+        schema:
+          type: object
+          properties:
+            espectadores:
+              type: array
+              items:
+                type: string
+            cursor:
+              type: integer
+            total:
+              type: integer
+            _links:
+              type: object
+      400:
+        description: Parâmetros inválidos
+      404:
+        description: Sala não encontrada
+    """
+    try:
+        resp = requests.get(f"{REST_API_URL}/salas/{sala_id}/espectadores", params=request.args,
+                            headers=rastreio.cabecalhos())
+        data = corpo_json(resp)
+
+        if resp.status_code == 200:
+            data["_links"] = {"consultar_sala": f"/salas/{sala_id}"}
+            if data.get("cursor"):
+                proxima = f"/salas/{sala_id}/espectadores?cursor={data['cursor']}"
+                if "quantidade" in request.args:
+                    proxima += f"&quantidade={int(request.args['quantidade'])}"
+                data["_links"]["proxima_pagina"] = proxima
+        return jsonify(data), resp.status_code
+    except requests.exceptions.RequestException as e:
+        return jsonify({"erro": str(e)}), 500
+
+@app.route("/salas/<sala_id>/historico", methods=["GET"])
+def historico_sala(sala_id):
+    """
+    Histórico das partidas jogadas na sala
+    ---
+    tags:
+      - Salas
+    parameters:
+      - name: sala_id
+        in: path
+        type: string
+        required: true
+        description: ID da sala
+    responses:
+      200:
+        description: Partidas da sala com as entradas, saídas e jogadas em ordem
+      404:
+        description: Sala sem histórico
+    """
+    try:
+        # A resposta da REST API é repassada em partes, sem montar o histórico em memória
+        resp = requests.get(f"{REST_API_URL}/salas/{sala_id}/historico", stream=True, headers=rastreio.cabecalhos())
+        return Response(
+            resp.iter_content(chunk_size=8192),
+            status=resp.status_code,
+            content_type=resp.headers.get("Content-Type", "application/json")
+        )
+    except requests.exceptions.RequestException as e:
+        return jsonify({"erro": str(e)}), 500
+
+@app.route("/salas/<sala_id>/historico/<entrada_id>", methods=["GET"])
+def estado_historico(sala_id, entrada_id):
+    """
+    Estado da sala logo depois de uma entrada do histórico
+    ---
+    tags:
+      - Salas
+    parameters:
+      - name: sala_id
+        in: path
+        type: string
+        required: true
+      - name: entrada_id
+        in: path
+        type: string
+        required: true
+    responses:
+      200:
+        description: Estado reconstruído da sala
+      404:
+        description: Entrada fora do histórico da sala
+    """
+    try:
+        resp = requests.get(f"{REST_API_URL}/salas/{sala_id}/historico/{entrada_id}", headers=rastreio.cabecalhos())
+        data = corpo_json(resp)
+        data["_links"] = {
+            "historico": f"/salas/{sala_id}/historico",
+            "consultar_sala": f"/salas/{sala_id}"
         }
         return jsonify(data), resp.status_code
     except requests.exceptions.RequestException as e:
@@ -333,8 +625,8 @@ def reiniciar_sala(sala_id):
         description: Sala não encontrada
     """
     try:
-        resp = requests.post(f"{REST_API_URL}/salas/{sala_id}/reiniciar")
-        data = resp.json()
+        resp = requests.post(f"{REST_API_URL}/salas/{sala_id}/reiniciar", headers=rastreio.cabecalhos())
+        data = corpo_json(resp)
 
         data["_links"] = {
             "jogar": f"/salas/{sala_id}/jogar",
@@ -382,8 +674,8 @@ def enviar_chat(sala_id):
     """
     try:
         payload = request.json
-        resp = requests.post(f"{REST_API_URL}/salas/{sala_id}/chat", json=payload)
-        data = resp.json()
+        resp = requests.post(f"{REST_API_URL}/salas/{sala_id}/chat", json=payload, headers=rastreio.cabecalhos())
+        data = corpo_json(resp)
         return jsonify(data), resp.status_code
     except requests.exceptions.RequestException as e:
         return jsonify({"erro": str(e)}), 500
@@ -422,8 +714,87 @@ def sair_sala(sala_id):
     """
     try:
         payload = request.json
-        resp = requests.post(f"{REST_API_URL}/salas/{sala_id}/sair", json=payload)
-        data = resp.json()
+        resp = requests.post(f"{REST_API_URL}/salas/{sala_id}/sair", json=payload, headers=rastreio.cabecalhos())
+        data = corpo_json(resp)
+        return jsonify(data), resp.status_code
+    except requests.exceptions.RequestException as e:
+        return jsonify({"erro": str(e)}), 500
+
+
+@app.route("/partidas", methods=["POST"])
+def procurar_partida():
+    """
+    Entrar na fila de pareamento automático
+    ---
+    tags:
+      - Partidas
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          required:
+            - jogador
+          properties:
+            jogador:
+              type: string
+              example: "Player1"
+    responses:
+      201:
+        description: Adversário encontrado; a sala foi criada com os dois jogadores
+      202:
+        description: Ninguém esperando; o jogador ficou na fila (acompanhe pelo ticket ou pelo WebSocket)
+      400:
+        description: Jogador não informado ou nome reservado
+      409:
+        description: O jogador já está esperando na fila
+    """
+    try:
+        payload = request.json
+        resp = requests.post(f"{REST_API_URL}/partidas", json=payload, headers=rastreio.cabecalhos())
+        data = corpo_json(resp)
+
+        if "ticket" in data:
+            data["_links"] = {"consultar_partida": f"/partidas/{data['ticket']}"}
+            if "sala_id" in data:
+                data["_links"].update({
+                    "consultar_sala": f"/salas/{data['sala_id']}",
+                    "jogar": f"/salas/{data['sala_id']}/jogar"
+                })
+        return jsonify(data), resp.status_code
+    except requests.exceptions.RequestException as e:
+        return jsonify({"erro": str(e)}), 500
+
+@app.route("/partidas/<ticket>", methods=["GET", "DELETE"])
+def partida(ticket):
+    """
+    Consultar (GET) ou cancelar (DELETE) um ticket da fila de pareamento
+    ---
+    tags:
+      - Partidas
+    parameters:
+      - name: ticket
+        in: path
+        type: string
+        required: true
+    responses:
+      200:
+        description: Situação do ticket, ou ticket retirado da fila
+      404:
+        description: Ticket expirado ou inexistente
+      409:
+        description: O ticket já foi pareado ou expirou (cancelamento)
+    """
+    try:
+        resp = requests.request(request.method, f"{REST_API_URL}/partidas/{ticket}", headers=rastreio.cabecalhos())
+        data = corpo_json(resp)
+
+        if "sala_id" in data:
+            data["_links"] = {
+                "consultar_sala": f"/salas/{data['sala_id']}",
+                "jogar": f"/salas/{data['sala_id']}/jogar"
+            }
         return jsonify(data), resp.status_code
     except requests.exceptions.RequestException as e:
         return jsonify({"erro": str(e)}), 500
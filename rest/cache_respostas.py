@@ -0,0 +1,54 @@
+"""
+Cache, por processo, das respostas já serializadas de GET /salas/<id>
+
+Cada sala guarda só a resposta da versão mais recente que foi montada. Como a
+versão muda a cada alteração da sala, uma entrada nunca precisa ser invalidada:
+basta comparar a versão lida do Redis com a versão guardada. As salas menos
+usadas são descartadas quando o limite de entradas é atingido (LRU).
+"""
+import threading
+from collections import OrderedDict
+
+
+class CacheRespostas:
+    """LRU de ``sala_id -> (versao, corpo)`` seguro entre threads"""
+
+    def __init__(self, limite):
+        self.limite = limite
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.faltas = 0
+
+    def obter(self, sala_id, versao):
+        """Retorna o corpo guardado para a versão, ou None"""
+        with self._lock:
+            entrada = self._entradas.get(sala_id)
+            if entrada is None or entrada[0] != versao:
+                self.faltas += 1
+                return None
+            self._entradas.move_to_end(sala_id)
+            self.acertos += 1
+            return entrada[1]
+
+    def guardar(self, sala_id, versao, corpo):
+        if self.limite <= 0:
+            return
+        with self._lock:
+            atual = self._entradas.get(sala_id)
+            if atual is not None and atual[0] > versao:
+                # Outra thread já guardou uma versão mais nova
+                return
+            self._entradas[sala_id] = (versao, corpo)
+            self._entradas.move_to_end(sala_id)
+            while len(self._entradas) > self.limite:
+                self._entradas.popitem(last=False)
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                "entradas": len(self._entradas),
+                "limite": self.limite,
+                "acertos": self.acertos,
+                "faltas": self.faltas
+            }
@@ -0,0 +1,67 @@
+"""
+Configuração do gunicorn para rodar a REST API em produção
+
+Uso:
+    gunicorn -c gunicorn.conf.py main:app
+
+Variáveis de ambiente:
+    GUNICORN_BIND       endereço (padrão 0.0.0.0:5000)
+    GUNICORN_WORKERS    processos (padrão 2 * CPUs + 1)
+    GUNICORN_THREADS    threads por processo (padrão 4; 1 usa workers síncronos)
+    GUNICORN_TIMEOUT    segundos até um worker travado ser reiniciado (padrão 30)
+    GUNICORN_MAX_REQUESTS
+                        requisições até o worker ser reciclado (padrão 0, nunca)
+
+A aplicação é carregada no processo mestre antes do fork (``preload_app``),
+então a tabela de estados mapeada em memória e as tabelas do computador são
+montadas uma única vez e compartilhadas pelos workers. O cliente Redis não abre
+conexões na importação, e o pool do redis-py descarta conexões herdadas depois
+do fork.
+
+Recarga sem derrubar requisições:
+    kill -HUP <pid do mestre>     relê esta configuração e troca os workers; os
+                                  antigos terminam as requisições em andamento
+                                  (até ``graceful_timeout``)
+    kill -USR2 <pid do mestre>    para código novo: sobe um mestre novo (que
+                                  recarrega a aplicação) ao lado do atual; depois
+                                  ``kill -TERM <pid do mestre antigo>``
+
+Com ``preload_app`` o HUP não relê o código, porque os workers herdam a
+aplicação carregada pelo mestre.
+
+As métricas de cada worker são somadas pelo diretório ``METRICAS_DIR`` (padrão
+/tmp/metricas-rest, ver comum/metricas.py), limpo quando o mestre sobe.
+"""
+import glob
+import multiprocessing
+import os
+
+# Definido antes de a aplicação ser carregada (preload_app)
+os.environ.setdefault("METRICAS_DIR", "/tmp/metricas-rest")
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+worker_class = "gthread" if threads > 1 else "sync"
+
+preload_app = True
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.getenv("GUNICORN_ACCESSLOG", "-")
+loglevel = os.getenv("GUNICORN_LOGLEVEL", "info")
+
+
+def on_starting(server):
+    # Arquivos de uma execução anterior somariam contadores já zerados
+    for arquivo in glob.glob(os.path.join(os.environ["METRICAS_DIR"], "*.json")):
+        os.remove(arquivo)
+
+
+def post_fork(server, worker):
+    server.log.info(f"Worker {worker.pid} iniciado ({threads} thread(s))")
@@ -0,0 +1,125 @@
+"""
+Oponente controlado pelo computador
+
+O solver é um negamax memoizado em uma tabela de transposição indexada pelo
+tabuleiro canônico: das 8 simetrias do tabuleiro (4 rotações e seus espelhos)
+só a de menor chave é guardada, então tabuleiros equivalentes compartilham a
+mesma entrada. A tabela é preenchida na importação do módulo, de modo que cada
+jogada do computador custa apenas a canonicalização e uma consulta ao dicionário.
+
+Vitórias valem mais quanto menos casas foram ocupadas, então o computador fecha
+uma linha assim que pode em vez de adiar uma vitória já garantida.
+"""
+import random
+
+import tabuleiro as motor
+
+NOME_IA = "Computador"
+
+DIFICULDADES = ("facil", "medio", "dificil")
+
+# Probabilidade de escolher uma jogada ótima em cada dificuldade
+_CHANCE_JOGADA_OTIMA = {
+    "facil": 0.0,
+    "medio": 0.6,
+    "dificil": 1.0
+}
+
+
+def _permutacao(transformar):
+    return tuple(transformar(pos // 3, pos % 3) for pos in range(motor.TAMANHO))
+
+
+# SIMETRIAS[s][pos] é a posição para onde a casa ``pos`` vai na simetria ``s``
+SIMETRIAS = (
+    _permutacao(lambda l, c: l * 3 + c),              # identidade
+    _permutacao(lambda l, c: c * 3 + (2 - l)),        # rotação 90°
+    _permutacao(lambda l, c: (2 - l) * 3 + (2 - c)),  # rotação 180°
+    _permutacao(lambda l, c: (2 - c) * 3 + l),        # rotação 270°
+    _permutacao(lambda l, c: l * 3 + (2 - c)),        # espelho horizontal
+    _permutacao(lambda l, c: (2 - l) * 3 + c),        # espelho vertical
+    _permutacao(lambda l, c: c * 3 + l),              # diagonal principal
+    _permutacao(lambda l, c: (2 - c) * 3 + (2 - l)),  # diagonal secundária
+)
+
+# Máscara transformada por simetria, pré-calculada para as 512 máscaras
+_MASCARAS_SIMETRICAS = tuple(
+    tuple(
+        sum(1 << simetria[pos] for pos in range(motor.TAMANHO) if mascara >> pos & 1)
+        for mascara in range(motor.TABULEIRO_CHEIO + 1)
+    )
+    for simetria in SIMETRIAS
+)
+
+# (chave canônica, vez) -> (valor para quem tem a vez, jogadas ótimas no canônico)
+_transposicao = {}
+
+
+def canonico(x, o):
+    """Retorna (x, o, índice da simetria) do representante canônico do tabuleiro"""
+    melhor = None
+    for indice, tabela in enumerate(_MASCARAS_SIMETRICAS):
+        chave = tabela[x] << motor.TAMANHO | tabela[o]
+        if melhor is None or chave < melhor[0]:
+            melhor = (chave, indice)
+    chave, indice = melhor
+    return chave >> motor.TAMANHO, chave & motor.TABULEIRO_CHEIO, indice
+
+
+def _resolver(x, o, vez):
+    """Negamax memoizado sobre o tabuleiro canônico"""
+    cx, co, _ = canonico(x, o)
+    chave = (cx << motor.TAMANHO | co, vez)
+    if chave in _transposicao:
+        return _transposicao[chave]
+
+    proximo = "O" if vez == "X" else "X"
+    melhor_valor = None
+    jogadas = []
+    for pos in range(motor.TAMANHO):
+        if motor.ocupada(cx, co, pos):
+            continue
+        nx, no = motor.marcar(cx, co, vez, pos)
+        if motor.vencedor(nx, no):
+            valor = motor.TAMANHO + 1 - bin(nx | no).count("1")
+        elif (nx | no) == motor.TABULEIRO_CHEIO:
+            valor = 0
+        else:
+            valor = -_resolver(nx, no, proximo)[0]
+
+        if melhor_valor is None or valor > melhor_valor:
+            melhor_valor, jogadas = valor, [pos]
+        elif valor == melhor_valor:
+            jogadas.append(pos)
+
+    resultado = (melhor_valor or 0, tuple(jogadas))
+    _transposicao[chave] = resultado
+    return resultado
+
+
+def jogadas_otimas(x, o, vez):
+    """Posições ótimas para quem tem a vez no tabuleiro (x, o)"""
+    _, _, indice = canonico(x, o)
+    simetria = SIMETRIAS[indice]
+    inversa = {destino: pos for pos, destino in enumerate(simetria)}
+    return [inversa[pos] for pos in _resolver(x, o, vez)[1]]
+
+
+def escolher_jogada(x, o, vez, dificuldade="dificil", aleatorio=random):
+    """Escolhe a posição que o computador vai jogar, ou None se não houver casa livre"""
+    livres = [pos for pos in range(motor.TAMANHO) if not motor.ocupada(x, o, pos)]
+    if not livres:
+        return None
+
+    if aleatorio.random() < _CHANCE_JOGADA_OTIMA.get(dificuldade, 1.0):
+        return aleatorio.choice(jogadas_otimas(x, o, vez))
+    return aleatorio.choice(livres)
+
+
+def tamanho_transposicao():
+    return len(_transposicao)
+
+
+# Preenche a tabela de transposição com todos os estados alcançáveis
+_resolver(0, 0, "X")
+_resolver(0, 0, "O")
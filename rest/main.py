@@ -1,13 +1,23 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flasgger import Swagger
 import redis
-import json
+import os
 import time
 import logging
 
+import tabuleiro as motor
+import tabela_estados
+import ia
+import partidas
+from cache_respostas import CacheRespostas
+from comum import eventos, historico, json_flask, json_rapido, logs, metricas, rastreio, redis_cliente, salas
+
 app = Flask(__name__)
+json_flask.configurar(app)
+metricas.instrumentar_flask(app, "rest")
+rastreio.instrumentar_flask(app, "rest")
 
-logging.basicConfig(level=logging.INFO)
+logs.configurar("rest")
 logger = logging.getLogger(__name__)
 
 # Configuração do Swagger
@@ -38,28 +48,103 @@ swagger_template = {
 
 Swagger(app, config=swagger_config, template=swagger_template)
 
-r = redis.Redis(host="redis", port=6379, decode_responses=True, socket_connect_timeout=5)
+r = redis_cliente.criar_cliente()
+
+# Tabela com o resultado de todos os tabuleiros, compartilhada entre workers via mmap
+tabela = tabela_estados.carregar()
+
+# Script Lua que pareia (ou enfileira) os jogadores da fila de partidas
+script_parear = partidas.registrar_script(r)
+
+# Número máximo de tentativas de uma jogada quando outra requisição altera a sala
+# entre o WATCH e o EXEC (controle de concorrência otimista)
+MAX_TENTATIVAS_JOGADA = int(os.getenv("MAX_TENTATIVAS_JOGADA", "5"))
+
+# Resultado das transações de jogada, também exportado em /metrics
+TRANSACOES = metricas.Contador(
+    "rest_transacoes_jogada_total", "Transações de jogada por resultado (aplicada, conflito, tentativas esgotadas)",
+    ("resultado",)
+)
+RESULTADOS_TRANSACAO = ("jogadas_aplicadas", "conflitos", "tentativas_esgotadas")
+
+def incrementar_contador(nome):
+    """Incrementa um contador de transações"""
+    TRANSACOES.inc(resultado=nome)
+
+# Quantidade máxima de salas em uma consulta GET /salas?ids=
+MAX_SALAS_LOTE = int(os.getenv("MAX_SALAS_LOTE", "100"))
 
-WEBSOCKET_CHANNEL = "jogo_velha_events"
+# Tamanho máximo de uma página de GET /salas/<id>/espectadores
+MAX_ESPECTADORES_PAGINA = int(os.getenv("MAX_ESPECTADORES_PAGINA", "1000"))
+
+# Respostas de GET /salas/<id> já serializadas, indexadas pela versão da sala
+cache_respostas = CacheRespostas(int(os.getenv("CACHE_SALAS_MAX", "1024")))
+
+def etag_sala(sala_id, versao):
+    """Valor (sem aspas) do ETag de uma versão da sala"""
+    return f"{sala_id}-{versao}"
+
+def resposta_com_etag(etag, corpo=None):
+    """Resposta 304 (sem corpo) ou 200 com o JSON já serializado, ambas com ETag"""
+    if request.if_none_match.contains_weak(etag):
+        resposta = Response(status=304)
+    else:
+        resposta = Response(corpo, mimetype="application/json")
+    resposta.set_etag(etag)
+    return resposta
 
 def carregar_sala(sala_id):
     """Carrega uma sala do Redis"""
     try:
-        data = r.get(f"sala:{sala_id}")
-        if not data:
-            return None
-        return json.loads(data)
+        return salas.carregar_sala(r, sala_id)
     except Exception as e:
-        logger.error(f"Erro ao carregar sala {sala_id}: {str(e)}")
+        logger.error("Erro ao carregar sala %s: %s", sala_id, e)
         return None
 
-def salvar_sala(sala):
-    """Salva uma sala no Redis"""
+def montar_evento(evento, sala_id, dados=None):
+    """Monta a mensagem de evento enviada ao WebSocket"""
+    return eventos.montar(evento, sala_id, dados)
+
+def enfileirar_evento(cliente, evento, sala_id, dados=None):
+    """
+    Enfileira a gravação de um evento no stream da sala em um pipeline (ou grava
+    direto no cliente); depois de gravado, contar com ``contar_eventos``
+    """
+    return eventos.publicar(cliente, montar_evento(evento, sala_id, dados))
+
+def contar_eventos(tipos):
+    """Conta na métrica os eventos cuja gravação foi confirmada (depois do EXEC)"""
+    eventos.contar_publicados(tipos)
+
+def salvar_sala(sala, chaves=salas.CHAVES_HASH, eventos=()):
+    """
+    Grava os campos indicados da sala, o histórico e os eventos em um único MULTI/EXEC
+
+    Os eventos são enfileirados depois da gravação, então nenhum cliente do
+    WebSocket recebe um evento antes de o estado correspondente estar salvo.
+    Também atualiza os índices de status, incrementa a versão da sala e
+    atualiza ``versao`` e o total de espectadores do dicionário.
+
+    Args:
+        sala: Dicionário da sala
+        chaves: Chaves da sala que foram alteradas
+        eventos: Lista de tuplas (evento, dados) a publicar
+    """
     try:
-        r.set(f"sala:{sala['id']}", json.dumps(sala))
-        logger.debug(f"Sala {sala['id']} salva no Redis")
+        with r.pipeline() as pipe:
+            salas.gravar_campos(pipe, sala, chaves)
+            historico.registrar(pipe, sala, eventos)
+            for evento, dados in eventos:
+                enfileirar_evento(pipe, evento, sala["id"], dados)
+            salas.indexar_status(pipe, sala)
+            salas.renovar_expiracao(pipe, sala)
+            salas.incrementar_versao(pipe, sala["id"])
+            pipe.scard(salas.chave_espectadores(sala["id"]))
+            sala["versao"], sala["total_espectadores"] = pipe.execute()[-2:]
+        contar_eventos(evento for evento, _ in eventos)
+        logs.evento(logger, "sala_salva", logging.DEBUG, sala_id=sala["id"], eventos=len(eventos))
     except Exception as e:
-        logger.error(f"Erro ao salvar sala {sala['id']}: {str(e)}")
+        logger.error("Erro ao salvar sala %s: %s", sala["id"], e)
         raise
 
 def publicar_evento_websocket(evento, sala_id, dados=None):
@@ -72,35 +157,144 @@ def publicar_evento_websocket(evento, sala_id, dados=None):
         dados: Dados adicionais do evento
     """
     try:
-        mensagem = {
-            "evento": evento,
-            "sala_id": sala_id,
-            "dados": dados or {},
-            "timestamp": time.time()
-        }
-
-        r.publish(WEBSOCKET_CHANNEL, json.dumps(mensagem))
-        logger.info(f"📢 Evento publicado: {evento} na sala {sala_id}")
+        contar_eventos([enfileirar_evento(r, evento, sala_id, dados)])
+        logs.evento(logger, "evento_publicado", logging.DEBUG, evento=evento, sala_id=sala_id)
 
     except Exception as e:
-        logger.error(f"❌ Erro ao publicar evento WebSocket: {str(e)}")
+        logger.error("Erro ao publicar evento %s na sala %s: %s", evento, sala_id, e)
+
+def dimensoes_sala(sala):
+    """Retorna (tamanho, sequencia) da sala; salas antigas são 3x3"""
+    return sala.get("tamanho", 3), sala.get("sequencia", 3)
+
+def tabuleiro_classico(sala):
+    """Indica se a sala usa o tabuleiro 3x3 tradicional"""
+    return dimensoes_sala(sala) == (3, 3)
 
-def verificar_vitoria(tabuleiro):
+def verificar_vitoria(tabuleiro, tamanho=3, sequencia=3):
     """Verifica se há um vencedor no tabuleiro"""
-    combinacoes = [
-        [0, 1, 2], [3, 4, 5], [6, 7, 8],  # Linhas
-        [0, 3, 6], [1, 4, 7], [2, 5, 8],  # Colunas
-        [0, 4, 8], [2, 4, 6]              # Diagonais
-    ]
-
-    for a, b, c in combinacoes:
-        if tabuleiro[a] and tabuleiro[a] == tabuleiro[b] == tabuleiro[c]:
-            return tabuleiro[a]
-    return None
-
-def verificar_empate(tabuleiro):
+    if (tamanho, sequencia) == (3, 3):
+        return tabela.vencedor(*motor.para_bitboards(tabuleiro))
+    return motor.vencedor_generico(tabuleiro, tamanho, sequencia)
+
+def verificar_empate(tabuleiro, tamanho=3, sequencia=3):
     """Verifica se o jogo terminou em empate"""
-    return "" not in tabuleiro and not verificar_vitoria(tabuleiro)
+    if (tamanho, sequencia) == (3, 3):
+        return tabela.empate(*motor.para_bitboards(tabuleiro))
+    return "" not in tabuleiro and not motor.vencedor_generico(tabuleiro, tamanho, sequencia)
+
+def avaliar_jogada(sala, pos):
+    """
+    Avalia o tabuleiro logo após a peça colocada em pos
+
+    Returns:
+        Tupla (vencedor ou None, empate)
+    """
+    if tabuleiro_classico(sala):
+        x, o = motor.para_bitboards(sala["tabuleiro"])
+        return tabela.vencedor(x, o), tabela.empate(x, o)
+
+    tamanho, sequencia = dimensoes_sala(sala)
+    if motor.vitoria_na_jogada(sala["tabuleiro"], tamanho, sequencia, pos):
+        return sala["tabuleiro"][pos], False
+    return None, "" not in sala["tabuleiro"]
+
+class JogadaInvalida(Exception):
+    """Jogada recusada pelas regras do jogo"""
+
+def aplicar_jogada(sala, nome, pos):
+    """
+    Valida e aplica uma jogada sobre o dicionário da sala
+
+    Returns:
+        Tupla (resultado, mensagem, evento, dados do evento)
+
+    Raises:
+        JogadaInvalida: se a jogada não for permitida
+    """
+    simbolo = None
+    for s, n in sala.get("nomes", {}).items():
+        if n == nome:
+            simbolo = s
+            break
+
+    if not simbolo:
+        raise JogadaInvalida("Jogador não está na sala")
+
+    total_casas = len(sala["tabuleiro"])
+    if not isinstance(pos, int) or pos < 0 or pos >= total_casas:
+        raise JogadaInvalida(f"Posição inválida (deve ser um número entre 0 e {total_casas - 1})")
+
+    if sala["tabuleiro"][pos] != "":
+        raise JogadaInvalida("Posição já ocupada")
+
+    if sala["vez"] != simbolo:
+        jogador_da_vez = sala["nomes"].get(sala["vez"], "Desconhecido")
+        raise JogadaInvalida(f"Não é a sua vez. É a vez de {jogador_da_vez} ({sala['vez']})")
+
+    sala["tabuleiro"][pos] = simbolo
+
+    vencedor, empate = avaliar_jogada(sala, pos)
+
+    if vencedor:
+        sala["vencedor"] = vencedor
+        return "vitoria", f"🏆 Jogador {sala['nomes'][vencedor]} venceu!", "jogo_vitoria", {
+            "vencedor": vencedor,
+            "vencedor_nome": sala['nomes'][vencedor],
+            "posicao": pos,
+            "tabuleiro": list(sala["tabuleiro"])
+        }
+
+    if empate:
+        sala["empate"] = True
+        return "empate", "🤝 Empate!", "jogo_empate", {
+            "posicao": pos,
+            "tabuleiro": list(sala["tabuleiro"])
+        }
+
+    sala["vez"] = "O" if sala["vez"] == "X" else "X"
+    return "jogada", "Jogada registrada", "jogada_realizada", {
+        "jogador": nome,
+        "simbolo": simbolo,
+        "posicao": pos,
+        "tabuleiro": list(sala["tabuleiro"]),
+        "proximo_a_jogar": sala["vez"],
+        "proximo_nome": sala["nomes"].get(sala["vez"], "Aguardando jogador")
+    }
+
+def jogar_pela_ia(sala):
+    """
+    Faz a jogada do computador se a sala tiver um e for a vez dele
+
+    Returns:
+        Tupla (posição, resultado, mensagem, evento, dados do evento) ou None
+    """
+    config_ia = sala.get("ia")
+    if not config_ia or "vencedor" in sala or sala.get("empate"):
+        return None
+    if len(sala.get("jogadores", [])) < 2 or sala.get("vez") != config_ia["simbolo"]:
+        return None
+
+    x, o = motor.para_bitboards(sala["tabuleiro"])
+    pos = ia.escolher_jogada(x, o, sala["vez"], config_ia["dificuldade"])
+    if pos is None:
+        return None
+
+    return (pos,) + aplicar_jogada(sala, ia.NOME_IA, pos)
+
+def informacoes_sala(sala):
+    """Cópia da sala com os campos calculados (status, vez_nome, dimensões) das consultas"""
+    sala_info = sala.copy()
+    sala_info["tamanho"], sala_info["sequencia"] = dimensoes_sala(sala)
+
+    sala_info["status"] = salas.status_sala(sala)
+    if "vencedor" in sala:
+        sala_info["vencedor_nome"] = sala["nomes"].get(sala["vencedor"])
+
+    if "vez" in sala and "nomes" in sala:
+        sala_info["vez_nome"] = sala["nomes"].get(sala["vez"], "Aguardando jogador")
+
+    return sala_info
 
 @app.route("/salas/<sala_id>/entrar", methods=["POST"])
 def entrar_sala(sala_id):
@@ -148,32 +342,37 @@ def entrar_sala(sala_id):
     if not jogador_nome or jogador_nome.strip() == "":
         return jsonify({"erro": "É necessário informar o nome do jogador"}), 400
 
+    if jogador_nome == ia.NOME_IA:
+        return jsonify({"erro": f"O nome '{ia.NOME_IA}' é reservado para o computador"}), 400
+
     sala = carregar_sala(sala_id)
     if not sala:
         return jsonify({"erro": "Sala não encontrada"}), 404
 
-    if "espectadores" not in sala:
-        sala["espectadores"] = []
-    if "nomes" not in sala:
-        sala["nomes"] = {}
-
     if len(sala["jogadores"]) < 2:
         # É um jogador
         simbolo = "X" if len(sala["jogadores"]) == 0 else "O"
         sala["jogadores"].append(simbolo)
         sala["nomes"][simbolo] = jogador_nome
 
-        publicar_evento_websocket("jogador_entrou", sala_id, {
+        eventos = [("jogador_entrou", {
             "jogador_nome": jogador_nome,
             "simbolo": simbolo,
             "tipo": "jogador",
             "total_jogadores": len(sala["jogadores"]),
-            "total_espectadores": len(sala["espectadores"]),
+            "total_espectadores": sala["total_espectadores"],
             "vez_atual": sala.get("vez", "X")
-        })
+        })]
 
-        salvar_sala(sala)
-        logger.info(f"Jogador '{jogador_nome}' entrou na sala {sala_id} como {simbolo}")
+        chaves = ("jogadores", "nomes")
+
+        jogada_ia = jogar_pela_ia(sala)
+        if jogada_ia:
+            chaves += ("tabuleiro", "vez", "vencedor", "empate")
+            eventos.append(jogada_ia[3:])
+
+        salvar_sala(sala, chaves, eventos)
+        logs.evento(logger, "jogador_entrou", sala_id=sala_id, jogador=jogador_nome, simbolo=simbolo)
 
         return jsonify({
             "msg": f"Jogador {jogador_nome} entrou como {simbolo}",
@@ -182,18 +381,25 @@ def entrar_sala(sala_id):
             "tipo": "jogador"
         })
     else:
-        # É um espectador
-        sala["espectadores"].append(jogador_nome)
-
-        publicar_evento_websocket("espectador_entrou", sala_id, {
-            "espectador_nome": jogador_nome,
-            "tipo": "espectador",
-            "total_jogadores": len(sala["jogadores"]),
-            "total_espectadores": len(sala["espectadores"])
-        })
-
-        salvar_sala(sala)
-        logger.info(f"Espectador '{jogador_nome}' entrou na sala {sala_id}")
+        # É um espectador: só o set de espectadores é alterado. O SADD, a
+        # versão, a expiração e o evento (com o total exato) são gravados em um
+        # passo atômico, e nada é gravado se ele já estava na sala
+        adicionado, sala["total_espectadores"], versao = salas.alterar_espectador(
+            r, sala, jogador_nome, True, montar_evento("espectador_entrou", sala_id, {
+                "espectador_nome": jogador_nome,
+                "tipo": "espectador",
+                "total_jogadores": len(sala["jogadores"])
+            }), "total_espectadores")
+
+        if not adicionado:
+            return jsonify({
+                "msg": "Você já está na sala como espectador",
+                "sala": sala,
+                "tipo": "espectador"
+            })
+
+        sala["versao"] = versao
+        logs.evento(logger, "espectador_entrou", sala_id=sala_id, espectador=jogador_nome)
 
         return jsonify({
             "msg": f"Você entrou como espectador",
@@ -230,9 +436,8 @@ def jogar_sala(sala_id):
             pos:
               type: integer
               example: 4
-              description: Posição no tabuleiro (0-8)
+              description: Posição no tabuleiro (0 a tamanho² - 1, em ordem de linhas)
               minimum: 0
-              maximum: 8
     responses:
       200:
         description: Jogada registrada com sucesso
@@ -245,10 +450,15 @@ def jogar_sala(sala_id):
               type: object
             resultado:
               type: string
+            jogada_ia:
+              type: integer
+              description: Posição jogada pelo computador em resposta, se houver
       400:
         description: Jogador/posição inválida ou não é a vez do jogador
       404:
         description: Sala não encontrada
+      409:
+        description: Conflito com jogadas concorrentes após esgotar as tentativas
     """
     data = request.json
     nome = data.get("jogador")
@@ -257,83 +467,165 @@ def jogar_sala(sala_id):
     if nome is None or pos is None:
         return jsonify({"erro": "É necessário informar o jogador e a posição"}), 400
 
-    sala = carregar_sala(sala_id)
-    if not sala:
-        return jsonify({"erro": "Sala não encontrada"}), 404
-
-    simbolo = None
-    for s, n in sala.get("nomes", {}).items():
-        if n == nome:
-            simbolo = s
-            break
-
-    if not simbolo:
-        return jsonify({"erro": "Jogador não está na sala"}), 400
-
-    if not isinstance(pos, int) or pos < 0 or pos > 8:
-        return jsonify({"erro": "Posição inválida (deve ser um número entre 0 e 8)"}), 400
-
-    if sala["tabuleiro"][pos] != "":
-        return jsonify({"erro": "Posição já ocupada"}), 400
-
-    if sala["vez"] != simbolo:
-        jogador_da_vez = sala["nomes"].get(sala["vez"], "Desconhecido")
-        return jsonify({"erro": f"Não é a sua vez. É a vez de {jogador_da_vez} ({sala['vez']})"}), 400
-
-    sala["tabuleiro"][pos] = simbolo
-
-    vencedor = verificar_vitoria(sala["tabuleiro"])
-    resultado = None
-
-    if vencedor:
-        sala["vencedor"] = vencedor
-        resultado = "vitoria"
-        mensagem = f"🏆 Jogador {sala['nomes'][vencedor]} venceu!"
-
-
-        publicar_evento_websocket("jogo_vitoria", sala_id, {
-            "vencedor": vencedor,
-            "vencedor_nome": sala['nomes'][vencedor],
-            "posicao": pos,
-            "tabuleiro": sala["tabuleiro"]
-        })
-
+    chave = salas.chave_sala(sala_id)
+
+    # A sala é lida sob WATCH e gravada junto com o evento em um único MULTI/EXEC.
+    # Se outra requisição alterar a sala nesse intervalo o EXEC falha e a jogada
+    # é validada novamente sobre o estado atualizado.
+    for _ in range(MAX_TENTATIVAS_JOGADA):
+        with r.pipeline() as pipe:
+            try:
+                pipe.watch(chave)
+                campos = salas.com_migracao(r, sala_id, lambda: pipe.hgetall(chave))
+                if not campos:
+                    return jsonify({"erro": "Sala não encontrada"}), 404
+
+                sala = salas.decodificar_campos(campos)
+                if sala.get("ia") and nome == ia.NOME_IA:
+                    return jsonify({"erro": "Jogador não está na sala"}), 400
+
+                try:
+                    resultado, mensagem, evento, dados_evento = aplicar_jogada(sala, nome, pos)
+                except JogadaInvalida as e:
+                    return jsonify({"erro": str(e)}), 400
+
+                eventos = [(evento, dados_evento)]
+
+                # A resposta do computador entra na mesma transação da jogada humana
+                jogada_ia = jogar_pela_ia(sala) if resultado == "jogada" else None
+                if jogada_ia:
+                    _, resultado, mensagem, evento_ia, dados_ia = jogada_ia
+                    eventos.append((evento_ia, dados_ia))
+
+                pipe.multi()
+                salas.gravar_campos(pipe, sala, ("tabuleiro", "vez", "vencedor", "empate"))
+                historico.registrar(pipe, sala, eventos)
+                for evento, dados_evento in eventos:
+                    enfileirar_evento(pipe, evento, sala_id, dados_evento)
+                salas.indexar_status(pipe, sala)
+                salas.renovar_expiracao(pipe, sala)
+                salas.incrementar_versao(pipe, sala_id)
+                pipe.scard(salas.chave_espectadores(sala_id))
+                sala["versao"], sala["total_espectadores"] = pipe.execute()[-2:]
+                contar_eventos(evento for evento, _ in eventos)
+                break
+            except redis.WatchError:
+                incrementar_contador("conflitos")
+    else:
+        incrementar_contador("tentativas_esgotadas")
+        logs.evento(logger, "jogada_abortada", logging.WARNING, sala_id=sala_id, jogador=nome,
+                tentativas=MAX_TENTATIVAS_JOGADA)
+        return jsonify({"erro": "A sala foi alterada por outra jogada, tente novamente"}), 409
 
-    elif verificar_empate(sala["tabuleiro"]):
-        sala["empate"] = True
-        resultado = "empate"
-        mensagem = "🤝 Empate!"
+    incrementar_contador("jogadas_aplicadas")
+    logs.evento(logger, "jogada", sala_id=sala_id, jogador=nome, posicao=pos)
 
+    return jsonify({
+        "msg": mensagem,
+        "sala": sala,
+        "resultado": resultado,
+        "proximo": sala.get("vez") if resultado == "jogada" else None,
+        "jogada_ia": jogada_ia[0] if jogada_ia else None
+    })
 
-        publicar_evento_websocket("jogo_empate", sala_id, {
-            "posicao": pos,
-            "tabuleiro": sala["tabuleiro"]
-        })
+@app.route("/salas", methods=["GET"])
+def consultar_salas():
+    """
+    Consultar várias salas (por IDs ou por status) em uma única requisição
+    ---
+    tags:
+      - Salas
+    parameters:
+      - name: ids
+        in: query
+        type: string
+        required: false
+        description: IDs das salas separados por vírgula (ex. sala1,sala2)
+      - name: status
+        in: query
+        type: string
+        required: false
+        enum: [aguardando_jogadores, em_andamento, finalizado_vitoria, finalizado_empate]
+        description: Lista as salas do status, paginadas (usado quando ids não é informado)
+      - name: pagina
+        in: query
+        type: integer
+        required: false
+        description: Página da listagem por status, começando em 1
+      - name: por_pagina
+        in: query
+        type: integer
+        required: false
+        description: Salas por página na listagem por status (padrão 20)
+    responses:
+      200:
+        description: Salas encontradas, na ordem pedida
+        schema:
+          type: object
+          properties:
+            salas:
+              type: array
+              items:
+                type: object
+            nao_encontradas:
+              type: array
+              items:
+                type: string
+            total:
+              type: integer
+            pagina:
+              type: integer
+      400:
+        description: Parâmetros inválidos ou lote maior que o permitido
+    """
+    if "ids" not in request.args and "status" in request.args:
+        return listar_salas_por_status()
 
-    else:
+    ids = list(dict.fromkeys(
+        sala_id.strip() for sala_id in request.args.get("ids", "").split(",") if sala_id.strip()
+    ))
+    if not ids:
+        return jsonify({"erro": "Informe os IDs das salas em ?ids= ou o status em ?status="}), 400
+    if len(ids) > MAX_SALAS_LOTE:
+        return jsonify({"erro": f"No máximo {MAX_SALAS_LOTE} salas por consulta"}), 400
 
-        sala["vez"] = "O" if sala["vez"] == "X" else "X"
-        resultado = "jogada"
-        mensagem = "Jogada registrada"
+    try:
+        lidas = salas.carregar_salas(r, ids)
+    except Exception as e:
+        logger.error("Erro ao carregar salas %s: %s", ids, e)
+        return jsonify({"erro": "Erro ao carregar salas"}), 500
 
+    return jsonify({
+        "salas": [informacoes_sala(sala) for sala in lidas if sala],
+        "nao_encontradas": [sala_id for sala_id, sala in zip(ids, lidas) if not sala]
+    })
 
-        publicar_evento_websocket("jogada_realizada", sala_id, {
-            "jogador": nome,
-            "simbolo": simbolo,
-            "posicao": pos,
-            "tabuleiro": sala["tabuleiro"],
-            "proximo_a_jogar": sala["vez"],
-            "proximo_nome": sala["nomes"].get(sala["vez"], "Aguardando jogador")
-        })
+def listar_salas_por_status():
+    """Página do índice de status: o custo depende só do tamanho da página"""
+    status = request.args["status"]
+    if status not in salas.STATUS:
+        return jsonify({"erro": f"Status inválido. Use: {', '.join(salas.STATUS)}"}), 400
+    try:
+        pagina = int(request.args.get("pagina", 1))
+        por_pagina = int(request.args.get("por_pagina", 20))
+    except ValueError:
+        return jsonify({"erro": "pagina e por_pagina devem ser números inteiros"}), 400
+    if pagina < 1 or not 1 <= por_pagina <= MAX_SALAS_LOTE:
+        return jsonify({"erro": f"pagina deve ser positiva e por_pagina entre 1 e {MAX_SALAS_LOTE}"}), 400
 
-    salvar_sala(sala)
-    logger.info(f"Jogada: {nome} ({simbolo}) na posição {pos} na sala {sala_id}")
+    try:
+        ids, total = salas.listar_por_status(r, status, (pagina - 1) * por_pagina, por_pagina)
+        lidas = salas.carregar_salas(r, ids)
+    except Exception as e:
+        logger.error("Erro ao listar salas com status %s: %s", status, e)
+        return jsonify({"erro": "Erro ao listar salas"}), 500
 
     return jsonify({
-        "msg": mensagem,
-        "sala": sala,
-        "resultado": resultado,
-        "proximo": sala.get("vez") if resultado == "jogada" else None
+        "salas": [informacoes_sala(sala) for sala in lidas if sala],
+        "status": status,
+        "pagina": pagina,
+        "por_pagina": por_pagina,
+        "total": total
     })
 
 @app.route("/salas/<sala_id>", methods=["GET"])
@@ -349,14 +641,21 @@ def consultar_sala(sala_id):
         type: string
         required: true
         description: ID da sala
+      - name: If-None-Match
+        in: header
+        type: string
+        required: false
+        description: ETag recebido em uma consulta anterior
     responses:
       200:
-        description: Estado da sala
+        description: Estado da sala (com o cabeçalho ETag da versão)
         schema:
           type: object
           properties:
             id:
               type: string
+            versao:
+              type: integer
             jogadores:
               type: array
             tabuleiro:
@@ -369,30 +668,208 @@ def consultar_sala(sala_id):
               type: string
             empate:
               type: boolean
+            tamanho:
+              type: integer
+            sequencia:
+              type: integer
+            total_espectadores:
+              type: integer
+      304:
+        description: A sala não mudou desde o ETag informado
       404:
         description: Sala não encontrada
     """
+    # Só a versão é lida antes de decidir entre 304, cache ou leitura completa
+    try:
+        versao = r.get(salas.chave_versao(sala_id))
+    except Exception as e:
+        logger.error("Erro ao ler versão da sala %s: %s", sala_id, e)
+        versao = None
+
+    if versao is not None:
+        versao = int(versao)
+        etag = etag_sala(sala_id, versao)
+        if request.if_none_match.contains_weak(etag):
+            return resposta_com_etag(etag)
+        corpo = cache_respostas.obter(sala_id, versao)
+        if corpo is not None:
+            return resposta_com_etag(etag, corpo)
+
     sala = carregar_sala(sala_id)
     if not sala:
         return jsonify({"erro": "Sala não encontrada"}), 404
 
-    sala_info = sala.copy()
+    sala_info = informacoes_sala(sala)
 
-    if "vencedor" in sala:
-        sala_info["status"] = "finalizado_vitoria"
-        sala_info["vencedor_nome"] = sala["nomes"].get(sala["vencedor"])
-    elif sala.get("empate"):
-        sala_info["status"] = "finalizado_empate"
-    elif len(sala.get("jogadores", [])) < 2:
-        sala_info["status"] = "aguardando_jogadores"
-    else:
-        sala_info["status"] = "em_andamento"
+    if sala["versao"] is None:
+        return jsonify(sala_info)
 
+    corpo = json_rapido.dumps_bytes(sala_info)
+    cache_respostas.guardar(sala_id, sala["versao"], corpo)
+    return resposta_com_etag(etag_sala(sala_id, sala["versao"]), corpo)
 
-    if "vez" in sala and "nomes" in sala:
-        sala_info["vez_nome"] = sala["nomes"].get(sala["vez"], "Aguardando jogador")
+@app.route("/salas/<sala_id>/espectadores", methods=["GET"])
+def listar_espectadores(sala_id):
+    """
+    Listar os espectadores da sala, em páginas
+    ---
+    tags:
+      - Salas
+    parameters:
+      - name: sala_id
+        in: path
+        type: string
+        required: true
+        description: ID da sala
+      - name: cursor
+        in: query
+        type: integer
+        required: false
+        description: Cursor retornado pela página anterior (0 ou ausente para começar)
+      - name: quantidade
+        in: query
+        type: integer
+        required: false
+        description: Espectadores por página, aproximado (padrão 100)
+    responses:
+      200:
+        description: Página de espectadores (sem ordem definida); cursor 0 indica a última página
+        schema:
+          type: object
+          properties:
+            espectadores:
+              type: array
+              items:
+                type: string
+            cursor:
+              type: integer
+            total:
+              type: integer
+      400:
+        description: Parâmetros inválidos
+      404:
+        description: Sala não encontrada
+    """
+    try:
+        cursor = int(request.args.get("cursor", 0))
+        quantidade = int(request.args.get("quantidade", 100))
+    except ValueError:
+        return jsonify({"erro": "cursor e quantidade devem ser números inteiros"}), 400
+    if cursor < 0 or not 1 <= quantidade <= MAX_ESPECTADORES_PAGINA:
+        return jsonify({"erro": f"cursor não pode ser negativo e quantidade deve estar entre 1 e {MAX_ESPECTADORES_PAGINA}"}), 400
+
+    if not r.exists(salas.chave_sala(sala_id)):
+        return jsonify({"erro": "Sala não encontrada"}), 404
 
-    return jsonify(sala_info)
+    try:
+        nomes, proximo, total = salas.listar_espectadores(r, sala_id, cursor, quantidade)
+    except Exception as e:
+        logger.error("Erro ao listar espectadores da sala %s: %s", sala_id, e)
+        return jsonify({"erro": "Erro ao listar espectadores"}), 500
+
+    return jsonify({
+        "sala_id": sala_id,
+        "espectadores": nomes,
+        "cursor": proximo,
+        "total": total
+    })
+
+@app.route("/salas/<sala_id>/historico", methods=["GET"])
+def historico_sala(sala_id):
+    """
+    Histórico das partidas jogadas na sala
+    ---
+    tags:
+      - Salas
+    parameters:
+      - name: sala_id
+        in: path
+        type: string
+        required: true
+        description: ID da sala
+    responses:
+      200:
+        description: Partidas da sala, cada uma com as entradas, saídas e jogadas em ordem (resposta enviada em partes)
+        schema:
+          type: object
+          properties:
+            sala_id:
+              type: string
+            partidas:
+              type: array
+              items:
+                type: object
+                properties:
+                  numero:
+                    type: integer
+                  eventos:
+                    type: array
+                    items:
+                      type: object
+      404:
+        description: Sala sem histórico
+    """
+    if not r.exists(historico.chave_historico(sala_id)):
+        return jsonify({"erro": "Sala não encontrada ou sem histórico"}), 404
+
+    def gerar():
+        # O histórico é lido do Redis em blocos e enviado conforme é lido; um
+        # reinício começa uma nova partida
+        yield f'{{"sala_id": {json_rapido.dumps(sala_id)}, "partidas": ['
+        numero = 0
+        for id_entrada, registro in historico.ler(r, sala_id):
+            if registro["tipo"] == "snapshot":
+                continue
+            registro.pop("campos", None)
+            if numero == 0 or registro["tipo"] == "jogo_reiniciado":
+                if numero:
+                    yield ']},'
+                numero += 1
+                yield f'{{"numero": {numero}, "eventos": ['
+                primeiro = True
+            yield ("" if primeiro else ",") + json_rapido.dumps({"id": id_entrada, **registro})
+            primeiro = False
+        yield ']}]}' if numero else ']}'
+
+    return Response(gerar(), mimetype="application/json")
+
+@app.route("/salas/<sala_id>/historico/<entrada_id>", methods=["GET"])
+def estado_historico(sala_id, entrada_id):
+    """
+    Estado da sala logo depois de uma entrada do histórico
+    ---
+    tags:
+      - Salas
+    parameters:
+      - name: sala_id
+        in: path
+        type: string
+        required: true
+        description: ID da sala
+      - name: entrada_id
+        in: path
+        type: string
+        required: true
+        description: ID de uma entrada de GET /salas/{sala_id}/historico
+    responses:
+      200:
+        description: Estado reconstruído a partir do snapshot anterior e das jogadas seguintes
+      400:
+        description: ID de entrada inválido
+      404:
+        description: Entrada fora do histórico da sala
+      410:
+        description: Entrada antiga, já removida do histórico pelo limite de tamanho
+    """
+    try:
+        sala = historico.reconstruir(r, sala_id, entrada_id)
+    except redis.ResponseError:
+        return jsonify({"erro": "ID de entrada inválido"}), 400
+    except historico.HistoricoIncompleto:
+        return jsonify({"erro": "Entrada removida do histórico (limite HISTORICO_MAXLEN)"}), 410
+    if not sala:
+        return jsonify({"erro": "Entrada não encontrada no histórico da sala"}), 404
+    return jsonify(informacoes_sala(sala))
 
 @app.route("/salas/<sala_id>/reiniciar", methods=["POST"])
 def reiniciar_sala(sala_id):
@@ -425,25 +902,119 @@ def reiniciar_sala(sala_id):
         return jsonify({"erro": "Sala não encontrada"}), 404
 
 
-    sala["tabuleiro"] = ["", "", "", "", "", "", "", "", ""]
+    tamanho, _ = dimensoes_sala(sala)
+    sala["tabuleiro"] = [""] * (tamanho * tamanho)
     sala["vez"] = "X"
     sala.pop("vencedor", None)
     sala.pop("empate", None)
 
-    salvar_sala(sala)
-
-    publicar_evento_websocket("jogo_reiniciado", sala_id, {
-        "tabuleiro": sala["tabuleiro"],
+    eventos = [("jogo_reiniciado", {
+        "tabuleiro": list(sala["tabuleiro"]),
         "vez": sala["vez"]
-    })
+    })]
 
-    logger.info(f"Jogo reiniciado na sala {sala_id}")
+    jogada_ia = jogar_pela_ia(sala)
+    if jogada_ia:
+        eventos.append(jogada_ia[3:])
+
+    salvar_sala(sala, ("tabuleiro", "vez", "vencedor", "empate"), eventos)
+
+    logs.evento(logger, "jogo_reiniciado", sala_id=sala_id)
 
     return jsonify({
         "msg": "Jogo reiniciado!",
         "sala": sala
     })
 
+@app.route("/salas/<sala_id>/ia", methods=["POST"])
+def adicionar_ia(sala_id):
+    """
+    Adicionar o computador como oponente na sala
+    ---
+    tags:
+      - Salas
+    parameters:
+      - name: sala_id
+        in: path
+        type: string
+        required: true
+        description: ID da sala
+      - name: body
+        in: body
+        required: false
+        schema:
+          type: object
+          properties:
+            dificuldade:
+              type: string
+              enum: ["facil", "medio", "dificil"]
+              example: "dificil"
+              description: Nível de dificuldade do computador
+    responses:
+      200:
+        description: Computador entrou na sala
+        schema:
+          type: object
+          properties:
+            msg:
+              type: string
+            sala:
+              type: object
+            jogada_ia:
+              type: integer
+      400:
+        description: Dificuldade inválida, sala cheia, já com computador ou tabuleiro diferente de 3x3
+      404:
+        description: Sala não encontrada
+    """
+    data = request.get_json(silent=True) or {}
+    dificuldade = data.get("dificuldade", "dificil")
+
+    if dificuldade not in ia.DIFICULDADES:
+        return jsonify({"erro": f"Dificuldade inválida (use {', '.join(ia.DIFICULDADES)})"}), 400
+
+    sala = carregar_sala(sala_id)
+    if not sala:
+        return jsonify({"erro": "Sala não encontrada"}), 404
+
+    if sala.get("ia"):
+        return jsonify({"erro": "A sala já tem um computador"}), 400
+
+    if not tabuleiro_classico(sala):
+        return jsonify({"erro": "O computador só joga no tabuleiro 3x3"}), 400
+
+    if len(sala["jogadores"]) >= 2:
+        return jsonify({"erro": "Sala cheia"}), 400
+
+    simbolo = "X" if "X" not in sala["jogadores"] else "O"
+    sala["jogadores"].append(simbolo)
+    sala["nomes"][simbolo] = ia.NOME_IA
+    sala["ia"] = {"simbolo": simbolo, "dificuldade": dificuldade}
+
+    eventos = [("jogador_entrou", {
+        "jogador_nome": ia.NOME_IA,
+        "simbolo": simbolo,
+        "tipo": "computador",
+        "dificuldade": dificuldade,
+        "total_jogadores": len(sala["jogadores"]),
+        "total_espectadores": sala["total_espectadores"],
+        "vez_atual": sala.get("vez", "X")
+    })]
+
+    jogada_ia = jogar_pela_ia(sala)
+    if jogada_ia:
+        eventos.append(jogada_ia[3:])
+
+    salvar_sala(sala, ("jogadores", "nomes", "ia", "tabuleiro", "vez", "vencedor", "empate"), eventos)
+
+    logs.evento(logger, "computador_entrou", sala_id=sala_id, dificuldade=dificuldade, simbolo=simbolo)
+
+    return jsonify({
+        "msg": f"{ia.NOME_IA} entrou como {simbolo}",
+        "sala": sala,
+        "jogada_ia": jogada_ia[0] if jogada_ia else None
+    })
+
 @app.route("/salas/<sala_id>/chat", methods=["POST"])
 def enviar_chat(sala_id):
     """
@@ -487,26 +1058,40 @@ def enviar_chat(sala_id):
     if not jogador_nome or not mensagem:
         return jsonify({"erro": "É necessário informar o jogador e a mensagem"}), 400
 
-    sala = carregar_sala(sala_id)
-    if not sala:
+    # Além dos nomes, os campos que definem o status (e com ele o prazo de expiração)
+    campos_chat = ("id", "jogadores", "vencedor", "empate", "nome:X", "nome:O")
+
+    def ler_participantes():
+        with r.pipeline(transaction=False) as pipe:
+            pipe.hmget(salas.chave_sala(sala_id), *campos_chat)
+            pipe.sismember(salas.chave_espectadores(sala_id), jogador_nome)
+            return pipe.execute()
+
+    valores, is_spectator = salas.com_migracao(r, sala_id, ler_participantes)
+    campos = {campo: valor for campo, valor in zip(campos_chat, valores) if valor is not None}
+    if not campos.get("id"):
         return jsonify({"erro": "Sala não encontrada"}), 404
+    sala = salas.decodificar_campos(campos)
 
     # Verificar se o usuário está na sala (jogador ou espectador)
-    is_player = any(sala.get("nomes", {}).get(s) == jogador_nome for s in ["X", "O"])
-    is_spectator = jogador_nome in sala.get("espectadores", [])
+    is_player = jogador_nome in sala["nomes"].values()
 
     if not is_player and not is_spectator:
         return jsonify({"erro": "Você não está na sala"}), 400
 
-    # Publicar mensagem de chat
-    publicar_evento_websocket("chat_mensagem", sala_id, {
-        "jogador_nome": jogador_nome,
-        "mensagem": mensagem,
-        "tipo": "jogador" if is_player else "espectador",
-        "timestamp": time.time()
-    })
+    # Publicar mensagem de chat; a conversa conta como atividade e renova o prazo da sala
+    with r.pipeline() as pipe:
+        tipo = enfileirar_evento(pipe, "chat_mensagem", sala_id, {
+            "jogador_nome": jogador_nome,
+            "mensagem": mensagem,
+            "tipo": "jogador" if is_player else "espectador",
+            "timestamp": time.time()
+        })
+        salas.renovar_expiracao(pipe, sala)
+        pipe.execute()
+    contar_eventos([tipo])
 
-    logger.info(f"Chat na sala {sala_id}: {jogador_nome}: {mensagem}")
+    logs.evento(logger, "chat", sala_id=sala_id, jogador=jogador_nome, tamanho=len(mensagem))
 
     return jsonify({
         "msg": "Mensagem enviada",
@@ -552,10 +1137,21 @@ def sair_sala(sala_id):
     if not jogador_nome:
         return jsonify({"erro": "É necessário informar o nome do jogador"}), 400
 
-    sala = carregar_sala(sala_id)
-    if not sala:
+    chave_set = salas.chave_espectadores(sala_id)
+
+    def ler_sala():
+        with r.pipeline(transaction=False) as pipe:
+            pipe.hgetall(salas.chave_sala(sala_id))
+            pipe.scard(chave_set)
+            pipe.sismember(chave_set, jogador_nome)
+            return pipe.execute()
+
+    campos, total_espectadores, is_spectator = salas.com_migracao(r, sala_id, ler_sala)
+    if not campos:
         return jsonify({"erro": "Sala não encontrada"}), 404
 
+    sala = salas.decodificar_campos(campos)
+
     # Verificar se é jogador ou espectador
     simbolo_remover = None
     for simbolo, nome in sala.get("nomes", {}).items():
@@ -563,8 +1159,6 @@ def sair_sala(sala_id):
             simbolo_remover = simbolo
             break
 
-    is_spectator = jogador_nome in sala.get("espectadores", [])
-
     if not simbolo_remover and not is_spectator:
         return jsonify({"erro": "Usuário não está na sala"}), 400
 
@@ -576,50 +1170,226 @@ def sair_sala(sala_id):
         if "nomes" in sala and simbolo_remover in sala["nomes"]:
             del sala["nomes"][simbolo_remover]
 
+        if sala.get("ia", {}).get("simbolo") == simbolo_remover:
+            del sala["ia"]
+
         if len(sala["jogadores"]) == 0:
             pass
         else:
             if sala.get("vez") == simbolo_remover and sala["jogadores"]:
                 sala["vez"] = sala["jogadores"][0]
 
-        salvar_sala(sala)
-
-        # Publicar evento
-        publicar_evento_websocket("jogador_saiu", sala_id, {
+        salvar_sala(sala, ("jogadores", "nomes", "vez", "ia"), [("jogador_saiu", {
             "jogador_nome": jogador_nome,
             "simbolo": simbolo_remover,
             "tipo": "jogador",
             "jogadores_restantes": len(sala["jogadores"]),
-            "espectadores_restantes": len(sala.get("espectadores", []))
-        })
+            "espectadores_restantes": total_espectadores
+        })])
 
-        logger.info(f"Jogador '{jogador_nome}' saiu da sala {sala_id}")
+        logs.evento(logger, "jogador_saiu", sala_id=sala_id, jogador=jogador_nome)
 
         return jsonify({
             "msg": f"Jogador {jogador_nome} saiu da sala",
             "jogadores_restantes": len(sala["jogadores"])
         })
     else:
-        # Remover espectador
-        sala["espectadores"].remove(jogador_nome)
-
-        salvar_sala(sala)
+        # Remover espectador: como na entrada, o evento só é gravado se o SREM
+        # removeu alguém, no mesmo passo atômico
+        removido, espectadores_restantes, _ = salas.alterar_espectador(
+            r, sala, jogador_nome, False, montar_evento("espectador_saiu", sala_id, {
+                "espectador_nome": jogador_nome,
+                "tipo": "espectador",
+                "jogadores_restantes": len(sala["jogadores"])
+            }), "espectadores_restantes")
 
-        # Publicar evento
-        publicar_evento_websocket("espectador_saiu", sala_id, {
-            "espectador_nome": jogador_nome,
-            "tipo": "espectador",
-            "jogadores_restantes": len(sala["jogadores"]),
-            "espectadores_restantes": len(sala["espectadores"])
-        })
+        if not removido:
+            # Outra requisição já removeu o espectador
+            return jsonify({"erro": "Usuário não está na sala"}), 400
 
-        logger.info(f"Espectador '{jogador_nome}' saiu da sala {sala_id}")
+        logs.evento(logger, "espectador_saiu", sala_id=sala_id, espectador=jogador_nome)
 
         return jsonify({
             "msg": f"Espectador {jogador_nome} saiu da sala",
-            "espectadores_restantes": len(sala["espectadores"])
+            "espectadores_restantes": espectadores_restantes
         })
 
+@app.route("/partidas", methods=["POST"])
+def procurar_partida():
+    """
+    Entrar na fila de pareamento automático
+    ---
+    tags:
+      - Partidas
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          required:
+            - jogador
+          properties:
+            jogador:
+              type: string
+              example: "Player1"
+    responses:
+      201:
+        description: Adversário encontrado; a sala foi criada com os dois jogadores
+        schema:
+          type: object
+          properties:
+            ticket:
+              type: string
+            status:
+              type: string
+              example: "pareado"
+            sala_id:
+              type: string
+            seu_simbolo:
+              type: string
+            adversario:
+              type: string
+            sala:
+              type: object
+      202:
+        description: Ninguém esperando; o jogador ficou na fila
+        schema:
+          type: object
+          properties:
+            ticket:
+              type: string
+            status:
+              type: string
+              example: "aguardando"
+            ultimo_evento:
+              type: string
+              description: ID a informar ao WebSocket para receber o pareamento mesmo que ele aconteça antes da conexão
+            websocket:
+              type: string
+              example: "/ws/partida:3f2c...?ultimo_evento=1700000000000-0"
+      400:
+        description: Jogador não informado ou nome reservado
+      409:
+        description: O jogador já está esperando na fila (a resposta traz o ticket dele)
+    """
+    data = request.json or {}
+    jogador_nome = (data.get("jogador") or "").strip()
+    if not jogador_nome:
+        return jsonify({"erro": "Jogador não informado"}), 400
+    if jogador_nome == ia.NOME_IA:
+        return jsonify({"erro": f"O nome '{ia.NOME_IA}' é reservado"}), 400
+
+    ticket = partidas.novo_ticket()
+    canal = partidas.canal_ticket(ticket)
+    # Lido antes de entrar na fila: o aviso do pareamento vem depois deste ID,
+    # então o WebSocket o reenvia mesmo que a conexão chegue depois dele
+    ultimo_evento = eventos.ultimo_id(r, canal)
+    try:
+        adversario = partidas.entrar_na_fila(r, script_parear, ticket, jogador_nome)
+    except partidas.JogadorNaFila as e:
+        return jsonify({"erro": "Jogador já está na fila", "ticket": e.ticket}), 409
+    if adversario is None:
+        logs.evento(logger, "partida_aguardando", jogador=jogador_nome, ticket=ticket)
+        return jsonify({
+            "ticket": ticket,
+            "status": "aguardando",
+            "ultimo_evento": ultimo_evento,
+            "websocket": f"/ws/{canal}?ultimo_evento={ultimo_evento}"
+        }), 202
+
+    ticket_adversario, nome_adversario = adversario
+
+    # Quem esperava na fila começa com "X"
+    sala = salas.nova_sala(salas.gerar_id(r), partidas.IP_SALA, partidas.PORTA_SALA)
+    sala["jogadores"] = ["X", "O"]
+    sala["nomes"] = {"X": nome_adversario, "O": jogador_nome}
+    sala_id = sala["id"]
+
+    # Sala, tickets e avisos aos dois jogadores em um único MULTI/EXEC
+    with r.pipeline() as pipe:
+        salas.criar_sala(pipe, sala)
+        avisos = []
+        for ticket_jogador, simbolo, nome_oponente in (
+                (ticket_adversario, "X", jogador_nome), (ticket, "O", nome_adversario)):
+            partidas.gravar_pareamento(pipe, ticket_jogador, sala_id, simbolo, nome_oponente)
+            avisos.append(enfileirar_evento(pipe, "partida_encontrada", partidas.canal_ticket(ticket_jogador), {
+                "sala_id": sala_id,
+                "simbolo": simbolo,
+                "adversario": nome_oponente
+            }))
+        pipe.execute()
+    contar_eventos(avisos)
+    sala["versao"], sala["total_espectadores"] = 1, 0
+
+    logs.evento(logger, "partida_formada", sala_id=sala_id, jogador_x=nome_adversario, jogador_o=jogador_nome)
+
+    return jsonify({
+        "ticket": ticket,
+        "status": "pareado",
+        "sala_id": sala_id,
+        "seu_simbolo": "O",
+        "seu_nome": jogador_nome,
+        "adversario": nome_adversario,
+        "sala": sala
+    }), 201
+
+@app.route("/partidas/<ticket>", methods=["GET"])
+def consultar_partida(ticket):
+    """
+    Consultar um ticket da fila de pareamento
+    ---
+    tags:
+      - Partidas
+    parameters:
+      - name: ticket
+        in: path
+        type: string
+        required: true
+    responses:
+      200:
+        description: Situação do ticket ("aguardando" ou "pareado" com a sala)
+      404:
+        description: Ticket expirado ou inexistente
+    """
+    dados = partidas.consultar(r, ticket)
+    if not dados:
+        return jsonify({"erro": "Ticket não encontrado ou expirado"}), 404
+
+    if "sala_id" not in dados:
+        return jsonify({"ticket": ticket, "status": "aguardando", "jogador": dados["jogador"]})
+
+    return jsonify({
+        "ticket": ticket,
+        "status": "pareado",
+        "jogador": dados["jogador"],
+        "sala_id": dados["sala_id"],
+        "seu_simbolo": dados["simbolo"],
+        "adversario": dados["adversario"]
+    })
+
+@app.route("/partidas/<ticket>", methods=["DELETE"])
+def cancelar_partida(ticket):
+    """
+    Sair da fila de pareamento
+    ---
+    tags:
+      - Partidas
+    parameters:
+      - name: ticket
+        in: path
+        type: string
+        required: true
+    responses:
+      200:
+        description: Ticket retirado da fila
+      409:
+        description: O ticket já foi pareado ou expirou
+    """
+    if not partidas.cancelar(r, ticket):
+        return jsonify({"erro": "Ticket já pareado ou expirado"}), 409
+    return jsonify({"msg": "Você saiu da fila", "ticket": ticket})
+
 @app.route("/status", methods=["GET"])
 def status():
     """
@@ -640,14 +1410,27 @@ def status():
             "api": "REST API Jogo da Velha",
             "versao": "2.0.0",
             "redis": redis_status,
+            "armazenamento": redis_cliente.ARMAZENAMENTO,
+            "json": json_rapido.BACKEND,
             "websocket_support": True,
+            "transacoes": {nome: TRANSACOES.valor(resultado=nome) for nome in RESULTADOS_TRANSACAO},
+            "cache_respostas": cache_respostas.estatisticas(),
+            "logs": logs.estatisticas(),
             "endpoints": {
                 "criar_sala": "via SOAP (porta 8001)",
                 "entrar_sala": "POST /salas/{id}/entrar",
                 "jogar": "POST /salas/{id}/jogar",
                 "consultar": "GET /salas/{id}",
+                "espectadores": "GET /salas/{id}/espectadores?cursor=0",
+                "consultar_varias": "GET /salas?ids=id1,id2",
+                "listar_por_status": "GET /salas?status=aguardando_jogadores&pagina=1",
                 "reiniciar": "POST /salas/{id}/reiniciar",
-                "sair": "POST /salas/{id}/sair"
+                "historico": "GET /salas/{id}/historico",
+                "jogar_contra_computador": "POST /salas/{id}/ia",
+                "sair": "POST /salas/{id}/sair",
+                "procurar_partida": "POST /partidas",
+                "memoria": "GET /status/memoria",
+                "metricas": "GET /metrics"
             }
         })
     except Exception as e:
@@ -658,6 +1441,44 @@ def status():
             "erro": str(e)
         }), 500
 
+@app.route("/status/memoria", methods=["GET"])
+def status_memoria():
+    """
+    Memória do Redis por classe de chave
+    ---
+    tags:
+      - Sistema
+    parameters:
+      - name: amostra
+        in: query
+        type: integer
+        required: false
+        description: Quantidade de chaves medidas com MEMORY USAGE (padrão 1000, máximo 10000); o total de cada classe é estimado a partir delas
+    responses:
+      200:
+        description: Chaves e bytes por classe (salas, espectadores, versoes, historicos, indices, eventos, partidas, outras) e prazos de expiração configurados
+      400:
+        description: Amostra inválida
+    """
+    try:
+        amostra = int(request.args.get("amostra", 1000))
+    except ValueError:
+        return jsonify({"erro": "amostra deve ser um número inteiro"}), 400
+    if not 1 <= amostra <= 10000:
+        return jsonify({"erro": "amostra deve estar entre 1 e 10000"}), 400
+
+    try:
+        uso = salas.uso_memoria(r, amostra)
+    except redis.ResponseError as e:
+        return jsonify({"erro": f"MEMORY USAGE indisponível: {e}"}), 500
+
+    uso["expiracao"] = {
+        "salas_com_prazo": r.zcard(salas.CHAVE_EXPIRACAO),
+        "ttl_sala": salas.TTL_SALA,
+        "ttl_sala_finalizada": salas.TTL_SALA_FINALIZADA
+    }
+    return jsonify(uso)
+
 @app.route("/")
 def index():
     """Página inicial"""
@@ -681,5 +1502,5 @@ def health_check():
 
 if __name__ == "__main__":
     logger.info("🚀 Iniciando REST API do Jogo da Velha com WebSocket...")
-    logger.info(f"📡 WebSocket Channel: {WEBSOCKET_CHANNEL}")
+    logger.info("📡 Eventos em %d streams Redis (eventos:0..%d)", eventos.SHARDS, eventos.SHARDS - 1)
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,17 @@
+"""
+Converte de uma vez todas as salas ainda gravadas como JSON para o layout em
+hash, e as listas de espectadores para sets (ver comum/salas.py). Sem rodar este script as salas antigas são
+convertidas na primeira vez em que forem acessadas.
+
+Também recalcula os índices de status e os prazos de expiração, incluindo as
+salas criadas antes de eles existirem.
+
+Uso:
+    python migrar_salas.py
+"""
+from comum import redis_cliente, salas
+
+if __name__ == "__main__":
+    r = redis_cliente.criar_cliente()
+    print(f"{salas.migrar_todas(r)} sala(s) migrada(s)")
+    print(f"{salas.reindexar_status(r)} sala(s) indexada(s) por status e expiração")
@@ -0,0 +1,148 @@
+"""
+Fila de pareamento automático de jogadores
+
+Cada jogador que pede uma partida recebe um ticket, guardado no hash
+``partida:<ticket>`` (nome do jogador e, depois do pareamento, a sala e o
+símbolo) com expiração. A fila ``fila:partidas`` guarda só os tickets, e
+``fila:jogador:<nome>`` o ticket de quem está esperando.
+
+A entrada na fila é um script Lua atômico: se houver alguém esperando, o
+ticket mais antigo ainda válido é retirado e devolvido para formar a partida;
+senão o novo ticket entra no fim da fila. Cada pareamento custa O(1) e duas
+requisições simultâneas nunca pegam o mesmo adversário. Um jogador que já está
+esperando não entra de novo (seria pareado consigo mesmo).
+
+Enquanto espera, o jogador pode consultar o ticket ou se conectar ao WebSocket
+em ``/ws/partida:<ticket>?ultimo_evento=<id>`` para receber o evento
+``partida_encontrada``, mesmo que ele tenha sido publicado antes da conexão.
+"""
+import os
+import uuid
+
+CHAVE_FILA = "fila:partidas"
+PREFIXO_JOGADOR = "fila:jogador:"
+
+# Endereço gravado nas salas criadas pelo pareamento (as criadas via SOAP
+# recebem a porta informada pelo cliente)
+IP_SALA = "127.0.0.1"
+PORTA_SALA = os.getenv("PARTIDA_PORTA_SALA", "8000")
+
+# Tempo (segundos) que um ticket aguardando continua válido sem ser consultado
+TTL_TICKET = int(os.getenv("PARTIDA_TTL", "120"))
+
+# Recusa quem já espera na fila ({'na_fila', ticket}); senão registra o ticket,
+# retira o ticket válido mais antigo (descartando os expirados) e devolve
+# {ticket, nome}, ou enfileira o novo ticket
+_SCRIPT_PAREAR = """
+local anterior = redis.call('GET', KEYS[3])
+if anterior and redis.call('EXISTS', ARGV[2] .. anterior) == 1
+        and redis.call('HEXISTS', ARGV[2] .. anterior, 'sala_id') == 0 then
+    return {'na_fila', anterior}
+end
+while true do
+    local outro = redis.call('LPOP', KEYS[1])
+    if not outro then
+        redis.call('HSET', KEYS[2], 'jogador', ARGV[3])
+        redis.call('EXPIRE', KEYS[2], ARGV[4])
+        redis.call('RPUSH', KEYS[1], ARGV[1])
+        redis.call('SET', KEYS[3], ARGV[1], 'EX', ARGV[4])
+        return false
+    end
+    local nome = redis.call('HGET', ARGV[2] .. outro, 'jogador')
+    if nome == ARGV[3] then
+        redis.call('LPUSH', KEYS[1], outro)
+        return {'na_fila', outro}
+    end
+    if nome then
+        redis.call('DEL', ARGV[5] .. nome)
+        redis.call('HSET', KEYS[2], 'jogador', ARGV[3])
+        redis.call('EXPIRE', KEYS[2], ARGV[4])
+        return {outro, nome}
+    end
+end
+"""
+
+
+class JogadorNaFila(Exception):
+    """O jogador já tem um ticket esperando na fila"""
+
+    def __init__(self, ticket):
+        super().__init__(ticket)
+        self.ticket = ticket
+
+
+def chave_ticket(ticket):
+    return f"partida:{ticket}"
+
+
+def chave_jogador(nome):
+    return f"{PREFIXO_JOGADOR}{nome}"
+
+
+def canal_ticket(ticket):
+    """ID usado no WebSocket (``/ws/<canal>``) e nos eventos do ticket"""
+    return f"partida:{ticket}"
+
+
+def novo_ticket():
+    return uuid.uuid4().hex
+
+
+def registrar_script(r):
+    return r.register_script(_SCRIPT_PAREAR)
+
+
+def entrar_na_fila(r, script, ticket, nome):
+    """
+    Registra o ticket e tenta pareá-lo
+
+    Returns:
+        Tupla (ticket, nome) do adversário, ou None se o ticket ficou na fila
+
+    Raises:
+        JogadorNaFila: se o jogador já estiver esperando com outro ticket
+    """
+    adversario = script(
+        keys=[CHAVE_FILA, chave_ticket(ticket), chave_jogador(nome)],
+        args=[ticket, chave_ticket(""), nome, TTL_TICKET, chave_jogador("")]
+    )
+    if not adversario:
+        return None
+    if adversario[0] == "na_fila":
+        raise JogadorNaFila(adversario[1])
+    return tuple(adversario)
+
+
+def gravar_pareamento(cliente, ticket, sala_id, simbolo, adversario):
+    """Enfileira (ou executa) o registro da sala encontrada para o ticket"""
+    cliente.hset(chave_ticket(ticket), mapping={
+        "sala_id": sala_id,
+        "simbolo": simbolo,
+        "adversario": adversario
+    })
+    cliente.expire(chave_ticket(ticket), TTL_TICKET)
+
+
+def consultar(r, ticket):
+    """
+    Retorna os dados do ticket (renovando a validade de quem ainda espera) ou
+    None se ele não existir mais
+    """
+    dados = r.hgetall(chave_ticket(ticket))
+    if dados and "sala_id" not in dados:
+        with r.pipeline(transaction=False) as pipe:
+            pipe.expire(chave_ticket(ticket), TTL_TICKET)
+            pipe.expire(chave_jogador(dados["jogador"]), TTL_TICKET)
+            pipe.execute()
+    return dados or None
+
+
+def cancelar(r, ticket):
+    """Retira o ticket da fila; retorna False se ele já tinha sido pareado ou expirado"""
+    if not r.lrem(CHAVE_FILA, 1, ticket):
+        return False
+    # Enquanto o ticket existir o jogador não consegue entrar de novo, então a
+    # chave do jogador ainda aponta para ele
+    nome = r.hget(chave_ticket(ticket), "jogador")
+    r.delete(chave_ticket(ticket), *([chave_jogador(nome)] if nome else []))
+    return True
@@ -0,0 +1,182 @@
+"""
+Tabela pré-calculada com todos os 3^9 tabuleiros do jogo da velha
+
+O arquivo binário é gerado uma única vez e aberto com mmap somente leitura, de
+modo que todos os workers da REST API compartilham as mesmas páginas em memória.
+
+Formato (little-endian):
+    cabeçalho: assinatura b"JVTE", versão (u16), tamanho da entrada (u16),
+               quantidade de entradas (u32)
+    entradas:  uma por tabuleiro, na ordem do índice em base 3
+               (casa vazia = 0, "X" = 1, "O" = 2; a posição 0 é o dígito menos
+               significativo), cada uma com 4 bytes:
+                 flags         bit 0 = estado alcançável, bit 1 = fim de jogo,
+                               bit 2 = empate
+                 vencedor      0 = nenhum, 1 = "X", 2 = "O"
+                 melhor_jogada posição 0-8 para quem tem a vez, 255 se não houver
+                 valor         resultado com jogo perfeito do ponto de vista de
+                               "X" (1 vitória, 0 empate, -1 derrota), int8
+
+Uso:
+    python tabela_estados.py [caminho]
+"""
+import mmap
+import os
+import struct
+import sys
+
+import tabuleiro as motor
+
+ASSINATURA = b"JVTE"
+VERSAO = 1
+CABECALHO = struct.Struct("<4sHHI")
+ENTRADA = struct.Struct("<BBBb")
+TOTAL_ESTADOS = 3 ** motor.TAMANHO
+
+FLAG_LEGAL = 1
+FLAG_FIM = 2
+FLAG_EMPATE = 4
+SEM_JOGADA = 255
+
+CAMINHO_PADRAO = os.getenv(
+    "TABELA_ESTADOS_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "tabela_estados.bin")
+)
+
+# Contribuição de cada máscara de 9 bits para o índice em base 3
+_POTENCIAS = tuple(
+    sum(3 ** pos for pos in range(motor.TAMANHO) if mascara >> pos & 1)
+    for mascara in range(motor.TABULEIRO_CHEIO + 1)
+)
+
+_SIMBOLOS = (None, "X", "O")
+
+
+def indice(x, o):
+    """Índice do tabuleiro (x, o) na tabela"""
+    return _POTENCIAS[x] + 2 * _POTENCIAS[o]
+
+
+def _contar(mascara):
+    return bin(mascara).count("1")
+
+
+def _gerar_entradas():
+    """Calcula as entradas de todos os tabuleiros"""
+    entradas = [(0, 0, SEM_JOGADA, 0)] * TOTAL_ESTADOS
+
+    # Processa dos tabuleiros mais cheios para os mais vazios para que o valor
+    # de cada sucessor já esteja calculado
+    estados = []
+    for x in range(motor.TABULEIRO_CHEIO + 1):
+        for o in range(motor.TABULEIRO_CHEIO + 1):
+            if not x & o:
+                estados.append((_contar(x) + _contar(o), x, o))
+    estados.sort(reverse=True)
+
+    for _, x, o in estados:
+        n_x, n_o = _contar(x), _contar(o)
+        vencedor = motor.vencedor(x, o)
+        venceu_x = motor.vencedor(x, 0) == "X"
+        venceu_o = motor.vencedor(0, o) == "O"
+
+        legal = n_x - n_o in (0, 1)
+        if venceu_x and (venceu_o or n_x != n_o + 1):
+            legal = False
+        if venceu_o and n_x != n_o:
+            legal = False
+        if vencedor and legal:
+            # A última jogada do vencedor precisa ter sido a que fechou a linha
+            mascara = x if vencedor == "X" else o
+            legal = any(
+                not motor.vencedor(mascara & ~(1 << pos), 0)
+                for pos in range(motor.TAMANHO) if mascara >> pos & 1
+            )
+
+        # Vencedor e empate são registrados mesmo para tabuleiros inalcançáveis
+        # para que a tabela sempre concorde com motor.vencedor/motor.empate
+        flags = FLAG_LEGAL if legal else 0
+        if vencedor:
+            valor = 1 if vencedor == "X" else -1
+            entradas[indice(x, o)] = (flags | FLAG_FIM, _SIMBOLOS.index(vencedor), SEM_JOGADA, valor)
+            continue
+
+        if (x | o) == motor.TABULEIRO_CHEIO:
+            entradas[indice(x, o)] = (flags | FLAG_FIM | FLAG_EMPATE, 0, SEM_JOGADA, 0)
+            continue
+
+        if not legal:
+            continue
+
+        vez = "X" if n_x == n_o else "O"
+        melhor_jogada, melhor_valor = SEM_JOGADA, None
+        for pos in range(motor.TAMANHO):
+            if motor.ocupada(x, o, pos):
+                continue
+            valor = entradas[indice(*motor.marcar(x, o, vez, pos))][3]
+            if melhor_valor is None or (valor > melhor_valor if vez == "X" else valor < melhor_valor):
+                melhor_jogada, melhor_valor = pos, valor
+
+        entradas[indice(x, o)] = (FLAG_LEGAL, 0, melhor_jogada, melhor_valor)
+
+    return entradas
+
+
+def gerar(caminho=CAMINHO_PADRAO):
+    """Gera o arquivo da tabela de forma atômica"""
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, "wb") as arquivo:
+        arquivo.write(CABECALHO.pack(ASSINATURA, VERSAO, ENTRADA.size, TOTAL_ESTADOS))
+        for entrada in _gerar_entradas():
+            arquivo.write(ENTRADA.pack(*entrada))
+    os.replace(temporario, caminho)
+
+
+class TabelaEstados:
+    """Acesso somente leitura à tabela mapeada em memória"""
+
+    def __init__(self, caminho=CAMINHO_PADRAO):
+        with open(caminho, "rb") as arquivo:
+            self._mapa = mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+
+        assinatura, versao, tamanho_entrada, total = CABECALHO.unpack_from(self._mapa, 0)
+        esperado = CABECALHO.size + ENTRADA.size * TOTAL_ESTADOS
+        if (assinatura != ASSINATURA or versao != VERSAO or tamanho_entrada != ENTRADA.size
+                or total != TOTAL_ESTADOS or len(self._mapa) != esperado):
+            self._mapa.close()
+            raise ValueError(f"Tabela de estados incompatível em {caminho}")
+
+    def consultar(self, x, o):
+        """Retorna (flags, vencedor, melhor_jogada, valor) do tabuleiro"""
+        return ENTRADA.unpack_from(self._mapa, CABECALHO.size + ENTRADA.size * indice(x, o))
+
+    def vencedor(self, x, o):
+        return _SIMBOLOS[self._mapa[CABECALHO.size + ENTRADA.size * indice(x, o) + 1]]
+
+    def empate(self, x, o):
+        return bool(self._mapa[CABECALHO.size + ENTRADA.size * indice(x, o)] & FLAG_EMPATE)
+
+    def legal(self, x, o):
+        return bool(self._mapa[CABECALHO.size + ENTRADA.size * indice(x, o)] & FLAG_LEGAL)
+
+    def melhor_jogada(self, x, o):
+        jogada = self._mapa[CABECALHO.size + ENTRADA.size * indice(x, o) + 2]
+        return None if jogada == SEM_JOGADA else jogada
+
+    def valor(self, x, o):
+        return self.consultar(x, o)[3]
+
+
+def carregar(caminho=CAMINHO_PADRAO):
+    """Abre a tabela, gerando o arquivo se ele não existir ou for de outra versão"""
+    try:
+        return TabelaEstados(caminho)
+    except (FileNotFoundError, ValueError, struct.error):
+        gerar(caminho)
+        return TabelaEstados(caminho)
+
+
+if __name__ == "__main__":
+    destino = sys.argv[1] if len(sys.argv) > 1 else CAMINHO_PADRAO
+    gerar(destino)
+    print(f"Tabela de estados gerada em {destino}")
@@ -0,0 +1,116 @@
+"""
+Motor do jogo da velha baseado em bitboards
+
+Cada tabuleiro é representado por duas máscaras de 9 bits, uma para as casas
+ocupadas por "X" e outra para as casas ocupadas por "O". O bit ``i`` corresponde
+à posição ``i`` da lista ``tabuleiro`` usada no JSON das salas:
+
+    0 | 1 | 2
+    3 | 4 | 5
+    6 | 7 | 8
+
+Salas com tabuleiros maiores (N x N, vence quem alinhar k peças) usam
+``vitoria_na_jogada``, que só examina as linhas que passam pela última jogada.
+"""
+
+TAMANHO = 9
+TABULEIRO_CHEIO = (1 << TAMANHO) - 1
+
+COMBINACOES_VITORIA = (
+    (0, 1, 2), (3, 4, 5), (6, 7, 8),  # Linhas
+    (0, 3, 6), (1, 4, 7), (2, 5, 8),  # Colunas
+    (0, 4, 8), (2, 4, 6)              # Diagonais
+)
+
+MASCARAS_VITORIA = tuple(
+    (1 << a) | (1 << b) | (1 << c) for a, b, c in COMBINACOES_VITORIA
+)
+
+# Para cada uma das 512 máscaras possíveis, indica se ela contém uma linha completa
+_MASCARA_VENCEDORA = tuple(
+    any(mascara & vitoria == vitoria for vitoria in MASCARAS_VITORIA)
+    for mascara in range(TABULEIRO_CHEIO + 1)
+)
+
+
+def para_bitboards(tabuleiro):
+    """Converte a lista de 9 casas ("", "X" ou "O") nas máscaras (x, o)"""
+    x = o = 0
+    for pos, casa in enumerate(tabuleiro):
+        if casa == "X":
+            x |= 1 << pos
+        elif casa == "O":
+            o |= 1 << pos
+    return x, o
+
+
+def para_lista(x, o):
+    """Converte as máscaras (x, o) de volta para a lista usada no JSON"""
+    return [
+        "X" if x >> pos & 1 else "O" if o >> pos & 1 else ""
+        for pos in range(TAMANHO)
+    ]
+
+
+def ocupada(x, o, pos):
+    """Indica se a posição já está marcada"""
+    return bool((x | o) >> pos & 1)
+
+
+def marcar(x, o, simbolo, pos):
+    """Retorna as máscaras com a posição marcada pelo símbolo"""
+    if simbolo == "X":
+        return x | 1 << pos, o
+    return x, o | 1 << pos
+
+
+def vencedor(x, o):
+    """Retorna "X", "O" ou None"""
+    if _MASCARA_VENCEDORA[x]:
+        return "X"
+    if _MASCARA_VENCEDORA[o]:
+        return "O"
+    return None
+
+
+def empate(x, o):
+    """Indica se o tabuleiro está cheio e sem vencedor"""
+    return (x | o) == TABULEIRO_CHEIO and not _MASCARA_VENCEDORA[x] and not _MASCARA_VENCEDORA[o]
+
+
+# Direções (linha, coluna) verificadas a partir da última peça: horizontal,
+# vertical e as duas diagonais
+_DIRECOES = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+
+def vitoria_na_jogada(tabuleiro, tamanho, sequencia, pos):
+    """
+    Verifica se a peça colocada em ``pos`` completou ``sequencia`` casas iguais
+    em um tabuleiro ``tamanho`` x ``tamanho`` (lista em ordem de linhas)
+
+    Só as quatro linhas que passam pela posição são percorridas, então o custo
+    depende de ``sequencia`` e não do tamanho do tabuleiro.
+    """
+    simbolo = tabuleiro[pos]
+    if not simbolo:
+        return False
+
+    linha, coluna = divmod(pos, tamanho)
+    for dl, dc in _DIRECOES:
+        contagem = 1
+        for sentido in (1, -1):
+            l, c = linha + dl * sentido, coluna + dc * sentido
+            while 0 <= l < tamanho and 0 <= c < tamanho and tabuleiro[l * tamanho + c] == simbolo:
+                contagem += 1
+                if contagem >= sequencia:
+                    return True
+                l, c = l + dl * sentido, c + dc * sentido
+    return False
+
+
+def vencedor_generico(tabuleiro, tamanho, sequencia):
+    """Procura um vencedor em todo o tabuleiro (usado fora do fluxo de jogadas)"""
+    for pos, casa in enumerate(tabuleiro):
+        if casa and vitoria_na_jogada(tabuleiro, tamanho, sequencia, pos):
+            return casa
+    return None
@@ -1,21 +1,38 @@
-import json
-import redis
 from spyne import Application, rpc, ServiceBase, Unicode, Fault
 from spyne.protocol.soap import Soap11
 from spyne.server.wsgi import WsgiApplication
 
+from comum import metricas, redis_cliente, salas
+
 try:
-    redis = redis.Redis(host='redis_jogo', port=6379, decode_responses=True)
+    redis = redis_cliente.criar_cliente()
     redis.ping()
 except Exception as e:
     print("❌ ERRO: Não foi possível conectar ao Redis:", str(e))
     raise SystemExit("Finalizando API SOAP...")
 
+TAMANHO_PADRAO = 3
+TAMANHO_MAXIMO = 19
+
+
+def ler_inteiro(valor, campo, padrao):
+    """Converte um parâmetro opcional para inteiro, gerando Fault se for inválido"""
+    if valor is None or valor.strip() == "":
+        return padrao
+
+    if not valor.strip().isdigit():
+        raise Fault(
+            faultcode="Client.BoardInvalid",
+            faultstring=f"O campo '{campo}' deve ser um número inteiro."
+        )
+
+    return int(valor)
+
 
 class JogoDaVelhaService(ServiceBase):
 
-    @rpc(Unicode, _returns=Unicode)
-    def criarSala(ctx, porta):
+    @rpc(Unicode, Unicode, Unicode, _returns=Unicode)
+    def criarSala(ctx, porta, tamanho, sequencia):
 
         if porta is None or porta.strip() == "":
             raise Fault(
@@ -37,9 +54,23 @@ class JogoDaVelhaService(ServiceBase):
                 faultstring="A porta deve estar entre 1 e 65535."
             )
 
+        tamanho_int = ler_inteiro(tamanho, "tamanho", TAMANHO_PADRAO)
+        sequencia_int = ler_inteiro(sequencia, "sequencia", min(tamanho_int, TAMANHO_PADRAO))
+
+        if tamanho_int < TAMANHO_PADRAO or tamanho_int > TAMANHO_MAXIMO:
+            raise Fault(
+                faultcode="Client.BoardInvalid",
+                faultstring=f"O tamanho deve estar entre {TAMANHO_PADRAO} e {TAMANHO_MAXIMO}."
+            )
+
+        if sequencia_int < TAMANHO_PADRAO or sequencia_int > tamanho_int:
+            raise Fault(
+                faultcode="Client.BoardInvalid",
+                faultstring=f"A sequência deve estar entre {TAMANHO_PADRAO} e o tamanho do tabuleiro."
+            )
+
         try:
-            sala_numero = redis.incr("contador_salas")
-            sala_id = f"sala{sala_numero}"
+            sala_id = salas.gerar_id(redis)
         except Exception as e:
             raise Fault(
                 faultcode="Server.RedisError",
@@ -48,20 +79,15 @@ class JogoDaVelhaService(ServiceBase):
 
         ip_local = "127.0.0.1"
 
-        sala = {
-            "id": sala_id,
-            "ip": ip_local,
-            "porta": porta,
-            "jogadores": [],
-            "tabuleiro": ["", "", "", "", "", "", "", "", ""],
-            "vez": "X"
-        }
+        sala = salas.nova_sala(sala_id, ip_local, porta, tamanho_int, sequencia_int)
 
         try:
-            redis.set(f"sala:{sala_id}", json.dumps(sala))
+            with redis.pipeline() as pipe:
+                salas.criar_sala(pipe, sala)
+                pipe.execute()
 
-            check = redis.get(f"sala:{sala_id}")
-            if check is None:
+            check = redis.exists(salas.chave_sala(sala_id))
+            if not check:
                 raise Exception("Falha ao gravar no Redis")
 
         except Exception as e:
@@ -81,7 +107,7 @@ application = Application(
     out_protocol=Soap11(),
 )
 
-wsgi_app = WsgiApplication(application)
+wsgi_app = metricas.instrumentar_wsgi(WsgiApplication(application), "soap")
 
 if __name__ == "__main__":
     from wsgiref.simple_server import make_server
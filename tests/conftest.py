@@ -0,0 +1,64 @@
+"""
+Testes da REST API com o armazenamento em memória (``ARMAZENAMENTO=memoria``)
+
+Rodar a partir da raiz do repositório (requer requirements-embutido.txt e pytest):
+    python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+# Lido pelo comum.redis_cliente na importação, antes de qualquer serviço
+os.environ["ARMAZENAMENTO"] = "memoria"
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+from comum import salas  # noqa: E402
+from embutido import carregar_servico  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def rest():
+    return carregar_servico("rest")
+
+
+@pytest.fixture
+def cliente(rest):
+    return rest.app.test_client()
+
+
+@pytest.fixture
+def criar_sala(rest):
+    """Cria salas com salas.criar_sala, como o criarSala do SOAP, e retorna o ID"""
+    def criar(tamanho=3, sequencia=3):
+        sala = salas.nova_sala(salas.gerar_id(rest.r), "127.0.0.1", "8080", tamanho, sequencia)
+        with rest.r.pipeline() as pipe:
+            salas.criar_sala(pipe, sala)
+            pipe.execute()
+        return sala["id"]
+
+    return criar
+
+
+@pytest.fixture
+def sala_com_jogadores(cliente, criar_sala):
+    """Sala 3x3 com os jogadores A (X) e B (O)"""
+    sala_id = criar_sala()
+    for jogador in ("A", "B"):
+        assert cliente.post(f"/salas/{sala_id}/entrar", json={"jogador": jogador}).status_code == 200
+    return sala_id
+
+
+@pytest.fixture(scope="session")
+def soap():
+    return carregar_servico("soap")
+
+
+@pytest.fixture
+def cliente_soap(soap):
+    from werkzeug.test import Client
+
+    return Client(soap.wsgi_app)
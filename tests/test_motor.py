@@ -0,0 +1,113 @@
+import itertools
+import random
+
+import pytest
+
+COMBINACOES = [[0, 1, 2], [3, 4, 5], [6, 7, 8], [0, 3, 6], [1, 4, 7], [2, 5, 8], [0, 4, 8], [2, 4, 6]]
+
+
+def vitoria_lista(tabuleiro):
+    """Verificação antiga, percorrendo as combinações sobre a lista"""
+    for a, b, c in COMBINACOES:
+        if tabuleiro[a] and tabuleiro[a] == tabuleiro[b] == tabuleiro[c]:
+            return tabuleiro[a]
+    return None
+
+
+def empate_lista(tabuleiro):
+    return "" not in tabuleiro and not vitoria_lista(tabuleiro)
+
+
+@pytest.fixture(scope="module")
+def alcancaveis(rest):
+    """Todos os tabuleiros 3x3 válidos, segundo a tabela de estados"""
+    tabuleiros = []
+    for casas in itertools.product(("", "X", "O"), repeat=9):
+        tabuleiro = list(casas)
+        if rest.tabela.legal(*rest.motor.para_bitboards(tabuleiro)):
+            tabuleiros.append(tabuleiro)
+    return tabuleiros
+
+
+def a_vez(x, o):
+    return "X" if bin(x).count("1") == bin(o).count("1") else "O"
+
+
+def vitorias_imediatas(motor, x, o, simbolo):
+    return {pos for pos in range(motor.TAMANHO)
+            if not motor.ocupada(x, o, pos) and motor.vencedor(*motor.marcar(x, o, simbolo, pos))}
+
+
+def test_quantidade_de_estados_alcancaveis(alcancaveis):
+    assert len(alcancaveis) == 5478
+
+
+def test_bitboards_e_tabela_concordam_com_a_lista(rest, alcancaveis):
+    motor, tabela = rest.motor, rest.tabela
+    for tabuleiro in alcancaveis:
+        x, o = motor.para_bitboards(tabuleiro)
+        assert motor.para_lista(x, o) == tabuleiro
+        assert motor.vencedor(x, o) == vitoria_lista(tabuleiro)
+        assert motor.empate(x, o) == empate_lista(tabuleiro)
+        assert tabela.vencedor(x, o) == vitoria_lista(tabuleiro)
+        assert tabela.empate(x, o) == empate_lista(tabuleiro)
+        assert motor.vencedor_generico(tabuleiro, 3, 3) == vitoria_lista(tabuleiro)
+
+
+def test_verificacoes_da_api_concordam_com_a_lista(rest, alcancaveis):
+    for tabuleiro in alcancaveis:
+        assert rest.verificar_vitoria(tabuleiro) == vitoria_lista(tabuleiro)
+        assert rest.verificar_empate(tabuleiro) == empate_lista(tabuleiro)
+
+
+def test_tabela_concorda_com_a_lista_em_tabuleiros_inalcancaveis(rest):
+    motor, tabela = rest.motor, rest.tabela
+    for casas in itertools.product(("", "X", "O"), repeat=9):
+        tabuleiro = list(casas)
+        x, o = motor.para_bitboards(tabuleiro)
+        # Com linhas dos dois símbolos a lista devolve a primeira combinação encontrada
+        if motor.vencedor(x, 0) and motor.vencedor(0, o):
+            continue
+        assert tabela.vencedor(x, o) == motor.vencedor(x, o) == vitoria_lista(tabuleiro)
+        assert tabela.empate(x, o) == motor.empate(x, o) == empate_lista(tabuleiro)
+
+
+def test_ia_fecha_a_linha_quando_pode(rest, alcancaveis):
+    motor, ia = rest.motor, rest.ia
+    for tabuleiro in alcancaveis:
+        x, o = motor.para_bitboards(tabuleiro)
+        if motor.vencedor(x, o) or motor.empate(x, o):
+            continue
+        vez = a_vez(x, o)
+        vitorias = vitorias_imediatas(motor, x, o, vez)
+        if vitorias:
+            assert set(ia.jogadas_otimas(x, o, vez)) <= vitorias, tabuleiro
+
+
+def test_ia_bloqueia_a_derrota_imediata(rest, alcancaveis):
+    motor, ia = rest.motor, rest.ia
+    for tabuleiro in alcancaveis:
+        x, o = motor.para_bitboards(tabuleiro)
+        if motor.vencedor(x, o) or motor.empate(x, o):
+            continue
+        vez = a_vez(x, o)
+        ameacas = vitorias_imediatas(motor, x, o, "O" if vez == "X" else "X")
+        # Com duas ameaças não há como bloquear as duas
+        if len(ameacas) == 1 and not vitorias_imediatas(motor, x, o, vez):
+            assert set(ia.jogadas_otimas(x, o, vez)) == ameacas, tabuleiro
+
+
+def test_escolher_jogada(rest):
+    motor, ia = rest.motor, rest.ia
+    aleatorio = random.Random(0)
+
+    # O vence na casa 5 e X ameaça a 2: o computador prefere a vitória
+    x, o = motor.para_bitboards(["X", "X", "", "O", "O", "", "X", "", ""])
+    assert ia.escolher_jogada(x, o, "O", aleatorio=aleatorio) == 5
+
+    # X ameaça a casa 2 e O não tem vitória: o computador bloqueia
+    x, o = motor.para_bitboards(["X", "X", "", "", "O", "", "", "", ""])
+    assert ia.escolher_jogada(x, o, "O", aleatorio=aleatorio) == 2
+
+    cheio = motor.para_bitboards(["X", "O", "X", "X", "O", "O", "O", "X", "X"])
+    assert ia.escolher_jogada(*cheio, "O", aleatorio=aleatorio) is None
@@ -0,0 +1,50 @@
+import pytest
+
+from comum import eventos
+
+
+@pytest.fixture(autouse=True)
+def fila_vazia(rest):
+    rest.r.delete(rest.partidas.CHAVE_FILA)
+
+
+def procurar(cliente, jogador):
+    return cliente.post("/partidas", json={"jogador": jogador})
+
+
+def test_pareamento_antes_da_conexao_do_websocket(rest, cliente):
+    espera = procurar(cliente, "Ana")
+    assert espera.status_code == 202
+    ticket = espera.json["ticket"]
+    desde = espera.json["ultimo_evento"]
+    assert espera.json["websocket"] == f"/ws/partida:{ticket}?ultimo_evento={desde}"
+
+    pareado = procurar(cliente, "Beto")
+    assert pareado.status_code == 201
+    assert pareado.json["adversario"] == "Ana"
+
+    # O evento publicado antes da conexão é reenviado a partir do ID da resposta
+    (_, evento), = eventos.eventos_desde(rest.r, f"partida:{ticket}", desde)
+    assert evento["evento"] == "partida_encontrada"
+    assert evento["dados"] == {"sala_id": pareado.json["sala_id"], "simbolo": "X", "adversario": "Beto"}
+
+    sala = cliente.get(f"/salas/{pareado.json['sala_id']}").json
+    assert sala["nomes"] == {"X": "Ana", "O": "Beto"}
+
+
+def test_jogador_na_fila_nao_entra_de_novo(cliente):
+    ticket = procurar(cliente, "Caio").json["ticket"]
+
+    repetido = procurar(cliente, "Caio")
+    assert repetido.status_code == 409
+    assert repetido.json["ticket"] == ticket
+    assert cliente.get(f"/partidas/{ticket}").json["status"] == "aguardando"
+
+    assert cliente.delete(f"/partidas/{ticket}").status_code == 200
+    assert procurar(cliente, "Caio").status_code == 202
+
+
+def test_jogador_pareado_pode_procurar_outra_partida(cliente):
+    procurar(cliente, "Duda")
+    assert procurar(cliente, "Enzo").status_code == 201
+    assert procurar(cliente, "Duda").status_code == 202
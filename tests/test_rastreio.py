@@ -0,0 +1,35 @@
+from comum import eventos, rastreio
+
+CABECALHOS_FORJADOS = {rastreio.CABECALHO_ID: "abc", rastreio.CABECALHO_ETAPAS: "lixo-7=1;outro=2;gateway=3"}
+
+
+def test_borda_aceita_so_o_id():
+    token = rastreio.iniciar("gateway", CABECALHOS_FORJADOS, aceitar_etapas=False)
+    try:
+        atual = rastreio.atual()
+        assert atual["id"] == "abc"
+        assert [nome for nome, _ in atual["etapas"]] == ["gateway"]
+    finally:
+        rastreio.encerrar(token)
+
+
+def test_etapas_recebidas_so_com_nomes_conhecidos():
+    token = rastreio.iniciar("rest", CABECALHOS_FORJADOS)
+    try:
+        assert [nome for nome, _ in rastreio.atual()["etapas"]] == ["gateway", "rest"]
+    finally:
+        rastreio.encerrar(token)
+
+
+def test_trechos_ignoram_etapas_desconhecidas():
+    etapas = [["gateway", 1.0], ["outro", 1.5], ["rest", 2.0], ["evento", 2.5]]
+    assert rastreio.trechos(etapas) == [("gateway->rest", 1.0), ("rest->evento", 0.5)]
+
+
+def test_evento_publicado_pela_rest_nao_leva_etapas_forjadas(rest, cliente, sala_com_jogadores):
+    inicio = eventos.ultimo_id(rest.r, sala_com_jogadores)
+    cliente.post(f"/salas/{sala_com_jogadores}/jogar", json={"jogador": "A", "pos": 4},
+                 headers=CABECALHOS_FORJADOS)
+
+    (_, evento), = eventos.eventos_desde(rest.r, sala_com_jogadores, inicio)
+    assert [nome for nome, _ in evento["rastreio"]["etapas"]] == ["gateway", "rest", "evento"]
@@ -0,0 +1,254 @@
+import threading
+import time
+
+from comum import eventos, metricas, salas
+
+
+def jogar(cliente, sala_id, jogador, pos):
+    return cliente.post(f"/salas/{sala_id}/jogar", json={"jogador": jogador, "pos": pos})
+
+
+def test_entrar_jogadores_e_espectadores(cliente, criar_sala):
+    sala_id = criar_sala()
+
+    resposta = cliente.post(f"/salas/{sala_id}/entrar", json={"jogador": "A"})
+    assert resposta.status_code == 200
+    assert resposta.json["seu_simbolo"] == "X"
+    assert cliente.post(f"/salas/{sala_id}/entrar", json={"jogador": "B"}).json["seu_simbolo"] == "O"
+
+    resposta = cliente.post(f"/salas/{sala_id}/entrar", json={"jogador": "C"})
+    assert resposta.json["tipo"] == "espectador"
+    assert resposta.json["sala"]["total_espectadores"] == 1
+
+    repetida = cliente.post(f"/salas/{sala_id}/entrar", json={"jogador": "C"})
+    assert repetida.json["msg"] == "Você já está na sala como espectador"
+    assert repetida.json["sala"]["total_espectadores"] == 1
+
+    sala = cliente.get(f"/salas/{sala_id}").json
+    assert sala["jogadores"] == ["X", "O"]
+    assert sala["nomes"] == {"X": "A", "O": "B"}
+    assert sala["total_espectadores"] == 1
+    assert cliente.get(f"/salas/{sala_id}/espectadores").json["espectadores"] == ["C"]
+
+    assert cliente.post(f"/salas/{sala_id}/sair", json={"jogador": "C"}).status_code == 200
+    assert cliente.post(f"/salas/{sala_id}/sair", json={"jogador": "C"}).status_code == 400
+    assert cliente.get(f"/salas/{sala_id}").json["total_espectadores"] == 0
+
+
+def test_eventos_de_espectadores_so_quando_o_set_muda(rest, cliente, sala_com_jogadores):
+    inicio = eventos.ultimo_id(rest.r, sala_com_jogadores)
+    versao = cliente.get(f"/salas/{sala_com_jogadores}").json["versao"]
+
+    for nome in ("C", "D", "C"):
+        cliente.post(f"/salas/{sala_com_jogadores}/entrar", json={"jogador": nome})
+    cliente.post(f"/salas/{sala_com_jogadores}/sair", json={"jogador": "C"})
+
+    publicados = [(evento["evento"], evento["dados"]) for _, evento in
+                  eventos.eventos_desde(rest.r, sala_com_jogadores, inicio)]
+    assert publicados == [
+        ("espectador_entrou", {"espectador_nome": "C", "tipo": "espectador",
+                               "total_jogadores": 2, "total_espectadores": 1}),
+        ("espectador_entrou", {"espectador_nome": "D", "tipo": "espectador",
+                               "total_jogadores": 2, "total_espectadores": 2}),
+        ("espectador_saiu", {"espectador_nome": "C", "tipo": "espectador",
+                             "jogadores_restantes": 2, "espectadores_restantes": 1}),
+    ]
+    assert cliente.get(f"/salas/{sala_com_jogadores}").json["versao"] == versao + 3
+
+
+def test_chat_renova_a_expiracao(rest, cliente, sala_com_jogadores):
+    cliente.post(f"/salas/{sala_com_jogadores}/entrar", json={"jogador": "C"})
+    rest.r.zadd(salas.CHAVE_EXPIRACAO, {sala_com_jogadores: 1})
+
+    assert cliente.post(f"/salas/{sala_com_jogadores}/chat",
+                        json={"jogador": "Z", "mensagem": "oi"}).status_code == 400
+    assert rest.r.zscore(salas.CHAVE_EXPIRACAO, sala_com_jogadores) == 1
+
+    for nome in ("A", "C"):
+        rest.r.zadd(salas.CHAVE_EXPIRACAO, {sala_com_jogadores: 1})
+        inicio = time.time()
+        assert cliente.post(f"/salas/{sala_com_jogadores}/chat",
+                            json={"jogador": nome, "mensagem": "oi"}).status_code == 200
+        prazo = rest.r.zscore(salas.CHAVE_EXPIRACAO, sala_com_jogadores)
+        assert prazo >= inicio + salas.TTL_SALA
+        assert rest.r.ttl(salas.chave_sala(sala_com_jogadores)) > salas.TTL_SALA
+
+    assert cliente.post("/salas/nao_existe/chat", json={"jogador": "A", "mensagem": "oi"}).status_code == 404
+
+
+def test_entrar_em_sala_inexistente(cliente):
+    assert cliente.post("/salas/nao_existe/entrar", json={"jogador": "A"}).status_code == 404
+
+
+def test_jogada_atualiza_sala_e_versao(cliente, sala_com_jogadores):
+    antes = cliente.get(f"/salas/{sala_com_jogadores}").json["versao"]
+
+    resposta = jogar(cliente, sala_com_jogadores, "A", 4)
+    assert resposta.status_code == 200
+    assert resposta.json["resultado"] == "jogada"
+    assert resposta.json["proximo"] == "O"
+
+    sala = cliente.get(f"/salas/{sala_com_jogadores}").json
+    assert sala["tabuleiro"][4] == "X"
+    assert sala["vez"] == "O"
+    assert sala["versao"] > antes
+
+
+def test_jogadas_invalidas(cliente, sala_com_jogadores):
+    assert jogar(cliente, sala_com_jogadores, "B", 0).status_code == 400
+    assert jogar(cliente, sala_com_jogadores, "A", 9).status_code == 400
+    assert jogar(cliente, sala_com_jogadores, "Z", 0).status_code == 400
+    assert jogar(cliente, sala_com_jogadores, "A", 0).status_code == 200
+    assert jogar(cliente, sala_com_jogadores, "B", 0).status_code == 400
+    assert jogar(cliente, "nao_existe", "A", 0).status_code == 404
+
+
+def test_vitoria(cliente, sala_com_jogadores):
+    for jogador, pos in (("A", 0), ("B", 3), ("A", 1), ("B", 4)):
+        assert jogar(cliente, sala_com_jogadores, jogador, pos).json["resultado"] == "jogada"
+
+    resposta = jogar(cliente, sala_com_jogadores, "A", 2)
+    assert resposta.json["resultado"] == "vitoria"
+
+    sala = cliente.get(f"/salas/{sala_com_jogadores}").json
+    assert sala["status"] == "finalizado_vitoria"
+    assert sala["vencedor_nome"] == "A"
+
+
+def test_eventos_contra_o_computador_mostram_o_tabuleiro_de_cada_jogada(rest, cliente, criar_sala):
+    sala_id = criar_sala()
+    cliente.post(f"/salas/{sala_id}/entrar", json={"jogador": "A"})
+    assert cliente.post(f"/salas/{sala_id}/ia", json={"dificuldade": "facil"}).status_code == 200
+    inicio = eventos.ultimo_id(rest.r, sala_id)
+
+    livres = list(range(9))
+    while True:
+        sala = cliente.get(f"/salas/{sala_id}").json
+        if sala["status"] != "em_andamento":
+            break
+        pos = next(p for p in livres if sala["tabuleiro"][p] == "")
+        assert jogar(cliente, sala_id, "A", pos).status_code == 200
+
+    # Cada evento de jogada traz o tabuleiro logo depois dela, sem a resposta do computador
+    tabuleiro = [""] * 9
+    jogadas = [evento for _, evento in eventos.eventos_desde(rest.r, sala_id, inicio)
+               if evento["evento"] in ("jogada_realizada", "jogo_vitoria", "jogo_empate")]
+    assert len(jogadas) >= 5
+    for evento in jogadas:
+        dados = evento["dados"]
+        tabuleiro[dados["posicao"]] = "X" if tabuleiro.count("X") == tabuleiro.count("O") else "O"
+        assert dados["tabuleiro"] == tabuleiro
+
+
+def test_historico_das_partidas(cliente, sala_com_jogadores):
+    for jogador, pos in (("A", 0), ("B", 3), ("A", 1), ("B", 4), ("A", 2)):
+        jogar(cliente, sala_com_jogadores, jogador, pos)
+    cliente.post(f"/salas/{sala_com_jogadores}/reiniciar", json={})
+    jogar(cliente, sala_com_jogadores, "A", 8)
+
+    partidas = cliente.get(f"/salas/{sala_com_jogadores}/historico").json["partidas"]
+    assert [p["numero"] for p in partidas] == [1, 2]
+    assert [e["tipo"] for e in partidas[0]["eventos"]] == ["jogador_entrou"] * 2 + ["jogada"] * 5
+    assert partidas[0]["eventos"][-1]["resultado"] == "vitoria"
+    assert [e["tipo"] for e in partidas[1]["eventos"]] == ["jogo_reiniciado", "jogada"]
+    assert all("campos" not in e for p in partidas for e in p["eventos"])
+
+    # O estado em cada entrada inclui o próprio evento
+    segunda_jogada = partidas[0]["eventos"][3]
+    estado = cliente.get(f"/salas/{sala_com_jogadores}/historico/{segunda_jogada['id']}").json
+    assert estado["tabuleiro"] == ["X", "", "", "O", "", "", "", "", ""]
+    assert estado["vez"] == "X"
+
+    vitoria = partidas[0]["eventos"][-1]
+    estado = cliente.get(f"/salas/{sala_com_jogadores}/historico/{vitoria['id']}").json
+    assert estado["status"] == "finalizado_vitoria"
+
+    reinicio = partidas[1]["eventos"][0]
+    estado = cliente.get(f"/salas/{sala_com_jogadores}/historico/{reinicio['id']}").json
+    assert estado["tabuleiro"] == [""] * 9
+    assert estado["nomes"] == {"X": "A", "O": "B"}
+
+
+def test_historico_inexistente(cliente, sala_com_jogadores):
+    assert cliente.get("/salas/nao_existe/historico").status_code == 404
+    assert cliente.get(f"/salas/{sala_com_jogadores}/historico/invalido").status_code == 400
+    assert cliente.get(f"/salas/{sala_com_jogadores}/historico/1-0").status_code == 410
+    assert cliente.get(f"/salas/{sala_com_jogadores}/historico/99999999999999-0").status_code == 404
+
+
+def test_leitura_bloqueante_acorda_com_jogada(rest, cliente, sala_com_jogadores):
+    eventos.criar_grupos(rest.r, "testes")
+    # Descarta o que já estava nos streams quando o grupo foi criado
+    while eventos.ler_grupo(rest.r, "testes", "c1", bloquear_ms=1):
+        pass
+
+    lidos = []
+
+    def ler():
+        inicio = time.monotonic()
+        lidos.extend(eventos.ler_grupo(rest.r, "testes", "c1", bloquear_ms=5000))
+        lidos.append(time.monotonic() - inicio)
+
+    leitor = threading.Thread(target=ler)
+    leitor.start()
+    time.sleep(0.2)
+    jogar(cliente, sala_com_jogadores, "A", 4)
+    leitor.join()
+
+    *recebidos, espera = lidos
+    assert espera < 2
+    assert [evento["evento"] for _, _, evento in recebidos] == ["jogada_realizada"]
+    assert recebidos[0][2]["sala_id"] == sala_com_jogadores
+
+
+def jogadas_simultaneas(rest, monkeypatch, sala_id, posicoes):
+    """
+    Envia as jogadas de A em paralelo, todas lendo a sala antes de qualquer uma
+    gravar (a primeira validação de cada requisição espera as demais)
+    """
+    barreira = threading.Barrier(len(posicoes))
+    local = threading.local()
+    aplicar_jogada = rest.aplicar_jogada
+
+    def aplicar_juntas(sala, nome, pos):
+        if not getattr(local, "esperou", False):
+            local.esperou = True
+            barreira.wait(timeout=5)
+        return aplicar_jogada(sala, nome, pos)
+
+    monkeypatch.setattr(rest, "aplicar_jogada", aplicar_juntas)
+    respostas = [None] * len(posicoes)
+
+    def enviar(indice, pos):
+        respostas[indice] = jogar(rest.app.test_client(), sala_id, "A", pos)
+
+    threads = [threading.Thread(target=enviar, args=item) for item in enumerate(posicoes)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(resposta.status_code for resposta in respostas)
+
+
+def test_jogadas_concorrentes_na_mesma_sala(rest, cliente, sala_com_jogadores, monkeypatch):
+    conflitos = rest.TRANSACOES.valor(resultado="conflitos")
+    publicados = metricas.EVENTOS_PUBLICADOS.valor(evento="jogada_realizada")
+
+    # Depois da primeira, as outras são validadas de novo e já não é a vez de A
+    assert jogadas_simultaneas(rest, monkeypatch, sala_com_jogadores, [0, 1, 2, 3]) == [200, 400, 400, 400]
+
+    assert rest.TRANSACOES.valor(resultado="conflitos") == conflitos + 3
+    # Só o evento da transação confirmada é contado
+    assert metricas.EVENTOS_PUBLICADOS.valor(evento="jogada_realizada") == publicados + 1
+    sala = cliente.get(f"/salas/{sala_com_jogadores}").json
+    assert sala["tabuleiro"].count("X") == 1
+    assert sala["vez"] == "O"
+
+
+def test_jogadas_concorrentes_esgotam_tentativas(rest, sala_com_jogadores, monkeypatch):
+    monkeypatch.setattr(rest, "MAX_TENTATIVAS_JOGADA", 1)
+    esgotadas = rest.TRANSACOES.valor(resultado="tentativas_esgotadas")
+
+    assert jogadas_simultaneas(rest, monkeypatch, sala_com_jogadores, [0, 1, 2]) == [200, 409, 409]
+
+    assert rest.TRANSACOES.valor(resultado="tentativas_esgotadas") == esgotadas + 2
@@ -0,0 +1,82 @@
+import re
+
+import pytest
+
+ENVELOPE = """<?xml version="1.0"?>
+<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/"
+                  xmlns:ser="http://jogovelha.com/soap">
+   <soapenv:Body>
+      <ser:criarSala>
+         <ser:porta>8080</ser:porta>{campos}
+      </ser:criarSala>
+   </soapenv:Body>
+</soapenv:Envelope>"""
+
+
+def criar_sala_soap(cliente_soap, **campos):
+    """Chama o criarSala e retorna o ID da sala, ou o faultstring"""
+    xml = "".join(f"<ser:{campo}>{valor}</ser:{campo}>" for campo, valor in campos.items())
+    resposta = cliente_soap.post("/", data=ENVELOPE.format(campos=xml), content_type="text/xml")
+    texto = resposta.get_data(as_text=True)
+    sala = re.search(r"<tns:criarSalaResult>(.*?)</tns:criarSalaResult>", texto)
+    if sala:
+        return sala.group(1)
+    return re.search(r"<faultstring>(.*?)</faultstring>", texto).group(1)
+
+
+@pytest.mark.parametrize("tamanho, sequencia", [(3, 3), (5, 4), (15, 5), (19, 19)])
+def test_criar_sala_nxn(cliente_soap, cliente, tamanho, sequencia):
+    sala_id = criar_sala_soap(cliente_soap, tamanho=tamanho, sequencia=sequencia)
+
+    sala = cliente.get(f"/salas/{sala_id}").json
+    assert sala["tamanho"] == tamanho
+    assert sala["sequencia"] == sequencia
+    assert sala["tabuleiro"] == [""] * (tamanho * tamanho)
+
+
+def test_criar_sala_sem_tamanho_e_classica(cliente_soap, cliente):
+    sala = cliente.get(f"/salas/{criar_sala_soap(cliente_soap)}").json
+    assert (sala["tamanho"], sala["sequencia"], len(sala["tabuleiro"])) == (3, 3, 9)
+
+
+@pytest.mark.parametrize("campos, erro", [
+    ({"tamanho": 2}, "O tamanho deve estar entre 3 e 19."),
+    ({"tamanho": 20}, "O tamanho deve estar entre 3 e 19."),
+    ({"tamanho": "x"}, "O campo 'tamanho' deve ser um número inteiro."),
+    ({"tamanho": 5, "sequencia": 2}, "A sequência deve estar entre 3 e o tamanho do tabuleiro."),
+    ({"tamanho": 5, "sequencia": 6}, "A sequência deve estar entre 3 e o tamanho do tabuleiro."),
+])
+def test_criar_sala_fora_dos_limites(cliente_soap, campos, erro):
+    assert criar_sala_soap(cliente_soap, **campos) == erro
+
+
+def jogar_partida(cliente, sala_id, jogadas):
+    """Joga as posições alternando A e B; retorna a última resposta"""
+    for jogador in ("A", "B"):
+        cliente.post(f"/salas/{sala_id}/entrar", json={"jogador": jogador})
+    for numero, pos in enumerate(jogadas):
+        resposta = cliente.post(f"/salas/{sala_id}/jogar", json={"jogador": "AB"[numero % 2], "pos": pos})
+        assert resposta.status_code == 200
+    return resposta.json
+
+
+@pytest.mark.parametrize("jogadas_x, jogadas_o", [
+    ([6, 7, 8], [0, 24]),                 # linha
+    ([2, 7, 12], [0, 24]),                # coluna
+    ([12, 18, 24], [0, 4]),               # diagonal que não começa no canto
+    ([8, 12, 16], [0, 24]),               # diagonal secundária
+])
+def test_vitoria_com_sequencia_menor_que_o_tamanho(cliente, criar_sala, jogadas_x, jogadas_o):
+    sala_id = criar_sala(tamanho=5, sequencia=3)
+    jogadas = [pos for par in zip(jogadas_x, jogadas_o + [None]) for pos in par if pos is not None]
+
+    resposta = jogar_partida(cliente, sala_id, jogadas)
+    assert resposta["resultado"] == "vitoria"
+    assert resposta["sala"]["vencedor"] == "X"
+
+
+def test_sequencia_interrompida_nao_vence(cliente, criar_sala):
+    sala_id = criar_sala(tamanho=5, sequencia=4)
+    # X em 0, 1, 2 e 4 com O em 3: quatro X na linha, mas não seguidos
+    resposta = jogar_partida(cliente, sala_id, [0, 3, 1, 10, 2, 11, 4])
+    assert resposta["resultado"] == "jogada"
@@ -1,65 +1,159 @@
 import asyncio
 import websockets
 import json
-import redis
 import logging
+import os
+import socket
+import time
 from datetime import datetime
+from http import HTTPStatus
 from typing import Dict, Set
+from urllib.parse import parse_qs
 
-# Configuração de logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+from comum import eventos, json_rapido, logs, metricas, rastreio, redis_cliente, salas
+
+# Logs assíncronos (ver comum/logs.py)
+logs.configurar("websocket")
 logger = logging.getLogger(__name__)
 
 rooms: Dict[str, Set[websockets.WebSocketServerProtocol]] = {}
 
+# Métricas servidas em http://localhost:8002/metrics (ver comum/metricas.py)
+metricas.Medidor(
+    "websocket_clientes", "Clientes conectados por sala", ("sala",),
+    coletar=lambda: [((room_id,), len(clients)) for room_id, clients in list(rooms.items())]
+)
+metricas.Medidor(
+    "websocket_conexoes", "Total de clientes conectados",
+    coletar=lambda: [((), sum(len(clients) for clients in list(rooms.values())))]
+)
+DURACAO_BROADCAST = metricas.Histograma(
+    "websocket_broadcast_segundos", "Duração do envio de uma mensagem a todos os clientes da sala", ("tipo",)
+)
+EVENTOS_REPASSADOS = metricas.Contador(
+    "websocket_eventos_total", "Eventos lidos dos streams e repassados às salas", ("evento",)
+)
+ATRASO_EVENTOS = metricas.Histograma(
+    "websocket_atraso_eventos_segundos", "Tempo entre a publicação do evento e o início do broadcast",
+    limites=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+TRECHOS_RASTREIO = metricas.Histograma(
+    "rastreio_trecho_segundos", "Duração de cada trecho dos eventos rastreados (ver comum/rastreio.py)", ("trecho",)
+)
+TOTAL_RASTREIO = metricas.Histograma(
+    "rastreio_total_segundos", "Da primeira etapa (gateway) até o broadcast, por tipo de evento", ("evento",)
+)
+
+# Cada nó tem o seu consumer group nos streams de eventos, então todos os nós
+# recebem todos os eventos. O ID precisa ser estável entre reinícios para o nó
+# continuar de onde parou.
+NODE_ID = os.getenv("WS_NODE_ID", socket.gethostname())
+GRUPO_EVENTOS = f"websocket:{NODE_ID}"
+
+# Intervalo (segundos) do varredor de salas expiradas; 0 desativa neste nó.
+# Vários nós podem varrer ao mesmo tempo: cada sala é removida uma única vez
+INTERVALO_VARREDOR = float(os.getenv("WS_INTERVALO_VARREDOR", "30"))
+LOTE_VARREDOR = 100
+
 
 try:
-    redis_client = redis.Redis(
-        host='redis',
-        port=6379,
-        decode_responses=True
-    )
+    redis_client = redis_cliente.criar_cliente()
     redis_client.ping()
     logger.info("✅ Conectado ao Redis")
 except Exception as e:
-    logger.error(f"❌ ERRO Redis: {str(e)}")
+    logger.error("❌ ERRO Redis: %s", e)
     redis_client = None
 
 async def broadcast_to_room(room_id: str, message: dict):
     """Envia mensagem para todos na sala"""
     if room_id in rooms and rooms[room_id]:
-        message_json = json.dumps(message)
+        inicio = time.perf_counter()
+        message_json = json_rapido.dumps(message)
         disconnected = []
 
         for client in rooms[room_id]:
             try:
                 await client.send(message_json)
-                logger.debug(f"📤 Mensagem enviada para cliente na sala {room_id}")
             except Exception as e:
-                logger.error(f"Erro ao enviar: {str(e)}")
+                logger.error("Erro ao enviar para cliente da sala %s: %s", room_id, e)
                 disconnected.append(client)
 
+        DURACAO_BROADCAST.observar(time.perf_counter() - inicio, tipo=message.get("type", ""))
+
+        # Um registro por mensagem, não por cliente
+        logs.evento(logger, "broadcast", logging.DEBUG, sala_id=room_id,
+                    clientes=len(rooms[room_id]), falhas=len(disconnected))
 
         for client in disconnected:
             if room_id in rooms:
                 rooms[room_id].discard(client)
-                logger.info(f"🧹 Cliente removido da sala {room_id}")
+                logs.evento(logger, "cliente_removido", sala_id=room_id)
+
+def registrar_rastreio(event: dict, lido: float, enviado: float):
+    """Fecha o rastreio do evento com as etapas deste nó e registra os trechos"""
+    etapas = event["rastreio"]["etapas"] + [["lido", lido], ["enviado", enviado]]
+    trechos = rastreio.trechos(etapas)
+    total = enviado - etapas[0][1]
+    for trecho, duracao in trechos:
+        TRECHOS_RASTREIO.observar(max(duracao, 0), trecho=trecho)
+    TOTAL_RASTREIO.observar(max(total, 0), evento=event.get("evento", ""))
+    logs.evento(logger, "rastreio", id=event["rastreio"]["id"], evento=event.get("evento"),
+                total_ms=round(total * 1000, 2),
+                trechos=",".join(f"{trecho}:{duracao * 1000:.2f}ms" for trecho, duracao in trechos))
+
+def mensagem_evento(id_evento: str, event: dict) -> dict:
+    """Mensagem enviada aos clientes para um evento do stream"""
+    return {
+        "type": "game_event",
+        "id": id_evento,
+        "evento": event.get("evento"),
+        "dados": event.get("dados", {}),
+        "timestamp": datetime.now().isoformat()
+    }
+
+async def send_initial_state(websocket, room_id: str, resync: bool = False):
+    """Envia o estado completo da sala e o ID do último evento já refletido nele"""
+    # O ID é lido antes do estado: um evento que chegue no meio pode ser
+    # repetido, mas nunca perdido (os clientes descartam IDs já vistos)
+    ultimo_evento = eventos.ultimo_id(redis_client, room_id)
+    room_state = salas.carregar_sala(redis_client, room_id)
+    if room_state or resync:
+        await websocket.send(json_rapido.dumps({
+            "type": "initial_state",
+            "room": room_state,
+            "ultimo_evento": ultimo_evento,
+            "resync": resync,
+            "timestamp": datetime.now().isoformat()
+        }))
+
+async def send_missed_events(websocket, room_id: str, desde: str):
+    """
+    Envia os eventos da sala posteriores a ``desde``; se eles não estiverem mais
+    disponíveis, envia o estado completo
+    """
+    perdidos = eventos.eventos_desde(redis_client, room_id, desde)
+    if perdidos is None:
+        logs.evento(logger, "resync", sala_id=room_id, desde=desde)
+        await send_initial_state(websocket, room_id, resync=True)
+        return
+
+    for id_evento, event in perdidos:
+        await websocket.send(json_rapido.dumps(mensagem_evento(id_evento, event)))
+    logs.evento(logger, "eventos_reenviados", sala_id=room_id, desde=desde, total=len(perdidos))
 
 async def handler(websocket, path):
     """Manipula conexões WebSocket"""
     client_ip = websocket.remote_address[0]
-    logger.info(f"🔗 Nova conexão de {client_ip}")
 
     try:
 
+        path, _, query = path.partition('?')
         if not path.startswith('/ws/'):
             await websocket.close(1008, "Path inválido. Use /ws/{room_id}")
             return
 
         room_id = path[4:]
+        ultimo_evento = parse_qs(query).get("ultimo_evento", [None])[0]
 
         if not room_id:
             await websocket.close(1008, "Room ID não especificado")
@@ -70,9 +164,9 @@ async def handler(websocket, path):
             rooms[room_id] = set()
         rooms[room_id].add(websocket)
 
-        logger.info(f"✅ Cliente conectado à sala {room_id}. Total: {len(rooms[room_id])}")
+        logs.evento(logger, "conexao", sala_id=room_id, ip=client_ip, clientes=len(rooms[room_id]))
 
-        await websocket.send(json.dumps({
+        await websocket.send(json_rapido.dumps({
             "type": "connection_established",
             "room_id": room_id,
             "message": f"Conectado à sala {room_id}",
@@ -82,26 +176,24 @@ async def handler(websocket, path):
 
         if redis_client:
             try:
-                room_data = redis_client.get(f"sala:{room_id}")
-                if room_data:
-                    room_state = json.loads(room_data)
-                    await websocket.send(json.dumps({
-                        "type": "initial_state",
-                        "room": room_state,
-                        "timestamp": datetime.now().isoformat()
-                    }))
+                # Na reconexão o cliente informa o último evento recebido e
+                # recebe só o que perdeu
+                if ultimo_evento:
+                    await send_missed_events(websocket, room_id, ultimo_evento)
+                else:
+                    await send_initial_state(websocket, room_id)
             except Exception as e:
-                logger.error(f"Erro ao buscar estado inicial: {str(e)}")
+                logger.error("Erro ao buscar estado inicial da sala %s: %s", room_id, e)
 
 
         async for message in websocket:
             try:
-                data = json.loads(message)
+                data = json_rapido.loads(message)
                 action = data.get("action")
 
                 if action == "ping":
 
-                    await websocket.send(json.dumps({
+                    await websocket.send(json_rapido.dumps({
                         "type": "pong",
                         "timestamp": datetime.now().isoformat()
                     }))
@@ -109,15 +201,19 @@ async def handler(websocket, path):
                 elif action == "get_state":
                     # Buscar estado atual do Redis
                     if redis_client:
-                        room_data = redis_client.get(f"sala:{room_id}")
-                        if room_data:
-                            room_state = json.loads(room_data)
-                            await websocket.send(json.dumps({
+                        room_state = salas.carregar_sala(redis_client, room_id)
+                        if room_state:
+                            await websocket.send(json_rapido.dumps({
                                 "type": "state_update",
                                 "room": room_state,
                                 "timestamp": datetime.now().isoformat()
                             }))
 
+                elif action == "get_events":
+                    # Eventos perdidos desde o ID informado
+                    if redis_client and data.get("desde"):
+                        await send_missed_events(websocket, room_id, str(data["desde"]))
+
                 elif action == "chat":
                     # Broadcast de mensagem de chat
                     chat_data = {
@@ -127,7 +223,8 @@ async def handler(websocket, path):
                         "timestamp": datetime.now().isoformat()
                     }
                     await broadcast_to_room(room_id, chat_data)
-                    logger.info(f"💬 Chat na sala {room_id}: {data.get('sender')}: {data.get('message')}")
+                    logs.evento(logger, "chat", sala_id=room_id, jogador=data.get("sender"),
+                                tamanho=len(data.get("message") or ""))
 
                 elif action == "player_update":
                     # Broadcast de atualização de jogadores/espectadores
@@ -141,77 +238,116 @@ async def handler(websocket, path):
             except json.JSONDecodeError:
                 logger.warning("Mensagem JSON inválida recebida")
             except Exception as e:
-                logger.error(f"Erro ao processar mensagem: {str(e)}")
+                logger.error("Erro ao processar mensagem da sala %s: %s", room_id, e)
 
     except websockets.exceptions.ConnectionClosed:
-        logger.info(f"🔌 Conexão fechada de {client_ip}")
+        logs.evento(logger, "conexao_fechada", ip=client_ip)
     except Exception as e:
-        logger.error(f"Erro na conexão: {str(e)}")
+        logger.error("Erro na conexão de %s: %s", client_ip, e)
     finally:
         # Remover conexão
         if 'room_id' in locals() and room_id in rooms:
             rooms[room_id].discard(websocket)
             if not rooms[room_id]:
                 del rooms[room_id]
-            logger.info(f"📴 Cliente desconectado da sala {room_id}")
+            logs.evento(logger, "desconexao", sala_id=room_id)
 
 async def monitor_redis_events():
-    """Monitora mudanças no Redis (Pub/Sub)"""
+    """Consome os eventos do jogo dos streams do Redis pelo consumer group deste nó"""
     if not redis_client:
         logger.warning("Redis não disponível, monitoramento desativado")
         return
 
-    pubsub = redis_client.pubsub()
-
-    try:
-        pubsub.subscribe('jogo_velha_events')
-
-        logger.info("👂 Monitorando eventos do jogo no Redis (canal: jogo_velha_events)...")
+    loop = asyncio.get_event_loop()
 
-        while True:
-            loop = asyncio.get_event_loop()
-            message = await loop.run_in_executor(
-                None,
-                lambda: pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
-            )
-
-            if message and message['type'] == 'message':
-                try:
-                    event = json.loads(message['data'])
-                    sala_id = event.get('sala_id')
-                    evento = event.get('evento')
-                    dados = event.get('dados', {})
+    # Primeiro os eventos que este nó recebeu antes de reiniciar e não chegou
+    # a confirmar; depois só os novos
+    pendentes = True
 
+    while True:
+        try:
+            eventos.criar_grupos(redis_client, GRUPO_EVENTOS)
+            logger.info("👂 Consumindo eventos do jogo (%d streams, grupo %s)...", eventos.SHARDS, GRUPO_EVENTOS)
+
+            while True:
+                lidos = await loop.run_in_executor(
+                    None,
+                    lambda pendentes=pendentes: eventos.ler_grupo(
+                        redis_client, GRUPO_EVENTOS, NODE_ID, pendentes=pendentes
+                    )
+                )
+                lido = time.time()
+                if pendentes and not lidos:
+                    pendentes = False
+                    continue
+
+                for _, id_evento, event in lidos:
+                    sala_id = event and event.get('sala_id')
+                    evento = event and event.get('evento')
                     if sala_id and evento:
-                        logger.info(f"📡 Evento Redis: {evento} na sala {sala_id}")
+                        logs.evento(logger, "evento", sala_id=sala_id, evento=evento, id=id_evento)
+                        EVENTOS_REPASSADOS.inc(evento=evento)
+                        if "timestamp" in event:
+                            ATRASO_EVENTOS.observar(max(time.time() - event["timestamp"], 0))
 
                         # Broadcast para a sala
-                        await broadcast_to_room(sala_id, {
-                            "type": "game_event",
-                            "evento": evento,
-                            "dados": dados,
-                            "timestamp": datetime.now().isoformat()
-                        })
-
-                except Exception as e:
-                    logger.error(f"Erro ao processar evento Redis: {str(e)}")
-
-            await asyncio.sleep(0.01)  # evita sobrecarregar
+                        await broadcast_to_room(sala_id, mensagem_evento(id_evento, event))
+                        if event.get("rastreio"):
+                            registrar_rastreio(event, lido, time.time())
+
+                if lidos:
+                    await loop.run_in_executor(
+                        None, eventos.confirmar, redis_client, GRUPO_EVENTOS, lidos
+                    )
+
+        except Exception as e:
+            logger.error("Erro no consumo de eventos, tentando de novo: %s", e)
+            # Eventos lidos e não confirmados ficam pendentes no grupo: são
+            # relidos antes dos novos
+            pendentes = True
+            await asyncio.sleep(1)
+
+async def varrer_salas_expiradas():
+    """Remove periodicamente as salas com prazo vencido (o evento sala_expirada chega pelos streams)"""
+    if not redis_client or INTERVALO_VARREDOR <= 0:
+        logger.warning("Varredor de salas expiradas desativado")
+        return
 
-    except Exception as e:
-        logger.error(f"Erro no monitoramento Redis: {str(e)}")
+    loop = asyncio.get_event_loop()
+    while True:
+        await asyncio.sleep(INTERVALO_VARREDOR)
+        try:
+            while True:
+                removidas = await loop.run_in_executor(
+                    None, salas.expirar_vencidas, redis_client, LOTE_VARREDOR
+                )
+                if removidas:
+                    logs.evento(logger, "salas_expiradas", total=len(removidas), salas=",".join(removidas))
+                if len(removidas) < LOTE_VARREDOR:
+                    break
+        except Exception as e:
+            logger.error("Erro ao varrer salas expiradas: %s", e)
 
 async def health_check():
     """Verificação periódica de saúde"""
     while True:
         await asyncio.sleep(30)
         total_connections = sum(len(clients) for clients in rooms.values())
-        logger.info(f"📊 Status: {total_connections} conexões em {len(rooms)} salas")
+        estatisticas_logs = logs.estatisticas()
+        logs.evento(logger, "status", conexoes=total_connections, salas=len(rooms),
+                    fila_logs=estatisticas_logs["fila"], logs_descartados=estatisticas_logs["descartados"])
+
+async def responder_http(path, request_headers):
+    """Responde GET /metrics sem abrir WebSocket; os demais caminhos seguem para o handler"""
+    if path == "/metrics":
+        return HTTPStatus.OK, [("Content-Type", metricas.TIPO_CONTEUDO)], metricas.REGISTRO.exportar().encode()
+    return None
 
 async def main():
     """Inicia o servidor WebSocket"""
 
     asyncio.create_task(monitor_redis_events())
+    asyncio.create_task(varrer_salas_expiradas())
     asyncio.create_task(health_check())
 
 
@@ -220,12 +356,16 @@ async def main():
         host="0.0.0.0",
         port=8002,
         ping_interval=20,
-        ping_timeout=30
+        ping_timeout=30,
+        process_request=responder_http
     )
 
     logger.info("🚀 WebSocket Server iniciado na porta 8002")
     logger.info("📌 Endpoints disponíveis:")
     logger.info("  - ws://localhost:8002/ws/{room_id} - Conectar a uma sala")
+    logger.info("  - ws://localhost:8002/ws/{room_id}?ultimo_evento={id} - Reconectar recebendo os eventos perdidos")
+    logger.info("  - ws://localhost:8002/ws/partida:{ticket} - Aguardar o pareamento automático")
+    logger.info("  - http://localhost:8002/metrics - Métricas (Prometheus)")
 
     await server.wait_closed()
 